@@ -92,7 +92,9 @@ const RaspberryPiConsole = ({ apiBaseUrl, onClose }) => {
     // Connect to Flask backend via SocketIO
     const socket = io(apiBaseUrl, {
       transports: ['websocket', 'polling'],
-      path: '/socket.io'
+      path: '/socket.io',
+      // Terminal only: no tracking broadcasts
+      query: { topics: '' }
     });
 
     socketRef.current = socket;
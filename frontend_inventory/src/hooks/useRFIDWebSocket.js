@@ -2,16 +2,51 @@
 import { useEffect, useState, useRef, useCallback } from 'react';
 import { io } from 'socket.io-client';
 
+// Client-generated record id: the backend ignores a record resubmitted with the same id
+const newRecordId = () => (
+  typeof crypto !== 'undefined' && crypto.randomUUID
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`
+);
+
+// Statistics counters the server sends as increments (stats_delta)
+const STAT_COUNTERS = ['total_records', 'in_count', 'out_count', 'unique_tags', 'current_balance'];
+
+const applyStatsDelta = (stats, delta) => {
+  if (!stats || !delta) return stats;
+  const next = { ...stats, version: delta.version };
+  STAT_COUNTERS.forEach(key => {
+    if (delta[key]) next[key] = (next[key] || 0) + delta[key];
+  });
+  if (delta.top_tags) next.top_tags = delta.top_tags;
+  return next;
+};
+
+// Payload of a bulk event sent packed (encoding 'deflate': zlib-compressed JSON)
+const inflateJSON = async (buffer) => {
+  const stream = new Blob([buffer]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return JSON.parse(await new Response(stream).text());
+};
+
 /**
  * Custom React hook for managing RFID WebSocket connection
  * Handles real-time updates from the Flask-SocketIO backend
+ *
+ * topics: server topics to receive (e.g. ['stats'] for a count-only kiosk);
+ * omitted, the server's defaults (records, status, sensor-live) apply
+ *
+ * encoding: 'deflate' has record pages, resyncs and broadcast batches sent
+ * compressed, for links where the WebSocket itself is not (browsers
+ * normally negotiate permessage-deflate, so the default 'json' suffices)
  */
-const useRFIDWebSocket = (apiBaseUrl) => {
+const useRFIDWebSocket = (apiBaseUrl, topics = null, encoding = 'json') => {
   const [socket, setSocket] = useState(null);
   const [isConnected, setIsConnected] = useState(false);
   const [systemStatus, setSystemStatus] = useState(null);
   const [statistics, setStatistics] = useState(null);
   const [recentRecords, setRecentRecords] = useState([]);
+  // Older records exist beyond the loaded pages (see loadOlderRecords)
+  const [hasOlderRecords, setHasOlderRecords] = useState(false);
   const [lastTagDetected, setLastTagDetected] = useState(null);
   const [sensorActivity, setSensorActivity] = useState({
     inside: { detected: false, distance: 0 },
@@ -19,6 +54,11 @@ const useRFIDWebSocket = (apiBaseUrl) => {
   });
   
   const socketRef = useRef(null);
+  // Last change number applied; a gap means something was missed
+  const lastSeqRef = useRef(0);
+  const resyncPendingRef = useRef(false);
+  // Cursor of the oldest loaded record (request_records {before})
+  const olderCursorRef = useRef(null);
 
   // Connect to WebSocket
   useEffect(() => {
@@ -28,14 +68,30 @@ const useRFIDWebSocket = (apiBaseUrl) => {
     console.log('Connecting to WebSocket:', apiBaseUrl || '(same-origin)');
     
     const connectUrl = apiBaseUrl && apiBaseUrl.length > 0 ? apiBaseUrl : undefined;
+    const query = {
+      ...(topics ? { topics: topics.join(',') } : {}),
+      ...(encoding !== 'json' ? { encoding } : {})
+    };
     const newSocket = io(connectUrl, {
       transports: ['websocket', 'polling'],
       reconnection: true,
       reconnectionDelay: 1000,
       reconnectionDelayMax: 5000,
-      reconnectionAttempts: Infinity
+      reconnectionAttempts: Infinity,
+      ...(Object.keys(query).length ? { query } : {})
     });
 
+    // Bulk events may arrive packed (ArrayBuffer); they are decoded and
+    // handled one after another so changes are still applied in order
+    let bulkQueue = Promise.resolve();
+    const onBulk = (event, handler) => {
+      newSocket.on(event, (data) => {
+        bulkQueue = bulkQueue
+          .then(async () => handler(data instanceof ArrayBuffer ? await inflateJSON(data) : data))
+          .catch(error => console.error(`Failed to handle ${event}:`, error));
+      });
+    };
+
     socketRef.current = newSocket;
     setSocket(newSocket);
 
@@ -43,6 +99,8 @@ const useRFIDWebSocket = (apiBaseUrl) => {
     newSocket.on('connect', () => {
       console.log('✅ WebSocket connected:', newSocket.id);
       setIsConnected(true);
+      // The server sends a fresh snapshot (with its seq) on every connect
+      resyncPendingRef.current = false;
     });
 
     newSocket.on('disconnect', () => {
@@ -55,6 +113,14 @@ const useRFIDWebSocket = (apiBaseUrl) => {
       setIsConnected(false);
     });
 
+    // Broadcasts coalesced by the server: [[event, data], ...] in order,
+    // handled as if each had arrived on its own
+    onBulk('batch', (events) => {
+      events.forEach(([event, data]) => {
+        newSocket.listeners(event).forEach(listener => listener(data));
+      });
+    });
+
     // Initial connection data
     newSocket.on('connection_established', (data) => {
       console.log('Connection established:', data);
@@ -72,10 +138,84 @@ const useRFIDWebSocket = (apiBaseUrl) => {
       setStatistics(data);
     });
 
-    // Records updates
-    newSocket.on('records_update', (data) => {
-      console.log('Records update:', data.count, 'records');
-      setRecentRecords(data.records || []);
+    // Records pages: a `before` page goes below the loaded records, an
+    // `after` page above them, anything else replaces them (seq is set on
+    // the connect snapshot)
+    const applyRecordsPage = (data) => {
+      const records = data.records || [];
+      if (data.before) {
+        setRecentRecords(prev => [...prev, ...records]);
+      } else if (data.after) {
+        setRecentRecords(prev => [...records, ...prev]);
+      } else {
+        setRecentRecords(records);
+      }
+      if (!data.after) {
+        olderCursorRef.current = data.older_cursor || olderCursorRef.current;
+        setHasOlderRecords(Boolean(data.has_more));
+      }
+    };
+
+    onBulk('records_update', (data) => {
+      console.log('Records update:', data.count, 'of', data.total, 'records');
+      applyRecordsPage(data);
+      if (data.seq !== undefined) {
+        lastSeqRef.current = data.seq;
+      }
+    });
+
+    const requestResync = (since) => {
+      if (resyncPendingRef.current) return;
+      resyncPendingRef.current = true;
+      newSocket.emit('request_resync', { since });
+    };
+
+    // Numbered changes: apply in order, resync on a gap
+    const applyChange = (event, data) => {
+      if (data.seq <= lastSeqRef.current) return;
+      if (data.seq > lastSeqRef.current + 1) {
+        console.log(`Missed changes ${lastSeqRef.current + 1}-${data.seq - 1}; resyncing`);
+        requestResync(lastSeqRef.current);
+        return;
+      }
+      lastSeqRef.current = data.seq;
+      switch (event) {
+        case 'record_added':
+          setRecentRecords(prev => [data.record, ...prev]);
+          setStatistics(prev => applyStatsDelta(prev, data.stats_delta));
+          break;
+        case 'records_added':
+          if (data.records?.length) {
+            setRecentRecords(prev => [...data.records, ...prev]);
+          }
+          setStatistics(prev => applyStatsDelta(prev, data.stats_delta));
+          break;
+        case 'records_cleared':
+          setRecentRecords([]);
+          setHasOlderRecords(false);
+          olderCursorRef.current = null;
+          setStatistics(data.statistics);
+          break;
+        case 'resync_required':
+          requestResync(null);
+          break;
+        default:
+          break;
+      }
+    };
+
+    onBulk('resync', (data) => {
+      resyncPendingRef.current = false;
+      if (data.full) {
+        console.log('Full resync:', data.count, 'of', data.total, 'records');
+        olderCursorRef.current = null;
+        applyRecordsPage(data);
+        setStatistics(data.statistics);
+        lastSeqRef.current = data.seq;
+      } else {
+        console.log('Resync:', data.changes.length, 'missed changes');
+        data.changes.forEach(change => applyChange(change.event, change.data));
+      }
     });
 
     // Tag detection events
@@ -87,13 +227,21 @@ const useRFIDWebSocket = (apiBaseUrl) => {
       setTimeout(() => setLastTagDetected(null), 3000);
     });
 
-    // Record added events
+    // Record added events (new record and statistics deltas only)
     newSocket.on('record_added', (data) => {
       console.log('📝 Record added:', data);
-      // Add the new record to the beginning of the list for real-time update
-      if (data.record) {
-        setRecentRecords(prev => [data.record, ...prev]);
-      }
+      applyChange('record_added', data);
+    });
+
+    // Bulk add: one event for the whole batch (records newest first)
+    newSocket.on('records_added', (data) => {
+      console.log('📝 Records added:', data.count);
+      applyChange('records_added', data);
+    });
+
+    // History finished loading after a server restart
+    newSocket.on('resync_required', (data) => {
+      applyChange('resync_required', data);
     });
 
     // Sensor activity events
@@ -138,15 +286,20 @@ const useRFIDWebSocket = (apiBaseUrl) => {
       console.error('Server error:', data.message);
     });
 
+    // Topic subscriptions changed
+    newSocket.on('subscribed', (data) => {
+      console.log('Subscribed topics:', data.topics);
+    });
+
     // Success events
     newSocket.on('success', (data) => {
       console.log('Success:', data.message);
     });
 
     // Records cleared event
-    newSocket.on('records_cleared', () => {
+    newSocket.on('records_cleared', (data) => {
       console.log('🗑️ Records cleared');
-      setRecentRecords([]);
+      applyChange('records_cleared', data);
     });
 
     // Cleanup on unmount
@@ -154,7 +307,9 @@ const useRFIDWebSocket = (apiBaseUrl) => {
       console.log('Disconnecting WebSocket...');
       newSocket.disconnect();
     };
-  }, [apiBaseUrl]);
+    // topics is compared by value so an inline array does not reconnect
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [apiBaseUrl, topics?.join(','), encoding]);
 
   // Request methods
   const requestStatus = useCallback(() => {
@@ -175,6 +330,26 @@ const useRFIDWebSocket = (apiBaseUrl) => {
     }
   }, []);
 
+  // Next page of older records below the loaded ones
+  const loadOlderRecords = useCallback((limit = 100) => {
+    if (socketRef.current?.connected && olderCursorRef.current) {
+      socketRef.current.emit('request_records', { before: olderCursorRef.current, limit });
+    }
+  }, []);
+
+  // Change topics without reconnecting (e.g. 'tag:<epc>' while a tag is open)
+  const subscribe = useCallback((topicList) => {
+    if (socketRef.current?.connected) {
+      socketRef.current.emit('subscribe', { topics: topicList });
+    }
+  }, []);
+
+  const unsubscribe = useCallback((topicList) => {
+    if (socketRef.current?.connected) {
+      socketRef.current.emit('unsubscribe', { topics: topicList });
+    }
+  }, []);
+
   const configureRFIDPower = useCallback((power) => {
     if (socketRef.current?.connected) {
       socketRef.current.emit('configure_rfid_power', { power: parseInt(power) });
@@ -190,11 +365,24 @@ const useRFIDWebSocket = (apiBaseUrl) => {
     }
   }, []);
 
-  const addManualRecord = useCallback((rfidTag, direction) => {
+  const addManualRecord = useCallback((rfidTag, direction, recordId = newRecordId()) => {
     if (socketRef.current?.connected) {
       socketRef.current.emit('add_manual_record', { 
         rfid_tag: rfidTag, 
-        direction: direction.toUpperCase() 
+        direction: direction.toUpperCase(),
+        record_id: recordId
+      });
+    }
+    return recordId;
+  }, []);
+
+  const addManualRecords = useCallback((records) => {
+    if (socketRef.current?.connected) {
+      socketRef.current.emit('add_manual_records', {
+        records: records.map(record => ({
+          ...record,
+          direction: record.direction.toUpperCase()
+        }))
       });
     }
   }, []);
@@ -217,15 +405,20 @@ const useRFIDWebSocket = (apiBaseUrl) => {
     systemStatus,
     statistics,
     recentRecords,
+    hasOlderRecords,
     lastTagDetected,
     sensorActivity,
     // Methods
     requestStatus,
     requestStatistics,
     requestRecords,
+    loadOlderRecords,
+    subscribe,
+    unsubscribe,
     configureRFIDPower,
     configureSensorRange,
     addManualRecord,
+    addManualRecords,
     clearRecords,
     ping
   };
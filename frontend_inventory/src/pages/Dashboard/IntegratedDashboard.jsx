@@ -20,6 +20,8 @@ const IntegratedDashboard = () => {
     systemStatus: wsSystemStatus,
     statistics: wsStatistics,
     recentRecords: wsRecentRecords,
+    hasOlderRecords,
+    loadOlderRecords,
     sensorActivity,
     configureRFIDPower,
     configureSensorRange,
@@ -81,7 +83,9 @@ const IntegratedDashboard = () => {
   useEffect(() => {
     if (wsRecentRecords) {
       // Check if there's a new record (compare with previous state)
-      if (recentRecords.length > 0 && wsRecentRecords.length > recentRecords.length) {
+      // (Older pages loaded below the list grow it too, without a new newest record)
+      if (recentRecords.length > 0 && wsRecentRecords.length > recentRecords.length
+          && wsRecentRecords[0] !== recentRecords[0]) {
         // New record added - this means BOTH sensors detected with RFID
         const newRecord = wsRecentRecords[0]; // Most recent record
         const direction = newRecord.direction;
@@ -1156,6 +1160,14 @@ const IntegratedDashboard = () => {
                   </tbody>
                 </table>
               )}
+              {hasOlderRecords && (
+                <button
+                  className="action-btn action-btn-small"
+                  onClick={() => loadOlderRecords()}
+                >
+                  Load older activity
+                </button>
+              )}
             </div>
           </div>
         </div>
@@ -4,6 +4,7 @@
 RFID Asset Tracking System - Application Entry Point
 """
 import os
+import sys
 
 # Patch standard library for eventlet BEFORE any other imports
 import eventlet
@@ -21,25 +22,48 @@ app = create_app(env)
 from app import socketio
 
 if __name__ == '__main__':
+    role = app.config.get('PROCESS_ROLE', 'single')
     try:
-        print(f"Starting RFID Tracking Server ({env} mode)...")
+        if role == 'owner':
+            # Hardware and store here; REST and Socket.IO in the web workers
+            from app.services.cluster import cluster
+            print(f"Starting RFID Tracking Server ({env} mode) with {app.config['WEB_WORKERS']} web workers...")
+            cluster.start_workers(app.config['WEB_WORKERS'], [sys.executable, os.path.abspath(__file__)])
+            cluster.supervise()
 
-        # Use socketio.run with eventlet async mode for production stability
-        socketio.run(
-            app,
-            host='0.0.0.0',
-            port=5000,
-            debug=app.config.get('DEBUG', False),
-            allow_unsafe_werkzeug=True  # Required for eventlet with Werkzeug dev server
-        )
+        elif role == 'web':
+            from eventlet import wsgi
+            from app.services.tracking_service import tracking_service
+
+            # Listen once the replica has loaded; the kernel spreads
+            # connections over the workers sharing the port (SO_REUSEPORT)
+            tracking_service.wait_until_ready()
+            print(f"Web worker {app.config['WORKER_ID']} serving on port 5000")
+            wsgi.server(eventlet.listen(('0.0.0.0', 5000), reuse_port=True), app, log_output=False)
+
+        else:
+            print(f"Starting RFID Tracking Server ({env} mode)...")
+
+            # Use socketio.run with eventlet async mode for production stability
+            socketio.run(
+                app,
+                host='0.0.0.0',
+                port=5000,
+                debug=app.config.get('DEBUG', False),
+                allow_unsafe_werkzeug=True  # Required for eventlet with Werkzeug dev server
+            )
 
     except KeyboardInterrupt:
         print("\nShutting down gracefully...")
-        from app.services.rfid_service import rfid_reader
-        from app.services.sensor_service import sensor_manager
+        if role != 'web':
+            from app.services.rfid_service import rfid_reader
+            from app.services.sensor_service import sensor_manager
 
-        rfid_reader.stop()
-        sensor_manager.shutdown()
+            if role == 'owner':
+                from app.services.cluster import cluster
+                cluster.stop_workers()
+            rfid_reader.stop()
+            sensor_manager.shutdown()
 
     except Exception as e:
         print(f"Fatal error: {e}")
\ No newline at end of file
@@ -1,8 +1,10 @@
-from flask import Flask
+from flask import Flask, request
 import os
 from flask_cors import CORS
 from flask_socketio import SocketIO
 from config import config
+from app.services import payload_cache
+from app.services.cluster import cluster, REPLICA_ENDPOINTS
 
 # Global SocketIO instance
 socketio = None
@@ -21,13 +23,27 @@ def create_app(config_name='production'):
         app.config['DATA_FILE'] = os.path.abspath(os.path.join(project_root, data_file_cfg))
     else:
         app.config['DATA_FILE'] = data_file_cfg
+    # Same for the archive directories and the inventory snapshot
+    for key in ('ARCHIVE_DIR', 'COLUMN_ARCHIVE_DIR', 'INVENTORY_SNAPSHOT_FILE', 'PAIRING_STATE_FILE',
+                'DISPATCHER_OUTBOX_FILE', 'CLUSTER_SOCKET'):
+        dir_cfg = app.config.get(key)
+        if dir_cfg and not os.path.isabs(dir_cfg):
+            app.config[key] = os.path.abspath(os.path.join(project_root, dir_cfg))
     # Show resolved data file path on startup for easier debugging
     print(f"Using DATA_FILE: {app.config['DATA_FILE']}")
     
+    # 'single' (everything in this process), 'owner' (hardware and store,
+    # serving web workers) or 'web' (REST and Socket.IO from a replica)
+    role = app.config.get('PROCESS_ROLE', 'single')
+    
     # Enable CORS
     CORS(app)
     
-    # Initialize SocketIO with eventlet for production stability
+    # Initialize SocketIO with eventlet for production stability. Packets are
+    # encoded with payload_cache's json module, which splices pre-encoded
+    # payloads (RawJSON) in instead of encoding them again. Long polling
+    # needs every request of a session to reach the same process, which web
+    # workers sharing a port cannot promise, so they accept WebSocket only
     global socketio
     socketio = SocketIO(
         app, 
@@ -36,33 +52,102 @@ def create_app(config_name='production'):
         logger=True,
         engineio_logger=True,
         ping_timeout=60,
-        ping_interval=25
+        ping_interval=25,
+        json=payload_cache,
+        transports=['websocket'] if role == 'web' else ['polling', 'websocket']
     )
     print("SocketIO initialized with eventlet for SSH terminal support")
+    # eventlet negotiates permessage-deflate with every client that offers
+    # it; hiding the offer sends frames uncompressed (saves CPU on the Pi)
+    if not app.config.get('WS_COMPRESSION', True):
+        wsgi_app = app.wsgi_app
+
+        def without_ws_compression(environ, start_response):
+            environ.pop('HTTP_SEC_WEBSOCKET_EXTENSIONS', None)
+            return wsgi_app(environ, start_response)
+
+        app.wsgi_app = without_ws_compression
+    # Broadcasts within BROADCAST_WINDOW go out as one frame per client,
+    # each client getting only the topics (rooms) it subscribed to, packed
+    # for clients that asked for a binary encoding; clients whose outbound
+    # queue backs up are skipped, then disconnected
+    from app.services.broadcaster import broadcaster
+    from app.services import wire_encoding
+    server = socketio.server
+
+    def topic_members(rooms):
+        return {sid for sid, _ in server.manager.get_participants('/', rooms)}
+
+    def binary_clients():
+        return {sid: encoding for encoding in wire_encoding.available_encodings() if encoding != 'json'
+                for sid in topic_members([wire_encoding.room_for(encoding)])}
+
+    def engineio_socket(sid):
+        eio_sid = server.manager.eio_sid_from_sid(sid, '/')
+        return server.eio.sockets.get(eio_sid) if eio_sid else None
 
-    # Initialize services
+    def outbound_backlog(sid):
+        # Packets engine.io has queued for the client and not yet written
+        socket = engineio_socket(sid)
+        return socket.queue.qsize() if socket is not None else 0
+
+    def drop_client(sid):
+        # Without waiting for the queue to drain (it is not draining)
+        socket = engineio_socket(sid)
+        if socket is not None:
+            socket.close(wait=False, abort=True)
+
+    broadcaster.start(socketio.emit, topic_members, app.config.get('BROADCAST_WINDOW', 0.05),
+                      encode=payload_cache.encode, encodings=binary_clients, pack=wire_encoding.pack,
+                      backlog=outbound_backlog, disconnect=drop_client,
+                      queue_max=app.config.get('WS_CLIENT_QUEUE_MAX', 100),
+                      lag_timeout=app.config.get('WS_CLIENT_LAG_TIMEOUT', 30))
+
+    # Initialize services. A web worker owns no hardware: it follows the
+    # owner's store instead (connected below, once handlers are registered)
     with app.app_context():
         from app.services.tracking_service import tracking_service
+        from app.services.dispatcher_outbox import dispatcher_outbox
         from app.services.sensor_service import sensor_manager
         from app.services.rfid_service import rfid_reader
         
-        tracking_service.initialize()
-        sensor_manager.initialize()
-        
-        # Set app reference for RFID reader before connecting
-        rfid_reader.app = app
-        
-        # RFID reader will auto-start monitoring with eventlet greenthread
-        rfid_reader.connect()
+        if role == 'web':
+            tracking_service.initialize_replica()
+        else:
+            # History streams in on a background thread; routes are registered
+            # and serve what has loaded so far (see ready in /api/status)
+            tracking_service.initialize(background=True)
+            tracking_service.start_periodic_snapshot(app.config.get('INVENTORY_SNAPSHOT_INTERVAL', 5))
+            # Resumes delivery of movements still owed from before a restart
+            dispatcher_outbox.open(app.config['DISPATCHER_OUTBOX_FILE'], app.config.get('DISPATCHER_URL', ''),
+                                   app.config.get('DISPATCHER_CONCURRENCY', 2),
+                                   app.config.get('DISPATCHER_TIMEOUT', 5),
+                                   app.config.get('DISPATCHER_RETRY_BASE', 1),
+                                   app.config.get('DISPATCHER_RETRY_MAX', 300),
+                                   app.config.get('DISPATCHER_BATCH_URL', ''),
+                                   app.config.get('DISPATCHER_BATCH_WINDOW', 0.2),
+                                   app.config.get('DISPATCHER_BATCH_MAX', 50),
+                                   app.config.get('DISPATCHER_BREAKER_THRESHOLD', 5),
+                                   app.config.get('DISPATCHER_BREAKER_RESET', 5),
+                                   app.config.get('DISPATCHER_BREAKER_RESET_MAX', 300))
+            sensor_manager.initialize()
+            
+            # Set app reference for RFID reader before connecting
+            rfid_reader.app = app
+            
+            # RFID reader will auto-start monitoring with eventlet greenthread
+            rfid_reader.connect()
     
     # Register blueprints
     from app.routes.api import api_bp
     from app.routes.config import config_bp
     from app.routes.system import system_bp
+    from app.routes.analytics import analytics_bp
     
     app.register_blueprint(api_bp)
     app.register_blueprint(config_bp)
     app.register_blueprint(system_bp)
+    app.register_blueprint(analytics_bp)
     
     # Initialize WebSocket handlers for RFID tracking
     from app.routes.websocket_events import init_websocket_handlers
@@ -84,5 +169,65 @@ def create_app(config_name='production'):
             'mode': 'PRODUCTION (Hardware)'
         }
         return response
-    
+
+    # Multi-process deployment (WEB_WORKERS > 0): the owner runs writes for
+    # the web workers and relays its changes and broadcasts to them
+    if role == 'owner':
+        from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+        def run_forwarded_request(method, path, query_string, headers, body, remote_addr):
+            # A request a web worker cannot answer from its replica
+            environ = EnvironBuilder(path=path, method=method, query_string=query_string, headers=headers,
+                                     data=body, environ_base={'REMOTE_ADDR': remote_addr}).get_environ()
+            app_iter, status, response_headers = run_wsgi_app(app, environ, buffered=True)
+            return int(status.split(' ', 1)[0]), list(response_headers.items()), b''.join(app_iter)
+
+        cluster.register('http_request', run_forwarded_request)
+        cluster.register('add_record', tracking_service.add_record)
+        cluster.register('add_records', tracking_service.add_records)
+        cluster.register('clear_all_records', tracking_service.clear_all_records)
+        tracking_service.changes.listener = cluster.publish_change
+        cluster.start_owner(app, app.config['CLUSTER_SOCKET'], app.config['SECRET_KEY'].encode(),
+                            tracking_service.replica_state)
+    elif role == 'web':
+        from app.routes.websocket_events import broadcast_change, broadcast_event
+
+        def apply_change(event, change, weight):
+            tracking_service.apply_change(event, change, weight)
+            broadcast_change(socketio, event, change)
+
+        def apply_broadcast(event, data, key, to):
+            tracking_service.apply_broadcast(event, data)
+            broadcast_event(socketio, event, data, key, to)
+
+        def owner_lost():
+            # The owner restarts its workers; a worker without one has nothing to serve
+            print("[ERROR] Exiting web worker: the owner process is gone")
+            os._exit(1)
+
+        @app.before_request
+        def forward_to_owner():
+            """Run requests the replica cannot answer (writes, hardware, files) on the owner"""
+            if request.endpoint in REPLICA_ENDPOINTS:
+                return None
+            try:
+                status, headers, body = cluster.call('http_request', request.method, request.path,
+                                                     request.query_string.decode('latin-1'),
+                                                     list(request.headers.items()), request.get_data(),
+                                                     request.remote_addr)
+            except RuntimeError as e:
+                return {'status': 'error', 'message': str(e)}, 502
+            return app.response_class(body, status=status, headers=headers)
+
+        cluster.start_worker(app.config['CLUSTER_SOCKET'], app.config['SECRET_KEY'].encode(),
+                             app.config.get('WORKER_ID', 0), {
+                                 'state': tracking_service.load_replica,
+                                 'records': tracking_service.load_replica_records,
+                                 'loaded': tracking_service.finish_replica,
+                                 'change': apply_change,
+                                 'broadcast': apply_broadcast,
+                                 'expire': tracking_service.expire_before,
+                                 'lost': owner_lost
+                             })
+
     return app
\ No newline at end of file
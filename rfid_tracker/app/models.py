@@ -1,28 +1,41 @@
 from datetime import datetime
+import uuid
 import pytz
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from typing import Optional
 
+# Namespace for the deterministic ids of records that arrived without one
+RECORD_ID_NAMESPACE = uuid.UUID('6f1d2c8e-4b7a-5e3f-9a21-3c5d7e9f0b14')
+
 @dataclass
 class TrackingRecord:
     """Model for tracking record"""
     rfid_tag: str
     direction: str  # 'IN' or 'OUT'
     read_date: str
+    door_id: str = ''  # Door unit that read the tag
+    record_id: str = ''  # Unique id: client-supplied, random, or derived from the content
+    
+    @staticmethod
+    def content_id(rfid_tag: str, direction: str, read_date: str, door_id: str = '') -> str:
+        """Deterministic id for a record without one (legacy history, replayed captures)"""
+        return str(uuid.uuid5(RECORD_ID_NAMESPACE, f"{rfid_tag}|{direction}|{read_date}|{door_id}"))
     
     @classmethod
-    def create(cls, rfid_tag: str, direction: str):
+    def create(cls, rfid_tag: str, direction: str, door_id: str = '', record_id: Optional[str] = None):
         """Create new tracking record with timestamp in Calgary timezone (12-hour format)"""
         # Get current time in Calgary timezone (America/Edmonton = MST/MDT)
         calgary_tz = pytz.timezone('America/Edmonton')
         dt = datetime.now(calgary_tz)
         # Format: YYYY-MM-DD-HH-MM-SS-mmm-AM/PM (12-hour format)
         timestamp = dt.strftime("%Y-%m-%d-%I-%M-%S-%f-")[:-3] + dt.strftime("%p")
-        return cls(rfid_tag=rfid_tag, direction=direction, read_date=timestamp)
+        return cls(rfid_tag=rfid_tag, direction=direction, read_date=timestamp, door_id=door_id,
+                   record_id=record_id or str(uuid.uuid4()))
     
     def to_dict(self):
         """Convert to dictionary"""
-        return asdict(self)
+        return {'rfid_tag': self.rfid_tag, 'direction': self.direction,
+                'read_date': self.read_date, 'door_id': self.door_id, 'record_id': self.record_id}
 
 
 @dataclass
@@ -33,7 +46,60 @@ class SystemStatus:
     sensor_outside: str = 'disconnected'
     last_tag_read: Optional[dict] = None
     total_records: int = 0
+    ready: bool = False  # False while the history is still loading at startup
+    
+    def to_dict(self):
+        """Convert to dictionary (shallow: last_tag_read is shared, not deep-copied)"""
+        return {
+            'rfid_reader': self.rfid_reader,
+            'sensor_inside': self.sensor_inside,
+            'sensor_outside': self.sensor_outside,
+            'last_tag_read': self.last_tag_read,
+            'total_records': self.total_records,
+            'ready': self.ready
+        }
+
+
+@dataclass
+class TagState:
+    """Model for the current state of one tag (latest movement wins)"""
+    rfid_tag: str
+    location: str  # 'inside' or 'outside'
+    last_direction: str
+    last_seen: str
+    last_door: str
+    last_seen_us: int = 0  # epoch microseconds of last_seen, for ordering
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'rfid_tag': self.rfid_tag,
+            'location': self.location,
+            'last_direction': self.last_direction,
+            'last_seen': self.last_seen,
+            'last_door': self.last_door,
+            'last_seen_us': self.last_seen_us
+        }
+
+@dataclass
+class TagPairing:
+    """Model for the dispatcher pairing state of one tag"""
+    rfid_tag: str
+    last_direction: str  # direction of the tag's newest record
+    last_us: int  # epoch microseconds of the newest record
+    pair_direction: str = ''  # newest record whose direction differs from the one before it
+    pair_read_date: str = ''
+    pair_us: int = 0  # 0 = no pair yet
+    sent_us: int = 0  # pair_us of the last pair queued for the dispatcher
     
     def to_dict(self):
         """Convert to dictionary"""
-        return asdict(self)
\ No newline at end of file
+        return {
+            'rfid_tag': self.rfid_tag,
+            'last_direction': self.last_direction,
+            'last_us': self.last_us,
+            'pair_direction': self.pair_direction,
+            'pair_read_date': self.pair_read_date,
+            'pair_us': self.pair_us,
+            'sent_us': self.sent_us
+        }
\ No newline at end of file
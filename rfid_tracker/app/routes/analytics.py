@@ -0,0 +1,76 @@
+from flask import Blueprint, jsonify, request
+from app.services.tracking_service import tracking_service
+from app.utils.helpers import timestamp_to_epoch_us
+from app.routes.api import limit_arg, invalid_limit
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
+
+
+def _range_ms():
+    """
+    start_date / end_date query args as epoch milliseconds (None = open)
+    
+    Raises:
+        ValueError: A date was given but could not be parsed
+    """
+    bounds = []
+    for name, end in (('start_date', False), ('end_date', True)):
+        value = request.args.get(name)
+        if not value:
+            bounds.append(None)
+            continue
+        epoch_us = timestamp_to_epoch_us(value, end=end)
+        if epoch_us is None:
+            raise ValueError(f'{name} must be YYYY-MM-DD or a record timestamp')
+        bounds.append(epoch_us // 1000)
+    return tuple(bounds)
+
+
+@analytics_bp.route('/hourly', methods=['GET'])
+def get_hourly_movements():
+    """Movements per hour over the full history (?start_date=&end_date=)"""
+    archive = tracking_service.get_column_archive()
+    if archive is None:
+        return jsonify({'status': 'error', 'message': 'Column archive not available'}), 503
+    
+    try:
+        start_ms, end_ms = _range_ms()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    hours = archive.hourly_counts(start_ms, end_ms)
+    
+    return jsonify({
+        'status': 'success',
+        'count': len(hours),
+        'data': hours
+    })
+
+
+@analytics_bp.route('/tags', methods=['GET'])
+def get_tag_movements():
+    """Movements per tag over the full history (?start_date=&end_date=&direction=&limit=)"""
+    archive = tracking_service.get_column_archive()
+    if archive is None:
+        return jsonify({'status': 'error', 'message': 'Column archive not available'}), 503
+    
+    direction = request.args.get('direction')
+    if direction and direction.upper() not in ['IN', 'OUT']:
+        return jsonify({'status': 'error', 'message': 'Direction must be IN or OUT'}), 400
+    
+    try:
+        limit = min(limit_arg(20), 1000)
+    except ValueError:
+        return invalid_limit()
+    try:
+        start_ms, end_ms = _range_ms()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    tags = archive.tag_counts(start_ms, end_ms,
+                              direction=direction.upper() if direction else None,
+                              limit=limit)
+    
+    return jsonify({
+        'status': 'success',
+        'count': len(tags),
+        'data': tags
+    })
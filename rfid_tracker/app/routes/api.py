@@ -1,12 +1,52 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, send_file
 from app.services.tracking_service import tracking_service
-from app.utils.helpers import validate_direction, load_json_file, save_json_file
+from app.services.payload_cache import payload_cache, record_fragments, dumps, encode
+from app.utils.helpers import validate_direction, validate_record_id, load_json_file, save_json_file
 from flask import current_app
 import os, json
 from datetime import datetime
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+
+def json_response(payload):
+    """JSON response with pre-encoded parts (RawJSON) spliced in, not re-encoded"""
+    return current_app.response_class(dumps(payload, separators=(',', ':')) + '\n',
+                                       mimetype='application/json')
+
+
+def limit_arg(default=None):
+    """
+    The ?limit= query parameter
+    
+    Raises:
+        ValueError: limit is not a positive integer
+    """
+    value = request.args.get('limit')
+    if not value:
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError(f'invalid limit: {limit}')
+    return limit
+
+
+def invalid_limit():
+    """400 response for a limit limit_arg() rejected"""
+    return jsonify({
+        'status': 'error',
+        'message': 'limit must be a positive integer'
+    }), 400
+
+
+def invalid_since_version():
+    """400 response for a since_version that is not an integer"""
+    return jsonify({
+        'status': 'error',
+        'message': 'since_version must be an integer'
+    }), 400
+
+
 @api_bp.route('/status', methods=['GET'])
 def get_status():
     """Get system status"""
@@ -25,14 +65,31 @@ def get_status():
 
 @api_bp.route('/records', methods=['GET'])
 def get_records():
-    """Get tracking records with filters"""
+    """Get tracking records with filters (?since_version=N skips unchanged records)"""
+    since_version = request.args.get('since_version')
+    if since_version is not None:
+        try:
+            since_version = int(since_version)
+        except ValueError:
+            return invalid_since_version()
+        if not tracking_service.records_changed_since(since_version):
+            return jsonify({
+                'status': 'success',
+                'changed': False,
+                'version': since_version
+            })
+    
     filters = {}
     
     if request.args.get('direction'):
         filters['direction'] = request.args.get('direction')
     
-    if request.args.get('limit'):
-        filters['limit'] = int(request.args.get('limit'))
+    try:
+        limit = limit_arg()
+    except ValueError:
+        return invalid_limit()
+    if limit is not None:
+        filters['limit'] = limit
     
     if request.args.get('start_date'):
         filters['start_date'] = request.args.get('start_date')
@@ -40,25 +97,65 @@ def get_records():
     if request.args.get('end_date'):
         filters['end_date'] = request.args.get('end_date')
     
-    records = tracking_service.get_all_records(filters)
+    # Read before the query: a client polling with this version may refetch
+    # once too often, but never misses a change
+    version = tracking_service.get_records_version()
     
-    return jsonify({
-        'status': 'success',
-        'count': len(records),
-        'data': records
-    })
+    def build():
+        records = tracking_service.get_all_records(filters)
+        return encode({
+            'status': 'success',
+            'count': len(records),
+            'version': version,
+            'data': record_fragments.encode_list(records)
+        })
+    
+    # Polls with the same filters at the same version share one encoded
+    # body; unbounded (full history) responses are too large to keep
+    if 'limit' not in filters:
+        return json_response(build())
+    return json_response(payload_cache.get(('api_records', tuple(sorted(filters.items()))), version, build))
 
 
 @api_bp.route('/records/<tag_id>', methods=['GET'])
 def get_tag_records(tag_id):
-    """Get records for specific RFID tag"""
-    records = tracking_service.get_tag_records(tag_id)
+    """Get records for specific RFID tag (?prefix=true matches a partial EPC)"""
+    prefix = request.args.get('prefix', 'false').lower() == 'true'
+    try:
+        limit = limit_arg()
+    except ValueError:
+        return invalid_limit()
     
-    return jsonify({
+    records = tracking_service.get_tag_records(tag_id, prefix=prefix, limit=limit)
+    
+    return json_response({
         'status': 'success',
         'tag_id': tag_id,
+        'prefix': prefix,
         'count': len(records),
-        'data': records
+        'data': record_fragments.encode_list(records)
+    })
+
+
+@api_bp.route('/tags', methods=['GET'])
+def search_tags():
+    """Search known tags by partial EPC (?q=<prefix>&limit=N)"""
+    query = request.args.get('q', '')
+    try:
+        limit = limit_arg(20)
+    except ValueError:
+        return invalid_limit()
+    
+    tags = tracking_service.search_tags(query, limit=limit)
+    
+    return jsonify({
+        'status': 'success',
+        'query': query,
+        'count': len(tags),
+        'data': [
+            {'tag': tag, 'count': tracking_service.get_tag_record_count(tag)}
+            for tag in tags
+        ]
     })
 
 
@@ -79,7 +176,22 @@ def add_manual_record():
             'message': 'Direction must be IN or OUT'
         }), 400
     
-    record = tracking_service.add_record(data['rfid_tag'], data['direction'])
+    record_id = data.get('record_id')
+    if record_id is not None and not validate_record_id(record_id):
+        return jsonify({
+            'status': 'error',
+            'message': 'record_id must be a string of at most 64 characters'
+        }), 400
+    
+    record = tracking_service.add_record(data['rfid_tag'], data['direction'], record_id)
+    if record is None:
+        # Retried submission: already recorded, so report success without a second record
+        return jsonify({
+            'status': 'success',
+            'message': 'Duplicate record ignored',
+            'duplicate': True,
+            'record_id': record_id
+        })
     
     return jsonify({
         'status': 'success',
@@ -88,6 +200,42 @@ def add_manual_record():
     })
 
 
+@api_bp.route('/records/bulk', methods=['POST'])
+def add_bulk_records():
+    """Add a batch of records ({"records": [...]} or a bare list); all or nothing"""
+    data = request.get_json(silent=True)
+    items = data.get('records') if isinstance(data, dict) else data
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({
+            'status': 'error',
+            'message': 'Body must be a non-empty list of records (or {"records": [...]})'
+        }), 400
+    
+    max_records = current_app.config.get('BULK_MAX_RECORDS', 1000)
+    if len(items) > max_records:
+        return jsonify({
+            'status': 'error',
+            'message': f'At most {max_records} records per batch'
+        }), 400
+    
+    result = tracking_service.add_records(items)
+    if result['errors']:
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid records; nothing was added',
+            'errors': result['errors']
+        }), 400
+    
+    return jsonify({
+        'status': 'success',
+        'message': f"{len(result['records'])} records added",
+        'count': len(result['records']),
+        'duplicates': result['duplicates'],
+        'data': result['records']
+    })
+
+
 @api_bp.route('/records', methods=['DELETE'])
 def clear_records():
     """Clear all tracking records"""
@@ -110,14 +258,107 @@ def clear_records():
 
     return jsonify({
         'status': 'success',
-        'message': 'All records cleared'
+        'message': 'All records cleared',
+        'backup': tracking_service.last_backup
+    })
+
+
+@api_bp.route('/backups', methods=['GET'])
+def get_backups():
+    """Compression progress of data files rotated by clears"""
+    backups = tracking_service.get_backups()
+    
+    return jsonify({
+        'status': 'success',
+        'count': len(backups),
+        'data': backups
+    })
+
+
+@api_bp.route('/inventory/current', methods=['GET'])
+def get_current_inventory():
+    """Get current tag states, paginated (?location=inside&after=<tag>&limit=N)"""
+    location = request.args.get('location')
+    if location and location not in ['inside', 'outside']:
+        return jsonify({
+            'status': 'error',
+            'message': 'Location must be inside or outside'
+        }), 400
+    
+    try:
+        limit = min(limit_arg(50), 500)
+    except ValueError:
+        return invalid_limit()
+    page = tracking_service.get_tag_states(
+        location=location,
+        after=request.args.get('after'),
+        limit=limit
+    )
+    
+    return jsonify({
+        'status': 'success',
+        'count': len(page['states']),
+        'data': page['states'],
+        'next_cursor': page['next_cursor'],
+        'counts': page['counts'],
+        'version': page['version']
+    })
+
+
+@api_bp.route('/inventory/snapshot', methods=['GET'])
+def get_inventory_snapshot():
+    """Full current inventory file; send If-None-Match to get 304 when unchanged"""
+    snapshot = tracking_service.get_inventory_snapshot()
+    if snapshot is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Inventory snapshot is not available'
+        }), 503
+    
+    path, etag = snapshot
+    if etag in request.headers.get('If-None-Match', ''):
+        return '', 304, {'ETag': etag}
+    
+    response = send_file(path, mimetype='application/json', conditional=False, etag=False)
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api_bp.route('/inventory/current/<tag_id>', methods=['GET'])
+def get_tag_state(tag_id):
+    """Get the current state of one tag"""
+    state = tracking_service.get_tag_state(tag_id)
+    if state is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'Tag {tag_id} has not been seen'
+        }), 404
+    
+    return jsonify({
+        'status': 'success',
+        'data': state
     })
 
 
 @api_bp.route('/statistics', methods=['GET'])
 def get_statistics():
-    """Get tracking statistics"""
-    stats = tracking_service.get_statistics()
+    """Get tracking statistics (?since_version=N skips an unchanged payload)"""
+    since_version = request.args.get('since_version')
+    if since_version is not None:
+        try:
+            since_version = int(since_version)
+        except ValueError:
+            return invalid_since_version()
+        stats = tracking_service.get_statistics(since_version=since_version)
+        if stats is None:
+            return jsonify({
+                'status': 'success',
+                'changed': False,
+                'version': since_version
+            })
+    else:
+        stats = tracking_service.get_statistics()
     
     return jsonify({
         'status': 'success',
@@ -3,39 +3,179 @@ WebSocket Event Handlers for RFID Tracking System
 Handles real-time bidirectional communication with frontend clients
 """
 
-from flask_socketio import emit, join_room, leave_room
-from flask import request
+from flask_socketio import emit, join_room, leave_room, rooms
+from flask import request, current_app
 from app.services.tracking_service import tracking_service
 from app.services.rfid_service import rfid_reader
 from app.services.sensor_service import sensor_manager
+from app.services.broadcaster import broadcaster
+from app.services.cluster import cluster
+from app.services.payload_cache import payload_cache, record_fragments, encode
+from app.services import wire_encoding
+from app.utils.helpers import validate_record_id
+
+# Topics a client can subscribe to; each is a Socket.IO room
+TOPICS = ('records', 'stats', 'status', 'sensor-live', 'inventory')
+# Per-door and per-tag topics: 'door:<door_id>', 'tag:<epc>'
+TOPIC_PREFIXES = ('door:', 'tag:')
+MAX_TOPIC_LENGTH = 128
+
+
+def valid_topic(topic) -> bool:
+    """True if topic is a known topic or a per-door / per-tag one"""
+    if not isinstance(topic, str) or len(topic) > MAX_TOPIC_LENGTH:
+        return False
+    return topic in TOPICS or any(topic.startswith(prefix) and len(topic) > len(prefix)
+                                  for prefix in TOPIC_PREFIXES)
+
+
+def parse_topics(value) -> list:
+    """Topics from a list or a comma-separated string, unknown ones dropped"""
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        return []
+    topics = []
+    for topic in value:
+        topic = topic.strip() if isinstance(topic, str) else topic
+        if valid_topic(topic) and topic not in topics:
+            topics.append(topic)
+    return topics
+
+
+def subscribed_topics() -> list:
+    """Topics the calling client is subscribed to"""
+    return [room for room in rooms() if valid_topic(room)]
+
+
+def client_encoding() -> str:
+    """Encoding the calling client asked for on connect ('json' unless it joined an encoding room)"""
+    for room in rooms():
+        if room.startswith(wire_encoding.ROOM_PREFIX):
+            return room[len(wire_encoding.ROOM_PREFIX):]
+    return 'json'
+
+
+def emit_bulk(event, data):
+    """Send the calling client a bulk payload, packed if it asked for a binary encoding"""
+    encoding = client_encoding()
+    emit(event, data if encoding == 'json' else wire_encoding.pack(encoding, data))
+
+
+def encode_sync_state():
+    """The sync state as pre-encoded (statistics_update, records_update) payloads"""
+    state = tracking_service.get_sync_state()
+    statistics = dict(state.pop('statistics'), seq=state['seq'])
+    state['records'] = record_fragments.encode_list(state['records'])
+    return encode(statistics), encode(state)
+
+
+def send_topic_state(topics):
+    """Send the calling client the current state of newly subscribed topics"""
+    if 'status' in topics:
+        emit('status_update', tracking_service.get_status())
+    if 'records' in topics:
+        # Statistics and the newest page of records, both as of change seq;
+        # changes after it arrive as deltas and older records are paged in
+        # with request_records {'before': older_cursor}. Clients connecting
+        # between changes share one encoding of it.
+        statistics, page = payload_cache.get('sync_state', (tracking_service.changes.seq,
+                                                            tracking_service.get_records_version(),
+                                                            tracking_service.get_statistics_version()),
+                                             encode_sync_state)
+        emit('statistics_update', statistics)
+        emit_bulk('records_update', page)
+    elif 'stats' in topics:
+        emit('statistics_update', payload_cache.get('statistics_update',
+                                                    tracking_service.get_statistics_version(),
+                                                    lambda: encode(tracking_service.get_statistics())))
+
+
+def set_rfid_power(socketio, power):
+    """
+    Configure the RFID reader's power (on the process that owns it)
+    
+    Returns:
+        int: The power now set, or None if the reader refused it
+    """
+    if not rfid_reader.configure_power(power):
+        return None
+    broadcast_config_update(socketio)
+    return rfid_reader.read_power
+
+
+def set_sensor_range(socketio, location, distance):
+    """Configure one sensor's detection range (on the process that owns it)"""
+    if location == 'inside':
+        sensor_manager.sensor_inside.configure_range(distance)
+    else:
+        sensor_manager.sensor_outside.configure_range(distance)
+    broadcast_config_update(socketio)
 
 
 def init_websocket_handlers(socketio):
     """Initialize all WebSocket event handlers"""
     
+    # Hardware settings changed on a web worker are applied by the owner
+    cluster.register('set_rfid_power', lambda power: set_rfid_power(socketio, power))
+    cluster.register('set_sensor_range', lambda location, distance: set_sensor_range(socketio, location, distance))
+    
     @socketio.on('connect')
     def handle_connect():
-        """Handle client connection"""
+        """
+        Handle client connection
+        
+        The client is subscribed to the topics in its `topics` query
+        parameter (comma-separated, may be empty), or to WS_DEFAULT_TOPICS
+        without one, and is sent the current state of those topics. An
+        `encoding` query parameter (deflate, msgpack) has bulk payloads
+        sent to it as packed binary; JSON otherwise.
+        """
         client_id = request.sid
         print(f"✅ WebSocket client connected: {client_id}")
         
+        encoding = wire_encoding.negotiate(request.args.get('encoding', 'json'))
+        if encoding != 'json':
+            join_room(wire_encoding.room_for(encoding))
+        
+        requested = request.args.get('topics')
+        topics = parse_topics(requested if requested is not None
+                              else current_app.config.get('WS_DEFAULT_TOPICS', 'records,status,sensor-live'))
+        for topic in topics:
+            join_room(topic)
+        
         # Send initial data to the newly connected client
         emit('connection_established', {
             'message': 'Connected to RFID Tracking Server',
-            'client_id': client_id
+            'client_id': client_id,
+            'topics': topics,
+            'encoding': encoding,
+            'bulk_events': list(wire_encoding.BULK_EVENTS) if encoding != 'json' else []
         })
-        
-        # Send current system status
-        status_data = tracking_service.get_status()
-        emit('status_update', status_data)
-        
-        # Send current statistics
-        stats = tracking_service.get_statistics()
-        emit('statistics_update', stats)
-        
-        # Send recent records (no limit - display all with scrollbar)
-        recent_records = tracking_service.get_all_records()
-        emit('records_update', {'records': recent_records, 'count': len(recent_records)})
+        send_topic_state(topics)
+    
+    @socketio.on('subscribe')
+    def handle_subscribe(data=None):
+        """Handle a client joining topics ({'topics': [...]}); sends their current state"""
+        requested = data.get('topics') if isinstance(data, dict) else None
+        topics = parse_topics(requested)
+        if not topics:
+            emit('error', {'message': f'topics must list any of {", ".join(TOPICS)}, door:<id>, tag:<epc>'})
+            return
+        current = set(rooms())
+        added = [topic for topic in topics if topic not in current]
+        for topic in added:
+            join_room(topic)
+        send_topic_state(added)
+        emit('subscribed', {'topics': subscribed_topics()})
+    
+    @socketio.on('unsubscribe')
+    def handle_unsubscribe(data=None):
+        """Handle a client leaving topics ({'topics': [...]})"""
+        requested = data.get('topics') if isinstance(data, dict) else None
+        for topic in parse_topics(requested):
+            leave_room(topic)
+        emit('subscribed', {'topics': subscribed_topics()})
     
     @socketio.on('disconnect')
     def handle_disconnect():
@@ -50,17 +190,56 @@ def init_websocket_handlers(socketio):
         emit('status_update', status_data)
     
     @socketio.on('request_statistics')
-    def handle_request_statistics():
-        """Handle client request for statistics"""
-        stats = tracking_service.get_statistics()
-        emit('statistics_update', stats)
+    def handle_request_statistics(data=None):
+        """Handle client request for statistics (skipped if since_version is current)"""
+        since_version = data.get('since_version') if isinstance(data, dict) else None
+        stats = tracking_service.get_statistics(since_version=since_version)
+        if stats is not None:
+            emit('statistics_update', stats)
     
     @socketio.on('request_records')
     def handle_request_records(data=None):
-        """Handle client request for records with optional filters"""
-        filters = data if data else {}
-        records = tracking_service.get_all_records(filters)
-        emit('records_update', {'records': records, 'count': len(records)})
+        """
+        Handle client request for a page of records (skipped if since_version is current)
+        
+        Accepts limit, before / after cursors and the filters direction,
+        rfid_tag, start_date and end_date; the reply echoes before / after so
+        the client knows where the page goes.
+        """
+        options = data if isinstance(data, dict) else {}
+        since_version = options.get('since_version')
+        if since_version is not None and not tracking_service.records_changed_since(since_version):
+            return
+        page = tracking_service.get_records_page(options)
+        page.update(before=options.get('before'), after=options.get('after'),
+                    records=record_fragments.encode_list(page['records']))
+        emit_bulk('records_update', page)
+    
+    @socketio.on('request_resync')
+    def handle_request_resync(data=None):
+        """Handle a client that saw a gap in change numbers ({'since': last seq applied})"""
+        since = data.get('since') if isinstance(data, dict) else None
+        resync = tracking_service.get_changes_since(since)
+        topics = subscribed_topics()
+        if 'records' not in topics:
+            resync = filter_resync(resync, topics)
+        emit_bulk('resync', resync)
+    
+    @socketio.on('request_tag_states')
+    def handle_request_tag_states(data=None):
+        """Handle client request for a page of current tag states"""
+        data = data if isinstance(data, dict) else {}
+        try:
+            limit = max(1, min(int(data.get('limit', 50)), 500))
+        except (TypeError, ValueError):
+            emit('error', {'message': 'Invalid limit value'})
+            return
+        page = tracking_service.get_tag_states(
+            location=data.get('location'),
+            after=data.get('after'),
+            limit=limit
+        )
+        emit('tag_states_page', page)
     
     @socketio.on('configure_rfid_power')
     def handle_configure_rfid_power(data):
@@ -71,14 +250,9 @@ def init_websocket_handlers(socketio):
                 emit('error', {'message': 'Invalid power value'})
                 return
             
-            success = rfid_reader.configure_power(power)
-            if success:
-                emit('rfid_power_updated', {'power': rfid_reader.read_power})
-                # Broadcast to all clients
-                socketio.emit('config_update', {
-                    'rfid_power': rfid_reader.read_power,
-                    'sensor_range': sensor_manager.sensor_inside.detection_range
-                })
+            read_power = cluster.run('set_rfid_power', power)
+            if read_power is not None:
+                emit('rfid_power_updated', {'power': read_power})
             else:
                 emit('error', {'message': 'Failed to update RFID power'})
         except Exception as e:
@@ -95,17 +269,8 @@ def init_websocket_handlers(socketio):
                 emit('error', {'message': 'Invalid location or distance'})
                 return
             
-            if location == 'inside':
-                sensor_manager.sensor_inside.configure_range(distance)
-            else:
-                sensor_manager.sensor_outside.configure_range(distance)
-            
+            cluster.run('set_sensor_range', location, distance)
             emit('sensor_range_updated', {'location': location, 'range': distance})
-            # Broadcast to all clients
-            socketio.emit('config_update', {
-                'rfid_power': rfid_reader.read_power,
-                'sensor_range': sensor_manager.sensor_inside.detection_range
-            })
         except Exception as e:
             emit('error', {'message': f'Error updating sensor range: {str(e)}'})
     
@@ -124,13 +289,46 @@ def init_websocket_handlers(socketio):
                 emit('error', {'message': 'Direction must be IN or OUT'})
                 return
             
-            record = tracking_service.add_record(rfid_tag, direction.upper())
+            record_id = data.get('record_id')
+            if record_id is not None and not validate_record_id(record_id):
+                emit('error', {'message': 'record_id must be a string of at most 64 characters'})
+                return
+            
+            record = tracking_service.add_record(rfid_tag, direction.upper(), record_id)
+            if record is None:
+                emit('success', {'message': 'Duplicate record ignored', 'record_id': record_id})
+                return
             
-            # This will trigger the broadcast from tracking_service
-            emit('record_added', {'record': record})
+            # Every client (this one included) gets the numbered record_added
+            # broadcast from tracking_service; this only acknowledges the request
+            emit('success', {'message': 'Record added', 'record_id': record['record_id']})
         except Exception as e:
             emit('error', {'message': f'Error adding record: {str(e)}'})
     
+    @socketio.on('add_manual_records')
+    def handle_add_manual_records(data):
+        """Handle a batch of records ({'records': [...]}); all or nothing"""
+        try:
+            items = data.get('records') if isinstance(data, dict) else data
+            if not isinstance(items, list) or not items:
+                emit('error', {'message': 'records must be a non-empty list'})
+                return
+            
+            max_records = current_app.config.get('BULK_MAX_RECORDS', 1000)
+            if len(items) > max_records:
+                emit('error', {'message': f'At most {max_records} records per batch'})
+                return
+            
+            # Broadcasts one records_added event on success
+            result = tracking_service.add_records(items)
+            if result['errors']:
+                emit('error', {'message': 'Invalid records; nothing was added', 'errors': result['errors']})
+                return
+            emit('success', {'message': f"{len(result['records'])} records added",
+                             'duplicates': result['duplicates']})
+        except Exception as e:
+            emit('error', {'message': f'Error adding records: {str(e)}'})
+    
     @socketio.on('clear_records')
     def handle_clear_records(data):
         """Handle request to clear all records"""
@@ -149,9 +347,7 @@ def init_websocket_handlers(socketio):
                 emit('error', {'message': 'Failed to clear records (server error)'} )
                 return
 
-            # Broadcast to all clients
-            socketio.emit('records_cleared', {})
-            socketio.emit('statistics_update', tracking_service.get_statistics())
+            # records_cleared is broadcast by tracking_service
             emit('success', {'message': 'All records cleared'})
         except Exception as e:
             emit('error', {'message': f'Error clearing records: {str(e)}'})
@@ -164,50 +360,148 @@ def init_websocket_handlers(socketio):
     print("✅ WebSocket event handlers registered for RFID tracking")
 
 
+def broadcast_event(socketio, event, data, key=None, to=None, relay=True):
+    """
+    Broadcast an event through the coalescing broadcaster (one batched frame
+    per client per window), or directly if it is not running. On a cluster
+    owner the event is relayed to the web workers, which serve the clients.
+    
+    Args:
+        key: Queued broadcasts with the same key are superseded by this one
+             (only the latest status, reading, ... matters)
+        to: Topics (rooms) whose subscribers get it; None = every client
+        relay: False for numbered changes (workers get those from the change feed)
+    """
+    if relay and cluster.relay(event, data, key, to):
+        return
+    if not broadcaster.send(event, data, key, to):
+        socketio.emit(event, data, to=to)
+
+
 def broadcast_tag_detected(socketio, tag_id, direction=None):
     """
-    Broadcast tag detection event to all connected clients
+    Broadcast tag detection event to sensor-live and the subscribers of the
+    tag and of this unit's door
     Called by rfid_service when a tag is detected
     """
-    socketio.emit('tag_detected', {
+    to = ['sensor-live', f'tag:{tag_id}']
+    door_id = current_app.config.get('DOOR_ID')
+    if door_id:
+        to.append(f'door:{door_id}')
+    broadcast_event(socketio, 'tag_detected', {
         'tag_id': tag_id,
         'direction': direction,
         'timestamp': tracking_service.get_status().get('timestamp', '')
-    })
+    }, key=f'tag_detected:{tag_id}', to=to)
+
+
+def record_topics(record) -> list:
+    """The door and tag topics a record belongs to"""
+    topics = []
+    if record.get('door_id'):
+        topics.append(f"door:{record['door_id']}")
+    if record.get('rfid_tag'):
+        topics.append(f"tag:{record['rfid_tag']}")
+    return topics
 
 
-def broadcast_record_added(socketio, record):
+def topic_records(change) -> dict:
+    """Records of a record_added / records_added change, grouped by door and tag topic"""
+    records = change.get('records') or ([change['record']] if change.get('record') else [])
+    grouped = {}
+    for record in records:
+        for topic in record_topics(record):
+            grouped.setdefault(topic, []).append(record)
+    return grouped
+
+
+def filter_resync(resync, topics):
     """
-    Broadcast new record to all connected clients
-    Called by tracking_service when a record is added
+    A resync cut down to the records of a client's door / tag topics, for
+    clients that do not follow records (and so get no numbered changes)
     """
-    socketio.emit('record_added', {
-        'record': record
-    })
-    
-    # Also send updated statistics
-    stats = tracking_service.get_statistics()
-    socketio.emit('statistics_update', stats)
+    topics = set(topics)
+
+    def matching(records):
+        return [record for record in records if topics.intersection(record_topics(record))]
+
+    if resync.get('full'):
+        return dict(resync, records=matching(resync['records']))
+    changes = []
+    for change in resync['changes']:
+        data = change['data']
+        if change['event'] == 'record_added':
+            if not matching([data['record']]):
+                continue
+        elif change['event'] == 'records_added':
+            records = matching(data['records'])
+            if not records:
+                continue
+            data = dict(data, records=records, count=len(records))
+        changes.append({'event': change['event'], 'data': data})
+    return dict(resync, changes=changes)
+
+
+def broadcast_change(socketio, event, change):
+    """
+    Broadcast a numbered change to records subscribers
+    Called by tracking_service for record_added, records_added,
+    records_cleared and resync_required. Each payload carries its seq and
+    only what changed (new records, stats_delta); a client that sees a gap
+    in seq sends request_resync. Never superseded, so no seq goes missing.
     
-    # Send updated recent records (no limit - display all with scrollbar)
-    recent_records = tracking_service.get_all_records()
-    socketio.emit('records_update', {
-        'records': recent_records,
-        'count': len(recent_records)
-    })
+    The records of a record change also go to each of their door and tag
+    topics as an un-numbered topic_records event ({'topic', 'records'}),
+    holding only that topic's records: those subscribers see a subset of
+    the changes, which numbering would report as gaps.
+    """
+    broadcast_event(socketio, event, change, to=['records'], relay=False)
+    for topic, records in topic_records(change).items():
+        broadcast_event(socketio, 'topic_records', {'topic': topic, 'records': records},
+                        to=[topic], relay=False)
+
+
+def broadcast_statistics(socketio, stats):
+    """
+    Broadcast the latest statistics to stats subscribers (clients that show
+    counts without following records; records subscribers get stats_delta)
+    Called by tracking_service when the statistics change
+    """
+    broadcast_event(socketio, 'statistics_update', stats, key='statistics_update', to=['stats'])
+
+
+def broadcast_tag_state_changed(socketio, state, version):
+    """
+    Broadcast one tag's new state (delta) to inventory subscribers and to
+    those of the tag and of the door it last passed
+    Called by tracking_service when a record changes a tag's state
+    """
+    broadcast_event(socketio, 'tag_state_changed', {
+        'state': state,
+        'version': version
+    }, key=f"tag_state_changed:{state['rfid_tag']}",
+        to=['inventory', f"tag:{state['rfid_tag']}", f"door:{state['last_door']}"])
+
+
+def broadcast_config_update(socketio):
+    """Broadcast the reader power and sensor range to status subscribers"""
+    broadcast_event(socketio, 'config_update', {
+        'rfid_power': rfid_reader.read_power,
+        'sensor_range': sensor_manager.sensor_inside.detection_range
+    }, key='config_update', to=['status'])
 
 
 def broadcast_status_update(socketio, status_data):
     """
-    Broadcast status update to all connected clients
+    Broadcast status update to status subscribers
     Called when system status changes
     """
-    socketio.emit('status_update', status_data)
+    broadcast_event(socketio, 'status_update', status_data, key='status_update', to=['status'])
 
 
 def broadcast_sensor_activity(socketio, sensor_location, detected, distance=0):
     """
-    Broadcast sensor activity to all connected clients
+    Broadcast sensor activity to sensor-live subscribers
     Called by sensor_service when sensors detect activity
     
     Args:
@@ -215,9 +509,9 @@ def broadcast_sensor_activity(socketio, sensor_location, detected, distance=0):
         detected: True if human detected, False otherwise
         distance: Distance in cm (0-100)
     """
-    socketio.emit('sensor_activity', {
+    broadcast_event(socketio, 'sensor_activity', {
         'location': sensor_location,
         'detected': detected,
         'distance': distance,
         'timestamp': tracking_service.get_status().get('timestamp', '')
-    })
+    }, key=f'sensor_activity:{sensor_location}', to=['sensor-live'])
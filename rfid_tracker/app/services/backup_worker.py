@@ -0,0 +1,133 @@
+"""
+Background compression of rotated data files
+"""
+
+import gzip
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+CHUNK_SIZE = 1024 * 1024
+# Finished jobs kept for the progress endpoint
+MAX_FINISHED_JOBS = 20
+
+
+class BackupWorker:
+    """
+    Single background thread that gzips rotated data files.
+
+    Clearing records only renames the active file (O(1) under the tracking
+    lock); the rotated file is queued here and compressed in chunks, with
+    byte progress reported per job. The uncompressed file is removed once
+    its .gz copy is complete, so an interrupted job leaves the rotated file
+    intact and can simply be queued again.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._jobs: Dict[int, dict] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, source: str) -> dict:
+        """
+        Queue a rotated file for compression
+
+        Returns:
+            dict: The job (id, source, target, status, progress)
+        """
+        with self._lock:
+            job = {
+                'id': self._next_id,
+                'source': source,
+                'target': source + '.gz',
+                'status': 'queued',
+                'bytes_total': os.path.getsize(source) if os.path.exists(source) else 0,
+                'bytes_done': 0,
+                'queued_at': time.time(),
+                'finished_at': None,
+                'error': None
+            }
+            self._jobs[job['id']] = job
+            self._next_id += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='BackupWorker', daemon=True)
+                self._thread.start()
+        self._queue.put(job['id'])
+        print(f"[INFO] Backup queued: {source}")
+        return dict(job)
+
+    def jobs(self) -> List[dict]:
+        """All known jobs, newest first, with progress"""
+        with self._lock:
+            return [self._progress(job) for job in sorted(self._jobs.values(), key=lambda j: -j['id'])]
+
+    def job(self, job_id: int) -> Optional[dict]:
+        """One job with progress, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._progress(job) if job else None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued job has finished (tests, shutdown)"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    @staticmethod
+    def _progress(job: dict) -> dict:
+        result = dict(job)
+        total = job['bytes_total']
+        result['progress'] = 1.0 if job['status'] == 'done' else (job['bytes_done'] / total if total else 0.0)
+        return result
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._compress(self._jobs[job_id])
+            finally:
+                self._queue.task_done()
+            self._prune()
+
+    def _compress(self, job: dict):
+        job['status'] = 'running'
+        tmp_path = job['target'] + '.tmp'
+        try:
+            with open(job['source'], 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    job['bytes_done'] += len(chunk)
+            os.replace(tmp_path, job['target'])
+            os.remove(job['source'])
+            job['status'] = 'done'
+            print(f"[INFO] Backup compressed: {job['target']}")
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            print(f"[WARNING] Backup compression failed for {job['source']}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        job['finished_at'] = time.time()
+
+    def _prune(self):
+        with self._lock:
+            finished = sorted(job_id for job_id, job in self._jobs.items()
+                              if job['status'] in ('done', 'failed'))
+            for job_id in finished[:-MAX_FINISHED_JOBS]:
+                del self._jobs[job_id]
+
+
+# Global instance
+backup_worker = BackupWorker()
@@ -0,0 +1,352 @@
+"""
+Coalescing fan-out of WebSocket broadcasts
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+# Seconds of flushes the saved frames/bytes rates are averaged over
+RATE_WINDOW = 60
+# Bytes around an event sent as its own frame: WebSocket header (~4),
+# Socket.IO packet type "42" and the JSON array ["<event>",<data>]
+FRAME_OVERHEAD = 4 + 2 + 5
+# Bytes of a batch frame besides its events: header, "42", ["batch",[]]
+BATCH_OVERHEAD = 4 + 2 + 12
+# Bytes around each event inside a batch: ["<event>",<data>] and a comma
+BATCH_EVENT_OVERHEAD = 6
+# Clients with the deepest outbound queues listed in stats()
+MAX_REPORTED_CLIENTS = 5
+
+
+class Broadcaster:
+    """
+    Collects broadcasts for `window` seconds and sends each client one
+    'batch' frame: a list of the [event, data] pairs addressed to it, in the
+    order sent.
+
+    A broadcast goes to every client or to the members of a list of rooms
+    (topics). At flush time the recipients of each event are looked up, and
+    clients due the same events share one emit, so a client in several
+    rooms still gets one frame per window.
+
+    A broadcast given a key supersedes the queued one with the same key
+    (latest status, latest reading per sensor): only the newest is sent, in
+    the newest's position. Numbered changes are sent without a key, so none
+    is ever dropped. A client due a single event gets it on its own.
+
+    The flush thread calls the emit and members functions given to start();
+    until then, or with a window of 0, send() returns False and the caller
+    emits itself. Given an encode function, each event's data is encoded
+    once per flush and the result reused in every frame that carries it.
+
+    Clients that asked for a binary encoding (see wire_encoding) get their
+    frame as a 'batch' of packed bytes, even for a single event, so they
+    decode everything in arrival order.
+
+    Backpressure: a client whose outbound queue holds queue_max frames is
+    lagging and is sent nothing more. Keyed events for it are dropped
+    (newer ones will follow); numbered changes (data with a 'seq') are
+    collapsed into one resync_required {seq, reason} sent ahead of its next
+    frame once its queue has drained to half, so it catches up with
+    request_resync. A client still lagging after lag_timeout seconds is
+    disconnected. send() never blocks, so a slow client cannot hold up the
+    door pipeline.
+    """
+
+    def __init__(self):
+        self.window = 0.0
+        self._emit: Optional[Callable[..., None]] = None
+        self._members: Optional[Callable[[Optional[List[str]]], Set[str]]] = None
+        self._encode: Optional[Callable[[object], object]] = None
+        self._encodings: Optional[Callable[[], Dict[str, str]]] = None
+        self._pack: Optional[Callable[[str, object], bytes]] = None
+        self._backlog: Optional[Callable[[str], int]] = None
+        self._disconnect: Optional[Callable[[str], None]] = None
+        self.queue_max = 0  # 0 = no backpressure
+        self.lag_timeout = 30.0
+        # Client id -> {'depth', 'dropped', 'lagging_since', 'missed_seq'}
+        self._clients: Dict[str, dict] = {}
+        self._pending = []  # [event, data, rooms] or None where superseded
+        self._keys = {}  # key -> index in _pending
+        self._superseded = []  # (rooms, own-frame bytes) merged this window
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.events_in = 0
+        self.events_merged = 0
+        self.frames_sent = 0
+        self.frames_saved = 0
+        self.bytes_saved = 0
+        self.frames_dropped = 0
+        self.slow_disconnects = 0
+        # Per flush: (time, frames saved, bytes saved), for the rates
+        self._recent = deque()
+
+    def start(self, emit: Callable[..., None], members: Callable[[Optional[List[str]]], Set[str]],
+              window: float = 0.05, encode: Optional[Callable[[object], object]] = None,
+              encodings: Optional[Callable[[], Dict[str, str]]] = None,
+              pack: Optional[Callable[[str, object], bytes]] = None,
+              backlog: Optional[Callable[[str], int]] = None,
+              disconnect: Optional[Callable[[str], None]] = None,
+              queue_max: int = 100, lag_timeout: float = 30):
+        """
+        Start coalescing
+
+        Args:
+            emit: emit(event, data, to=None | [sid, ...]) (socketio.emit)
+            members: Client ids in any of a list of rooms, or of all clients for None
+            window: Seconds to collect broadcasts for (0 = send each at once)
+            encode: Pre-encodes data into something emit's json module splices
+                    in as is (payload_cache.encode); None sends data as given
+            encodings: Client id -> encoding of the clients not using JSON
+            pack: pack(encoding, data) -> bytes for those clients (wire_encoding.pack)
+            backlog: Frames waiting in a client's outbound queue (None = no backpressure)
+            disconnect: Drops a client without waiting for its queue to drain
+            queue_max: Queued frames at which a client counts as lagging (0 = no limit)
+            lag_timeout: Seconds a client may lag before it is disconnected
+        """
+        self.stop()
+        with self._cond:
+            self._emit = emit
+            self._members = members
+            self._encode = encode
+            self._encodings = encodings
+            self._pack = pack
+            self._backlog = backlog
+            self._disconnect = disconnect
+            self.queue_max = max(0, int(queue_max)) if backlog is not None else 0
+            self.lag_timeout = max(0.0, float(lag_timeout))
+            self._clients = {}
+            self.window = max(0.0, float(window))
+            self._stopping = False
+            if self.window <= 0:
+                return
+            self._thread = threading.Thread(target=self._run, name='Broadcaster', daemon=True)
+            thread = self._thread
+        thread.start()
+
+    def stop(self):
+        """Send what is queued and stop the flush thread"""
+        with self._cond:
+            thread = self._thread
+            self._thread = None
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout=1)
+
+    def send(self, event: str, data: object, key: Optional[str] = None,
+             to: Optional[Iterable[str]] = None) -> bool:
+        """
+        Queue a broadcast for the next frame
+
+        Args:
+            key: A queued broadcast with the same key is replaced by this one
+            to: Rooms whose members get it (None = every client)
+
+        Returns:
+            bool: False if not coalescing (the caller should emit directly)
+        """
+        rooms = list(to) if to is not None else None
+        with self._cond:
+            if self._thread is None:
+                return False
+            self.events_in += 1
+            if key is not None:
+                index = self._keys.get(key)
+                if index is not None:
+                    superseded = self._pending[index]
+                    self._pending[index] = None
+                    self.events_merged += 1
+                    self._superseded.append((superseded[2], FRAME_OVERHEAD + len(superseded[0])
+                                             + self._data_size(superseded[1])))
+                self._keys[key] = len(self._pending)
+            self._pending.append([event, data, rooms])
+            self._cond.notify()
+        return True
+
+    def stats(self) -> dict:
+        """Broadcasts in, frames sent and saved summed over clients, and backpressure"""
+        with self._cond:
+            now = time.time()
+            cutoff = now - RATE_WINDOW
+            while self._recent and self._recent[0][0] < cutoff:
+                self._recent.popleft()
+            # Deepest outbound queues as of the last flush that had frames for them
+            deepest = sorted(self._clients.items(), key=lambda item: item[1]['depth'], reverse=True)
+            return {
+                'window_ms': round(self.window * 1000),
+                'events_in': self.events_in,
+                'events_merged': self.events_merged,
+                'frames_sent': self.frames_sent,
+                'frames_saved': self.frames_saved,
+                'bytes_saved': self.bytes_saved,
+                'frames_saved_per_sec': round(sum(item[1] for item in self._recent) / RATE_WINDOW, 2),
+                'bytes_saved_per_sec': round(sum(item[2] for item in self._recent) / RATE_WINDOW, 1),
+                'client_queue_max': self.queue_max,
+                'frames_dropped': self.frames_dropped,
+                'slow_disconnects': self.slow_disconnects,
+                'lagging_clients': sum(1 for client in self._clients.values() if client['lagging_since']),
+                'clients': [{
+                    'sid': sid,
+                    'queue_depth': client['depth'],
+                    'dropped': client['dropped'],
+                    'lagging_seconds': round(now - client['lagging_since'], 1) if client['lagging_since'] else 0
+                } for sid, client in deepest[:MAX_REPORTED_CLIENTS]]
+            }
+
+    @staticmethod
+    def _data_size(data: object) -> int:
+        return len(json.dumps(data, separators=(',', ':'), default=str))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                stopping = self._stopping
+            # Let the window fill before taking what has arrived
+            if not stopping:
+                time.sleep(self.window)
+            with self._cond:
+                events = [item for item in self._pending if item is not None]
+                superseded = self._superseded
+                self._pending = []
+                self._keys = {}
+                self._superseded = []
+                emit = self._emit
+                members = self._members
+                encode = self._encode
+                encodings = self._encodings
+                pack = self._pack
+                backlog = self._backlog
+                disconnect = self._disconnect
+            try:
+                binary = encodings() if encodings is not None and pack is not None else {}
+                frames, frames_saved, bytes_saved, slow = self._flush(emit, members, events, superseded,
+                                                                      encode, binary, pack, backlog)
+            except Exception as e:
+                print(f"[WARNING] Broadcast failed: {e}")
+                continue
+            for sid in slow:
+                print(f"[WARNING] Disconnecting WebSocket client {sid}: outbound queue full for "
+                      f"{self.lag_timeout:g}s")
+                try:
+                    if disconnect is not None:
+                        disconnect(sid)
+                except Exception as e:
+                    print(f"[WARNING] Failed to disconnect slow client {sid}: {e}")
+            with self._cond:
+                self.frames_sent += frames
+                self.frames_saved += frames_saved
+                self.bytes_saved += bytes_saved
+                self._recent.append((time.time(), frames_saved, bytes_saved))
+
+    def _admit(self, due: Dict[str, List[int]], events: list, everyone: Set[str],
+               backlog: Optional[Callable[[str], int]]) -> tuple:
+        """
+        Apply backpressure to this flush's recipients (see the class docstring)
+
+        Returns:
+            tuple: ({sid: seq} of clients to send resync_required first,
+                    [sids lagging longer than lag_timeout])
+        """
+        markers = {}
+        slow = []
+        now = time.time()
+        with self._cond:
+            for sid in [sid for sid in self._clients if sid not in everyone]:
+                del self._clients[sid]
+            if backlog is None or not self.queue_max:
+                return markers, slow
+            for sid in list(due):
+                client = self._clients.setdefault(sid, {'depth': 0, 'dropped': 0, 'lagging_since': None,
+                                                        'missed_seq': None})
+                client['depth'] = depth = backlog(sid)
+                if client['lagging_since'] is not None and depth <= self.queue_max // 2:
+                    # Drained: resume, with a marker if numbered changes were missed
+                    client['lagging_since'] = None
+                    if client['missed_seq'] is not None:
+                        markers[sid] = client['missed_seq']
+                        client['missed_seq'] = None
+                elif client['lagging_since'] is not None or depth >= self.queue_max:
+                    if client['lagging_since'] is None:
+                        client['lagging_since'] = now
+                        print(f"[WARNING] WebSocket client {sid} is lagging ({depth} frames queued)")
+                    indexes = due.pop(sid)
+                    client['dropped'] += len(indexes)
+                    self.frames_dropped += 1
+                    for index in indexes:
+                        data = events[index][1]
+                        if isinstance(data, dict) and isinstance(data.get('seq'), int):
+                            client['missed_seq'] = max(client['missed_seq'] or 0, data['seq'])
+                    if now - client['lagging_since'] >= self.lag_timeout:
+                        slow.append(sid)
+                        del self._clients[sid]
+                        self.slow_disconnects += 1
+        return markers, slow
+
+    def _flush(self, emit, members, events: list, superseded: list, encode, binary: Dict[str, str],
+               pack, backlog) -> tuple:
+        """
+        Send each client the events addressed to it
+
+        Args:
+            events: [event, data, rooms] in order
+            binary: Client id -> encoding, for clients sent packed batches
+
+        Returns:
+            tuple: (frames sent, frames saved, bytes saved, clients to disconnect),
+                   summed over clients, against one frame per event per recipient
+        """
+        everyone = members(None)
+        # Client -> indexes of its events
+        due = {}
+        for index, (_, _, rooms) in enumerate(events):
+            for sid in (everyone if rooms is None else members(rooms)):
+                due.setdefault(sid, []).append(index)
+        markers, slow = self._admit(due, events, everyone, backlog)
+        marker_index = {}
+        for sid, seq in markers.items():
+            if seq not in marker_index:
+                marker_index[seq] = len(events)
+                events.append(['resync_required', {'seq': seq, 'reason': 'backpressure'}, None])
+            due.setdefault(sid, []).insert(0, marker_index[seq])
+        # Once per event, however many JSON frames it ends up in
+        events = [[event, data, rooms, encode(data) if encode is not None else data]
+                  for event, data, rooms in events]
+
+        # Clients grouped by identical event lists and encoding
+        groups = {}
+        for sid, indexes in due.items():
+            groups.setdefault((tuple(indexes), binary.get(sid)), []).append(sid)
+
+        frames = frames_saved = bytes_saved = 0
+        for (indexes, encoding), sids in groups.items():
+            if encoding is not None:
+                emit('batch', pack(encoding, [[events[i][0], events[i][1]] for i in indexes]), to=sids)
+            elif len(indexes) == 1:
+                event, _, _, encoded = events[indexes[0]]
+                emit(event, encoded, to=sids)
+            else:
+                emit('batch', [[events[i][0], events[i][3]] for i in indexes], to=sids)
+            if len(indexes) > 1:
+                # Each event saves its own frame overhead; the batch adds its own
+                bytes_saved += len(sids) * ((FRAME_OVERHEAD - BATCH_EVENT_OVERHEAD) * len(indexes)
+                                            - BATCH_OVERHEAD + 1)
+                frames_saved += len(sids) * (len(indexes) - 1)
+            frames += len(sids)
+        for rooms, size in superseded:
+            recipients = len(everyone if rooms is None else members(rooms))
+            frames_saved += recipients
+            bytes_saved += recipients * size
+        return frames, frames_saved, bytes_saved, slow
+
+
+# Global instance
+broadcaster = Broadcaster()
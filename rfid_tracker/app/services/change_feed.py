@@ -0,0 +1,93 @@
+"""
+Numbered log of recent changes broadcast to WebSocket clients
+"""
+
+import threading
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+
+
+class ChangeFeed:
+    """
+    Sequence-numbered record of broadcast changes.
+
+    Every change gets the next sequence number, and recent changes are kept
+    (up to `capacity` records in total, a bulk change counting each of its
+    records) so a client that notices a gap in the numbers can be sent just
+    what it missed. A client further behind than the kept changes needs the
+    full state instead.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.seq = 0
+        self._changes = deque()  # (seq, event, data, weight), oldest first
+        self._weight = 0
+        self._lock = threading.Lock()
+        # Called with (event, change, weight) as each change is numbered, in
+        # seq order (the cluster owner relays changes to web workers this way)
+        self.listener: Optional[Callable[[str, dict, int], None]] = None
+
+    def resize(self, capacity: int):
+        """Change how many records' worth of changes are kept"""
+        with self._lock:
+            self.capacity = capacity
+            self._evict()
+
+    def append(self, event: str, data: dict, weight: int = 1) -> dict:
+        """
+        Number a change and keep it for replay
+
+        Args:
+            event: WebSocket event name the change is broadcast as
+            data: Event payload (not modified)
+            weight: Records the change carries
+
+        Returns:
+            dict: The payload with its 'seq' added
+        """
+        with self._lock:
+            self.seq += 1
+            change = dict(data, seq=self.seq)
+            self._changes.append((self.seq, event, change, weight))
+            self._weight += weight
+            self._evict()
+            if self.listener is not None:
+                self.listener(event, change, weight)
+            return change
+
+    def add(self, event: str, change: dict, weight: int = 1):
+        """Keep a change numbered by another feed (a replica following the owner's)"""
+        with self._lock:
+            self.seq = change['seq']
+            self._changes.append((self.seq, event, change, weight))
+            self._weight += weight
+            self._evict()
+
+    def reset(self, seq: int):
+        """Forget kept changes and continue numbering after seq"""
+        with self._lock:
+            self.seq = seq
+            self._changes.clear()
+            self._weight = 0
+
+    def since(self, seq: int) -> Optional[List[Tuple[str, dict]]]:
+        """
+        (event, payload) of each change after seq, oldest first
+
+        Returns:
+            list: The missed changes, or None if they are no longer all kept
+                  (or seq is from a different run)
+        """
+        with self._lock:
+            if seq > self.seq:
+                return None
+            oldest = self._changes[0][0] if self._changes else self.seq + 1
+            if seq + 1 < oldest:
+                return None
+            return [(event, change) for change_seq, event, change, _ in self._changes if change_seq > seq]
+
+    def _evict(self):
+        # Keep at least the newest change, however large
+        while len(self._changes) > 1 and self._weight > self.capacity:
+            self._weight -= self._changes.popleft()[3]
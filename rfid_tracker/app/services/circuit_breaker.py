@@ -0,0 +1,105 @@
+"""
+Circuit breaker for calls to a remote service
+"""
+
+import time
+from collections import deque
+from typing import Callable, Optional
+
+# Recent state changes kept for the status API
+MAX_TRANSITIONS = 10
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker.
+
+    Closed: requests flow; failure_threshold consecutive failures open it.
+    Open: no requests until the reset timeout passes, then one probe is let
+    through (half-open). A successful probe closes the breaker; a failed one
+    reopens it with the reset timeout doubled, up to max_reset_timeout.
+
+    Not thread-safe on its own: callers serialise access (the dispatcher
+    outbox holds its condition lock).
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 5.0,
+                 max_reset_timeout: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._clock = clock
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.reset_timeout = reset_timeout
+        self._opened_at = None
+        self._probe_at = 0.0
+        self.open_seconds_total = 0.0
+        self.times_opened = 0
+        self.transitions = deque(maxlen=MAX_TRANSITIONS)
+
+    def _transition(self, state: str):
+        now = self._clock()
+        if self.state == self.CLOSED and state != self.CLOSED:
+            self._opened_at = now
+            self.times_opened += 1
+        elif state == self.CLOSED and self._opened_at is not None:
+            self.open_seconds_total += now - self._opened_at
+            self._opened_at = None
+        level = '[INFO]' if state == self.CLOSED else '[WARNING]'
+        print(f"{level} Dispatcher circuit {self.state} -> {state}")
+        self.transitions.append({'from': self.state, 'to': state, 'at': time.time()})
+        self.state = state
+
+    def allow_request(self) -> bool:
+        """True if a request may be sent now (in the open state, claims the single probe)"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self._clock() >= self._probe_at:
+            self._transition(self.HALF_OPEN)
+            return True
+        return False
+
+    def retry_in(self) -> Optional[float]:
+        """Seconds until a probe is allowed while open, else None"""
+        if self.state != self.OPEN:
+            return None
+        return max(0.0, self._probe_at - self._clock())
+
+    def record_success(self):
+        """The remote service answered"""
+        self.consecutive_failures = 0
+        if self.state != self.CLOSED:
+            self.reset_timeout = self.base_reset_timeout
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        """The remote service could not be reached or failed"""
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN:
+            self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+            self._open()
+        elif self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self._probe_at = self._clock() + self.reset_timeout
+        self._transition(self.OPEN)
+
+    def stats(self) -> dict:
+        """State, failure count and time spent open"""
+        now = self._clock()
+        open_for = now - self._opened_at if self._opened_at is not None else 0.0
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'times_opened': self.times_opened,
+            'open_for_seconds': round(open_for, 1),
+            'open_seconds_total': round(self.open_seconds_total + open_for, 1),
+            'next_probe_in': round(self.retry_in(), 1) if self.state == self.OPEN else None,
+            'transitions': list(self.transitions)
+        }
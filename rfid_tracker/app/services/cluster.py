@@ -0,0 +1,364 @@
+"""
+Owner process and web worker processes: state fan-out and forwarded writes
+"""
+
+import itertools
+import os
+import subprocess
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from queue import Queue
+from typing import Callable, Dict, List, Optional
+
+# Records per message while a web worker loads the owner's state
+STATE_CHUNK_SIZE = 5000
+# Seconds a web worker waits for the owner to run a forwarded call
+CALL_TIMEOUT = 30
+# Seconds a starting web worker keeps trying to reach the owner
+CONNECT_TIMEOUT = 30
+# Seconds between checks for exited web workers (restarted by the owner)
+SUPERVISE_INTERVAL = 1
+# Endpoints a web worker answers from its replica; any other request
+# (writes, hardware, files, system) is forwarded to the owner
+REPLICA_ENDPOINTS = frozenset((
+    'index', 'static',
+    'api.get_records', 'api.get_tag_records', 'api.search_tags', 'api.get_current_inventory',
+    'api.get_tag_state', 'api.get_statistics', 'api.health_check',
+    'config.get_rfid_range', 'config.get_sensor_range'
+))
+
+
+class _Worker:
+    """A connected web worker, as seen by the owner"""
+
+    def __init__(self, conn, worker_id: int, pid: int):
+        self.conn = conn
+        self.worker_id = worker_id
+        self.pid = pid
+        self.connected_at = time.time()
+        # Everything sent to the worker, in order (replies included)
+        self.outbox = Queue()
+        self.subscribed = False
+        self.calls = 0
+
+
+class Cluster:
+    """
+    Link between the process that owns the hardware and the store (owner)
+    and the web worker processes serving REST and Socket.IO.
+
+    Each worker connects to the owner over a Unix socket (authenticated
+    with SECRET_KEY) and is sent the owner's state as of a change seq,
+    then every numbered change, broadcast and retention cut, in order. The
+    worker keeps a read replica from these and fans broadcasts out to its
+    own clients through its broadcaster. Writes made on a worker are calls
+    the owner runs; their replies travel behind the changes they caused, so
+    a worker's replica already holds a write when the call returns.
+
+    In a single process (role 'single') calls run locally and nothing is
+    relayed.
+    """
+
+    def __init__(self):
+        self.role = 'single'
+        self.worker_id = 0
+        self._calls: Dict[str, Callable] = {}
+        self._lock = threading.Lock()
+        # Owner
+        self._app = None
+        self._listener = None
+        self._state: Optional[Callable] = None
+        self._workers: List[_Worker] = []
+        self._processes: Dict[int, subprocess.Popen] = {}
+        self._command: List[str] = []
+        self._stopping = False
+        self.messages_sent = 0
+        self.worker_restarts = 0
+        # Web worker
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._call_ids = itertools.count(1)
+        self._replies: Dict[int, list] = {}  # call id -> [Event, ok, value]
+        self._handlers: Dict[str, Callable] = {}
+        self.calls_forwarded = 0
+
+    def register(self, name: str, func: Callable):
+        """Make func callable by name from web workers (and by run() here)"""
+        self._calls[name] = func
+
+    def run(self, name: str, *args):
+        """Run a registered call: on the owner from a web worker, here otherwise"""
+        if self.role == 'web':
+            return self.call(name, *args)
+        return self._calls[name](*args)
+
+    # ----- Owner -----
+
+    def start_owner(self, app, address: str, authkey: bytes, state: Callable):
+        """
+        Accept web worker connections
+
+        Args:
+            app: Flask app calls are run in the context of
+            address: Unix socket path
+            authkey: Shared secret workers authenticate with
+            state: state(subscribe) -> (meta, records snapshot); calls
+                   subscribe(meta, records) at the instant meta is current
+                   (under the store's write lock), so no change is missed
+                   or repeated
+        """
+        self.role = 'owner'
+        self._app = app
+        self._state = state
+        if os.path.exists(address):
+            os.unlink(address)
+        os.makedirs(os.path.dirname(address) or '.', exist_ok=True)
+        self._listener = Listener(address, family='AF_UNIX', authkey=authkey)
+        threading.Thread(target=self._accept, name='ClusterAccept', daemon=True).start()
+        print(f"[INFO] Cluster owner listening on {address}")
+
+    def _accept(self):
+        while not self._stopping:
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if not self._stopping:
+                    print(f"[WARNING] Cluster connection refused: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), name='ClusterWorker', daemon=True).start()
+
+    def _serve(self, conn):
+        """Send a worker its state, then relay its calls until it goes away"""
+        try:
+            kind, worker_id, pid = conn.recv()
+        except Exception:
+            conn.close()
+            return
+        worker = _Worker(conn, worker_id, pid)
+        threading.Thread(target=self._write, args=(worker,), name=f'ClusterSend-{worker_id}',
+                         daemon=True).start()
+
+        def subscribe(meta, records):
+            # The state is queued before the worker can be sent any change,
+            # and changes are published under the same store lock
+            worker.outbox.put(('state', meta, records))
+            with self._lock:
+                worker.subscribed = True
+                self._workers.append(worker)
+
+        meta, records = self._state(subscribe)
+        print(f"✅ Web worker {worker_id} (pid {pid}) connected at change {meta.get('seq')}")
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == 'call':
+                    threading.Thread(target=self._run_call, args=(worker,) + tuple(message[1:]),
+                                     daemon=True).start()
+        except (EOFError, OSError):
+            pass
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.outbox.put(None)
+        print(f"❌ Web worker {worker_id} (pid {pid}) disconnected")
+
+    def _write(self, worker: _Worker):
+        """Send a worker's messages in order (the state snapshot in chunks)"""
+        try:
+            while True:
+                message = worker.outbox.get()
+                if message is None:
+                    break
+                if message[0] == 'state':
+                    _, meta, records = message
+                    worker.conn.send(('state', meta))
+                    chunk = []
+                    for record in records.iter_records():
+                        chunk.append(record)
+                        if len(chunk) >= STATE_CHUNK_SIZE:
+                            worker.conn.send(('records', chunk))
+                            chunk = []
+                    worker.conn.send(('records', chunk))
+                    worker.conn.send(('loaded', records.version))
+                else:
+                    worker.conn.send(message)
+                self.messages_sent += 1
+        except (EOFError, OSError) as e:
+            print(f"[WARNING] Lost web worker {worker.worker_id}: {e}")
+        finally:
+            worker.conn.close()
+
+    def _run_call(self, worker: _Worker, call_id: int, name: str, args: tuple):
+        worker.calls += 1
+        try:
+            with self._app.app_context():
+                reply = ('reply', call_id, True, self._calls[name](*args))
+        except Exception as e:
+            print(f"[ERROR] Call {name} from web worker {worker.worker_id} failed: {e}")
+            reply = ('reply', call_id, False, f"{type(e).__name__}: {e}")
+        worker.outbox.put(reply)
+
+    def _publish(self, message: tuple):
+        with self._lock:
+            for worker in self._workers:
+                worker.outbox.put(message)
+
+    def publish_change(self, event: str, change: dict, weight: int):
+        """Send a numbered change to every worker (ChangeFeed listener, called in seq order)"""
+        self._publish(('change', event, change, weight))
+
+    def publish_expiry(self, cutoff_us: int):
+        """Tell every worker that records older than cutoff_us left the store (retention)"""
+        self._publish(('expire', cutoff_us))
+
+    def relay(self, event: str, data, key: Optional[str], to: Optional[List[str]]) -> bool:
+        """
+        Hand a broadcast to the web workers (which serve the clients)
+
+        Returns:
+            bool: False if this process is not an owner with workers (broadcast it here)
+        """
+        if self.role != 'owner':
+            return False
+        self._publish(('broadcast', event, data, key, to))
+        return True
+
+    def start_workers(self, count: int, command: List[str]):
+        """
+        Start `count` web worker processes running command
+
+        Each gets PROCESS_ROLE=web and its WORKER_ID in its environment;
+        supervise() restarts any that exit.
+        """
+        self._command = list(command)
+        for worker_id in range(1, count + 1):
+            self._spawn(worker_id)
+
+    def _spawn(self, worker_id: int):
+        env = dict(os.environ, PROCESS_ROLE='web', WORKER_ID=str(worker_id))
+        self._processes[worker_id] = subprocess.Popen(self._command, env=env)
+        print(f"[INFO] Started web worker {worker_id} (pid {self._processes[worker_id].pid})")
+
+    def supervise(self):
+        """Restart web workers that exit, until stop_workers() (blocks)"""
+        while not self._stopping:
+            time.sleep(SUPERVISE_INTERVAL)
+            for worker_id, process in list(self._processes.items()):
+                if process.poll() is not None and not self._stopping:
+                    print(f"[WARNING] Web worker {worker_id} exited with {process.returncode}; restarting")
+                    self.worker_restarts += 1
+                    self._spawn(worker_id)
+
+    def stop_workers(self):
+        """Terminate the web workers and stop accepting connections"""
+        self._stopping = True
+        for process in self._processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in self._processes.values():
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self._listener is not None:
+            self._listener.close()
+
+    # ----- Web worker -----
+
+    def start_worker(self, address: str, authkey: bytes, worker_id: int, handlers: Dict[str, Callable]):
+        """
+        Connect to the owner and follow its state
+
+        Args:
+            address: The owner's Unix socket path
+            authkey: Shared secret
+            worker_id: This worker's number (logs, status)
+            handlers: Called per message from the owner: state(meta),
+                      records(list), loaded(records_version),
+                      change(event, change, weight), broadcast(event, data, key, to),
+                      expire(cutoff_us), lost() once the owner is gone
+        """
+        self.role = 'web'
+        self.worker_id = worker_id
+        self._handlers = handlers
+        deadline = time.time() + CONNECT_TIMEOUT
+        while True:
+            try:
+                self._conn = Client(address, family='AF_UNIX', authkey=authkey)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                # The owner is still starting
+                if time.time() >= deadline:
+                    raise
+                time.sleep(0.5)
+        self._conn.send(('hello', worker_id, os.getpid()))
+        threading.Thread(target=self._receive, name='ClusterReceive', daemon=True).start()
+        print(f"[INFO] Web worker {worker_id} connected to the owner at {address}")
+
+    def _receive(self):
+        try:
+            while True:
+                message = self._conn.recv()
+                kind = message[0]
+                if kind == 'reply':
+                    _, call_id, ok, value = message
+                    waiter = self._replies.get(call_id)
+                    if waiter is not None:
+                        waiter[1:] = [ok, value]
+                        waiter[0].set()
+                    continue
+                try:
+                    self._handlers[kind](*message[1:])
+                except Exception as e:
+                    print(f"[ERROR] Failed to apply {kind} from the owner: {e}")
+        except (EOFError, OSError) as e:
+            print(f"[ERROR] Lost the owner process: {e}")
+        for waiter in list(self._replies.values()):
+            waiter[1:] = [False, 'owner process gone']
+            waiter[0].set()
+        self._handlers['lost']()
+
+    def call(self, name: str, *args):
+        """
+        Run a registered call on the owner and return its result
+
+        Raises:
+            RuntimeError: The call failed on the owner, timed out, or the owner is gone
+        """
+        call_id = next(self._call_ids)
+        waiter = [threading.Event(), False, None]
+        self._replies[call_id] = waiter
+        try:
+            with self._send_lock:
+                self._conn.send(('call', call_id, name, args))
+            self.calls_forwarded += 1
+            if not waiter[0].wait(CALL_TIMEOUT):
+                raise RuntimeError(f"Owner did not answer {name} within {CALL_TIMEOUT}s")
+        finally:
+            self._replies.pop(call_id, None)
+        if not waiter[1]:
+            raise RuntimeError(f"Owner failed {name}: {waiter[2]}")
+        return waiter[2]
+
+    def stats(self) -> dict:
+        """Role and link counters (status API)"""
+        if self.role == 'owner':
+            with self._lock:
+                workers = [{
+                    'worker_id': worker.worker_id,
+                    'pid': worker.pid,
+                    'queued': worker.outbox.qsize(),
+                    'calls': worker.calls,
+                    'connected_seconds': round(time.time() - worker.connected_at)
+                } for worker in self._workers]
+            return {'role': 'owner', 'workers': workers, 'messages_sent': self.messages_sent,
+                    'worker_restarts': self.worker_restarts}
+        if self.role == 'web':
+            return {'role': 'web', 'worker_id': self.worker_id, 'pid': os.getpid(),
+                    'calls_forwarded': self.calls_forwarded}
+        return {'role': 'single'}
+
+
+# Global cluster instance
+cluster = Cluster()
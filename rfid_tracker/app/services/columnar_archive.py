@@ -0,0 +1,226 @@
+"""
+Memory-mapped columnar archive of the full tracking history for analytics
+"""
+
+import mmap
+import os
+import sys
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from app.services.intern_table import InternTable
+from app.utils.helpers import ensure_directory, CALGARY_TZ
+
+try:
+    import numpy as np
+except ImportError:  # Optional: analytics fall back to pure Python over the mmap
+    np = None
+
+# Column name -> (file name, array typecode, numpy dtype). All little-endian.
+COLUMNS = {
+    'ts_ms': ('ts_ms.i8', 'q', '<i8'),          # epoch milliseconds
+    'tag_id': ('tag_id.u4', 'I', '<u4'),        # index into epc_dict.txt
+    'direction': ('direction.u1', 'B', 'u1'),   # see DIRECTION_CODES
+    'door_id': ('door_id.u2', 'H', '<u2'),      # index into door_dict.txt
+}
+EPC_DICT = 'epc_dict.txt'
+DOOR_DICT = 'door_dict.txt'
+DIRECTION_CODES = {'IN': 0, 'OUT': 1}
+OTHER_DIRECTION = 255
+HOUR_MS = 3600 * 1000
+
+
+class ColumnarArchive:
+    """
+    Append-only, fixed-width column files plus EPC and door dictionaries.
+
+    Row i of every column file describes the same record, so the files can
+    be mapped with numpy.memmap and aggregated without parsing anything or
+    building Python objects per row. Dictionary entries are written before
+    the rows that use them, and the row count is the shortest column, so a
+    write interrupted by power loss only drops the unfinished row.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.epcs = InternTable(self._read_dict(EPC_DICT))
+        self.doors = InternTable(self._read_dict(DOOR_DICT))
+        self._files = {}
+        self.rows = self._recover_rows()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_dict(self, name: str) -> List[str]:
+        try:
+            with open(self._path(name), 'r', encoding='utf-8') as f:
+                return f.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def _recover_rows(self) -> int:
+        """Row count = shortest column; longer columns are truncated to it"""
+        sizes = {}
+        for name, (filename, typecode, _) in COLUMNS.items():
+            path = self._path(filename)
+            width = array(typecode).itemsize
+            sizes[name] = (os.path.getsize(path) // width) if os.path.exists(path) else 0
+        rows = min(sizes.values())
+        for name, (filename, typecode, _) in COLUMNS.items():
+            if sizes[name] != rows:
+                with open(self._path(filename), 'r+b') as f:
+                    f.truncate(rows * array(typecode).itemsize)
+        return rows
+
+    def _open_for_append(self):
+        if not self._files:
+            ensure_directory(self._path(EPC_DICT))
+            self._files = {name: open(self._path(filename), 'ab')
+                           for name, (filename, _, _) in COLUMNS.items()}
+            self._files[EPC_DICT] = open(self._path(EPC_DICT), 'a', encoding='utf-8')
+            self._files[DOOR_DICT] = open(self._path(DOOR_DICT), 'a', encoding='utf-8')
+        return self._files
+
+    def _intern(self, table: InternTable, dict_name: str, value: str) -> int:
+        value_id = table.id_of(value)
+        if value_id is None:
+            value_id = table.intern(value)
+            f = self._open_for_append()[dict_name]
+            f.write(value + '\n')
+            f.flush()
+        return value_id
+
+    def append(self, rows: Iterable[tuple]) -> int:
+        """
+        Append records
+
+        Args:
+            rows: (ts_us, rfid_tag, direction, door_id) tuples
+
+        Returns:
+            int: Number of rows appended
+        """
+        columns = {name: array(typecode) for name, (_, typecode, _) in COLUMNS.items()}
+        for ts_us, rfid_tag, direction, door_id in rows:
+            columns['ts_ms'].append(ts_us // 1000)
+            columns['tag_id'].append(self._intern(self.epcs, EPC_DICT, rfid_tag))
+            columns['direction'].append(DIRECTION_CODES.get(direction, OTHER_DIRECTION))
+            columns['door_id'].append(self._intern(self.doors, DOOR_DICT, door_id or ''))
+
+        count = len(columns['ts_ms'])
+        if not count:
+            return 0
+        files = self._open_for_append()
+        for name, values in columns.items():
+            if sys.byteorder == 'big':
+                values.byteswap()
+            values.tofile(files[name])
+            files[name].flush()
+        self.rows += count
+        return count
+
+    def close(self):
+        """Close append handles"""
+        for f in self._files.values():
+            try:
+                f.close()
+            except Exception:
+                pass
+        self._files = {}
+
+    # ------------------------------------------------------------------
+    # Read side: zero-copy column views
+    # ------------------------------------------------------------------
+
+    def column(self, name: str, rows: Optional[int] = None):
+        """
+        Read-only view of a column's first rows (default: all committed rows)
+
+        A numpy.memmap when numpy is installed, otherwise a memoryview over
+        an mmap. Neither copies the file onto the heap.
+        """
+        rows = self.rows if rows is None else rows
+        filename, typecode, dtype = COLUMNS[name]
+        if rows == 0:
+            return np.zeros(0, dtype=dtype) if np is not None else memoryview(array(typecode))
+        if np is not None:
+            return np.memmap(self._path(filename), dtype=dtype, mode='r', shape=(rows,))
+        with open(self._path(filename), 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped).cast(typecode)[:rows]
+
+    def _selected(self, start_ms: Optional[int], end_ms: Optional[int], direction: Optional[str]):
+        """Row mask (numpy) or row indices (fallback) within bounds"""
+        rows = self.rows
+        ts = self.column('ts_ms', rows)
+        directions = self.column('direction', rows) if direction else None
+        direction_code = DIRECTION_CODES.get(direction, OTHER_DIRECTION) if direction else None
+
+        if np is not None:
+            if start_ms is None and end_ms is None and directions is None:
+                return rows, slice(None)
+            mask = np.ones(rows, dtype=bool)
+            if start_ms is not None:
+                mask &= ts >= start_ms
+            if end_ms is not None:
+                mask &= ts <= end_ms
+            if directions is not None:
+                mask &= directions == direction_code
+            return rows, mask
+
+        selected = [i for i in range(rows)
+                    if (start_ms is None or ts[i] >= start_ms)
+                    and (end_ms is None or ts[i] <= end_ms)
+                    and (directions is None or directions[i] == direction_code)]
+        return rows, selected
+
+    def hourly_counts(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> List[dict]:
+        """Movements per hour (IN / OUT), oldest hour first; empty hours omitted"""
+        rows, selected = self._selected(start_ms, end_ms, None)
+        ts = self.column('ts_ms', rows)
+        directions = self.column('direction', rows)
+
+        buckets: Dict[int, List[int]] = {}
+        if np is not None:
+            hours = ts[selected] // HOUR_MS
+            if len(hours):
+                dirs = directions[selected]
+                base = int(hours.min())
+                offsets = (hours - base).astype(np.int64)
+                size = int(offsets.max()) + 1
+                in_counts = np.bincount(offsets[dirs == DIRECTION_CODES['IN']], minlength=size)
+                out_counts = np.bincount(offsets[dirs == DIRECTION_CODES['OUT']], minlength=size)
+                for offset in np.nonzero(in_counts + out_counts)[0]:
+                    buckets[base + int(offset)] = [int(in_counts[offset]), int(out_counts[offset])]
+        else:
+            for i in selected:
+                counts = buckets.setdefault(ts[i] // HOUR_MS, [0, 0])
+                if directions[i] == DIRECTION_CODES['IN']:
+                    counts[0] += 1
+                elif directions[i] == DIRECTION_CODES['OUT']:
+                    counts[1] += 1
+
+        return [{
+            'hour_start_ms': hour * HOUR_MS,
+            'hour_start': datetime.fromtimestamp(hour * 3600, CALGARY_TZ).strftime('%Y-%m-%d %H:00'),
+            'in_count': in_count,
+            'out_count': out_count
+        } for hour, (in_count, out_count) in sorted(buckets.items())]
+
+    def tag_counts(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                   direction: Optional[str] = None, limit: int = 20) -> List[dict]:
+        """Movements per tag, most active first"""
+        rows, selected = self._selected(start_ms, end_ms, direction)
+        tag_ids = self.column('tag_id', rows)
+
+        if np is not None:
+            counts = np.bincount(tag_ids[selected], minlength=len(self.epcs))
+            top = np.argsort(counts, kind='stable')[::-1][:limit]
+            pairs = [(int(tag_id), int(counts[tag_id])) for tag_id in top if counts[tag_id] > 0]
+        else:
+            totals: Dict[int, int] = {}
+            for i in selected:
+                totals[tag_ids[i]] = totals.get(tag_ids[i], 0) + 1
+            pairs = sorted(totals.items(), key=lambda x: x[1], reverse=True)[:limit]
+
+        return [{'tag': self.epcs.value(tag_id), 'count': count} for tag_id, count in pairs]
@@ -0,0 +1,342 @@
+"""
+Durable outbox for movements sent to the dispatcher API
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from app.services.circuit_breaker import CircuitBreaker
+from app.utils.helpers import ensure_directory, get_dispatcher_session, post_to_dispatcher
+
+# Status codes that mean the dispatcher accepted the movement
+DELIVERED_CODES = (200, 201, 202)
+# Client errors worth retrying; any other 4xx is dropped as undeliverable
+RETRYABLE_CLIENT_CODES = (408, 425, 429)
+# Rewrite the outbox file once it holds this many finished entries
+COMPACT_AFTER = 1000
+
+
+class DispatcherOutbox:
+    """
+    Append-only on-disk queue of dispatcher payloads, drained by a fixed pool
+    of delivery threads.
+
+    Every payload is written (and fsynced) as an "add" line before it is
+    sent; delivery appends an "ack" line and an undeliverable payload a
+    "drop" line. Replaying the file at startup yields exactly the payloads
+    still owed, so a restart or a dispatcher outage loses nothing (delivery
+    is at least once: an ack lost in a crash means one resend).
+
+    Failed sends are retried with capped exponential backoff and jitter.
+    Entries for one tag are delivered in order, and at most `concurrency`
+    requests are ever in flight, over the shared keep-alive session. When
+    the dispatcher has a batch endpoint, movements arriving within
+    batch_window seconds are posted together as {"events": [...]}.
+
+    A circuit breaker stops sending after consecutive failures: while it is
+    open, movements only accumulate in the file and a single probe request
+    is sent per (growing) reset timeout, so an unreachable dispatcher costs
+    no connection attempts beyond the probes.
+    """
+
+    def __init__(self, sender: Callable[[str, dict, float], Optional[int]] = post_to_dispatcher):
+        self.path = None
+        self.url = ''
+        self.concurrency = 2
+        self.timeout = 5.0
+        self.backoff_base = 1.0
+        self.backoff_max = 300.0
+        self.batch_url = ''  # empty: the dispatcher only takes single movements
+        self.batch_window = 0.2
+        self.batch_max = 50
+        self.breaker = CircuitBreaker()
+        self._sender = sender
+        self._entries: 'OrderedDict[int, dict]' = OrderedDict()
+        self._in_flight = set()  # tags with a request outstanding
+        self._next_id = 1
+        self._file = None
+        self._finished_lines = 0  # ack/drop lines plus the adds they cancel
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.dropped = 0
+
+    def open(self, path: str, url: str, concurrency: int = 2, timeout: float = 5,
+             backoff_base: float = 1, backoff_max: float = 300,
+             batch_url: str = '', batch_window: float = 0.2, batch_max: int = 50,
+             breaker_threshold: int = 5, breaker_reset: float = 5, breaker_reset_max: float = 300):
+        """
+        Load the outbox file and start the delivery threads
+
+        Args:
+            path: Outbox file (JSON lines)
+            url: Dispatcher endpoint for single movements
+            concurrency: Most requests in flight at once
+            batch_url: Dispatcher endpoint taking {"events": [...]} ('' = none)
+            batch_window: Seconds to gather movements into one batch
+            batch_max: Most movements per batch
+            breaker_threshold: Consecutive failures that open the circuit breaker
+            breaker_reset: Seconds before the first probe once open (doubles per failed probe)
+            breaker_reset_max: Longest wait between probes
+        """
+        with self._cond:
+            reopen = not (self.path == path and self._threads)
+        if reopen:
+            self.close()
+        with self._cond:
+            self.url = url
+            self.timeout = timeout
+            self.backoff_base = backoff_base
+            self.backoff_max = backoff_max
+            self.batch_url = batch_url or ''
+            self.batch_window = max(0.0, float(batch_window))
+            self.batch_max = max(1, int(batch_max))
+            if not reopen:
+                # Already draining this file (app factory called again): new settings only
+                self.breaker.failure_threshold = max(1, int(breaker_threshold))
+                self.breaker.base_reset_timeout = breaker_reset
+                self.breaker.max_reset_timeout = breaker_reset_max
+                self._cond.notify_all()
+                return
+            self.path = path
+            self.breaker = CircuitBreaker(breaker_threshold, breaker_reset, breaker_reset_max)
+            self.concurrency = max(1, int(concurrency))
+            self._stopping = False
+            # One pooled keep-alive connection per delivery thread
+            get_dispatcher_session(self.concurrency)
+            self._load()
+            self._compact()
+            print(f"[INFO] Dispatcher outbox opened: {len(self._entries)} pending ({path})")
+            self._threads = [threading.Thread(target=self._run, name=f'DispatcherOutbox-{i}', daemon=True)
+                             for i in range(self.concurrency)]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self):
+        """Stop the delivery threads (pending entries stay in the file)"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads = self._threads
+            self._threads = []
+        for thread in threads:
+            thread.join(timeout=self.timeout + 1)
+        with self._cond:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def enqueue(self, tag: str, payload: dict) -> Optional[int]:
+        """
+        Persist a payload and queue it for delivery
+
+        Returns:
+            int: Entry id, or None if the outbox is not open
+        """
+        with self._cond:
+            if self.path is None:
+                print(f"[WARNING] Dispatcher outbox not open; dropping {tag}")
+                return None
+            entry = {'id': self._next_id, 'tag': tag, 'payload': payload,
+                     'queued_at': time.time(), 'attempts': 0, 'next_at': 0.0}
+            self._next_id += 1
+            self._write({'op': 'add', 'id': entry['id'], 'tag': tag, 'payload': payload,
+                         'queued_at': entry['queued_at']}, sync=True)
+            self._entries[entry['id']] = entry
+            self._cond.notify()
+        return entry['id']
+
+    def stats(self) -> dict:
+        """Queue depth, age of the oldest entry and delivery counters"""
+        with self._cond:
+            oldest = next(iter(self._entries.values()), None)
+            attempts = self.delivered + self.failed_attempts
+            return {
+                'queue_depth': len(self._entries),
+                'in_flight': len(self._in_flight),
+                'oldest_age_seconds': round(time.time() - oldest['queued_at'], 1) if oldest else 0,
+                'delivered': self.delivered,
+                'failed_attempts': self.failed_attempts,
+                'dropped': self.dropped,
+                'success_rate': round(self.delivered / attempts, 3) if attempts else None,
+                'breaker': self.breaker.stats()
+            }
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Block until nothing is queued (tests, shutdown)"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._entries:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # ------------------------------------------------------------------
+    # File (caller holds _cond)
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        self._entries = OrderedDict()
+        self._in_flight = set()
+        self._finished_lines = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        # Torn last line from a power cut: the add was never acknowledged
+                        continue
+                    if item.get('op') == 'add':
+                        self._entries[item['id']] = {'id': item['id'], 'tag': item.get('tag', ''),
+                                                     'payload': item['payload'],
+                                                     'queued_at': item.get('queued_at', time.time()),
+                                                     'attempts': 0, 'next_at': 0.0}
+                    else:
+                        self._entries.pop(item.get('id'), None)
+                    self._next_id = max(self._next_id, item.get('id', 0) + 1)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[WARNING] Error reading dispatcher outbox {self.path}: {e}")
+
+    def _compact(self):
+        """Rewrite the file with only the pending entries"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        ensure_directory(self.path)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self._entries.values():
+                f.write(json.dumps({'op': 'add', 'id': entry['id'], 'tag': entry['tag'],
+                                    'payload': entry['payload'], 'queued_at': entry['queued_at']},
+                                   separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._finished_lines = 0
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _write(self, item: dict, sync: bool = False):
+        self._file.write(json.dumps(item, separators=(',', ':')) + '\n')
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def _finish(self, entry: dict, op: str):
+        self._entries.pop(entry['id'], None)
+        self._write({'op': op, 'id': entry['id']})
+        self._finished_lines += 2
+        if self._finished_lines >= COMPACT_AFTER and self._finished_lines > len(self._entries):
+            self._compact()
+
+    # ------------------------------------------------------------------
+    # Delivery
+    # ------------------------------------------------------------------
+
+    def _take(self) -> tuple:
+        """
+        Next entries due for delivery (caller holds _cond)
+
+        A tag's entries go out in order: none while the tag has a request in
+        flight, and none behind one of its entries that is waiting to retry.
+        Without a batch endpoint one entry is taken at a time. With one, up to
+        batch_max entries are taken, but fresh entries are held for
+        batch_window seconds after the oldest was queued so a burst goes out
+        as one request. While the circuit breaker is not closed, nothing is
+        taken except the single probe it allows.
+
+        Returns:
+            tuple: (list of entries, seconds until worth checking again or None)
+        """
+        now = time.time()
+        probing = self.breaker.state != CircuitBreaker.CLOSED
+        batching = bool(self.batch_url) and not probing
+        limit = self.batch_max if batching else 1
+        blocked = set(self._in_flight)
+        taken = []
+        wait = None
+        for entry in self._entries.values():
+            if entry['tag'] in blocked:
+                continue
+            if entry['next_at'] > now:
+                blocked.add(entry['tag'])
+                due_in = entry['next_at'] - now
+                wait = due_in if wait is None else min(wait, due_in)
+                continue
+            taken.append(entry)
+            if not batching:
+                blocked.add(entry['tag'])
+            if len(taken) >= limit:
+                break
+
+        if batching and taken and len(taken) < limit and not taken[0]['attempts']:
+            hold = taken[0]['queued_at'] + self.batch_window - now
+            if hold > 0:
+                return [], hold if wait is None else min(wait, hold)
+        if taken and not self.breaker.allow_request():
+            # Open (or a probe already in flight): hold everything locally
+            return [], self.breaker.retry_in()
+        for entry in taken:
+            self._in_flight.add(entry['tag'])
+        return taken, (None if taken else wait)
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                entries, wait = self._take()
+                while not entries:
+                    if self._stopping:
+                        return
+                    self._cond.wait(wait)
+                    entries, wait = self._take()
+                if self._stopping:
+                    for entry in entries:
+                        self._in_flight.discard(entry['tag'])
+                    return
+
+            if len(entries) == 1:
+                status = self._sender(self.url, entries[0]['payload'], self.timeout)
+            else:
+                status = self._sender(self.batch_url, {'events': [entry['payload'] for entry in entries]},
+                                      self.timeout)
+
+            with self._cond:
+                # A rejection still means the dispatcher is reachable
+                if status is not None and status < 500:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+                for entry in entries:
+                    self._in_flight.discard(entry['tag'])
+                    if self._file is None or entry['id'] not in self._entries:
+                        continue
+                    if status in DELIVERED_CODES:
+                        self.delivered += 1
+                        self._finish(entry, 'ack')
+                    elif status is not None and 400 <= status < 500 and status not in RETRYABLE_CLIENT_CODES:
+                        self.dropped += 1
+                        print(f"[WARNING] Dispatcher rejected {entry['tag']} with {status}; dropped")
+                        self._finish(entry, 'drop')
+                    else:
+                        self.failed_attempts += 1
+                        entry['attempts'] += 1
+                        entry['next_at'] = time.time() + self._backoff(entry['attempts'])
+                self._cond.notify_all()
+
+
+# Global instance
+dispatcher_outbox = DispatcherOutbox()
@@ -0,0 +1,38 @@
+"""
+String interning: map repeated strings (EPCs, door ids) to small integers
+"""
+
+from typing import Dict, List, Optional
+
+
+class InternTable:
+    """Bidirectional string <-> id table; ids are assigned in first-seen order"""
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self._ids: Dict[str, int] = {}
+        self._values: List[str] = []
+        for value in values or []:
+            self.intern(value)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def intern(self, value: str) -> int:
+        """Id of value, assigning the next id if it is new"""
+        value_id = self._ids.get(value)
+        if value_id is None:
+            value_id = self._ids[value] = len(self._values)
+            self._values.append(value)
+        return value_id
+
+    def id_of(self, value: str) -> Optional[int]:
+        """Id of value, or None if it has never been interned"""
+        return self._ids.get(value)
+
+    def value(self, value_id: int) -> str:
+        """String for an id"""
+        return self._values[value_id]
+
+    def values(self) -> List[str]:
+        """All strings in id order (do not modify)"""
+        return self._values
@@ -0,0 +1,109 @@
+"""
+Per-tag IN/OUT pairing state for dispatcher decisions
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.models import TagPairing
+
+
+class PairingTable:
+    """
+    Latest pair and last sent pair per tag.
+
+    A pair ends at a record whose direction differs from the tag's previous
+    record. Records arriving in time order update a tag in O(1); a record
+    older than the tag's newest changes the sequence in the middle, so the
+    caller rebuilds that tag from its history instead (rare). A pair is due
+    for the dispatcher when it ends later than the last pair sent.
+    """
+
+    def __init__(self):
+        self._tags: Dict[str, TagPairing] = {}
+        # Each tag's newest record as of the last restore(); history up to it
+        # is already reflected when the records are replayed at startup
+        self._restored_us: Dict[str, int] = {}
+        # Bumped on every change; the persisted copy is rewritten when it moves
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def get(self, rfid_tag: str) -> Optional[TagPairing]:
+        return self._tags.get(rfid_tag)
+
+    def is_applied(self, rfid_tag: str, ts_us: int) -> bool:
+        """True if a record at ts_us is reflected in the restored state (not newer than its newest)"""
+        restored_us = self._restored_us.get(rfid_tag)
+        return restored_us is not None and ts_us <= restored_us
+
+    def update(self, rfid_tag: str, direction: str, ts_us: int, read_date: str) -> bool:
+        """
+        Apply a record in time order
+
+        Returns:
+            bool: False if the record is older than the tag's newest record
+                  (nothing changed; rebuild the tag instead)
+        """
+        pairing = self._tags.get(rfid_tag)
+        if pairing is None:
+            self._tags[rfid_tag] = TagPairing(rfid_tag, direction, ts_us)
+        else:
+            if ts_us < pairing.last_us:
+                return False
+            if direction != pairing.last_direction:
+                pairing.pair_direction = direction
+                pairing.pair_read_date = read_date
+                pairing.pair_us = ts_us
+            pairing.last_direction = direction
+            pairing.last_us = ts_us
+        self.version += 1
+        return True
+
+    def rebuild(self, rfid_tag: str, records: Iterable[Tuple[str, int, str]]):
+        """
+        Recompute a tag from its records, oldest first, keeping what was sent
+
+        Args:
+            records: (direction, ts_us, read_date) tuples
+        """
+        previous = self._tags.pop(rfid_tag, None)
+        for direction, ts_us, read_date in records:
+            self.update(rfid_tag, direction, ts_us, read_date)
+        pairing = self._tags.get(rfid_tag)
+        if pairing is not None and previous is not None:
+            pairing.sent_us = previous.sent_us
+        self.version += 1
+
+    def due(self, rfid_tag: str) -> Optional[TagPairing]:
+        """The tag's latest pair if it has not been sent yet, else None"""
+        pairing = self._tags.get(rfid_tag)
+        if pairing is None or not pairing.pair_us or pairing.pair_us <= pairing.sent_us:
+            return None
+        return pairing
+
+    def mark_sent(self, rfid_tag: str):
+        """Record that the tag's latest pair has been queued for the dispatcher"""
+        pairing = self._tags[rfid_tag]
+        pairing.sent_us = pairing.pair_us
+        self.version += 1
+
+    def clear(self):
+        """Forget all tags (version keeps increasing)"""
+        self._tags = {}
+        self._restored_us = {}
+        self.version += 1
+
+    def snapshot(self) -> List[dict]:
+        """Serialisable list of all tag pairings"""
+        return [pairing.to_dict() for pairing in self._tags.values()]
+
+    def restore(self, pairings: Optional[List[dict]]):
+        """Replace the table with a snapshot() result"""
+        self._tags = {}
+        for item in pairings or []:
+            self._tags[item['rfid_tag']] = TagPairing(
+                item['rfid_tag'], item['last_direction'], item['last_us'],
+                item.get('pair_direction', ''), item.get('pair_read_date', ''),
+                item.get('pair_us', 0), item.get('sent_us', 0))
+        self._restored_us = {rfid_tag: pairing.last_us for rfid_tag, pairing in self._tags.items()}
+        self.version += 1
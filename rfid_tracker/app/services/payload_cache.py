@@ -0,0 +1,217 @@
+"""
+Serialize-once JSON: pre-encoded payloads and per-record fragments
+"""
+
+import json
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Optional
+
+# Versions of each payload kept (only the latest of each key is ever reused)
+PAYLOAD_CACHE_SIZE = 64
+# Marks where pre-encoded JSON goes in the output of the surrounding encode
+_TOKEN = f"\u0000raw-{secrets.token_hex(8)}-"
+
+
+class RawJSON:
+    """
+    JSON text that dumps() splices into its output as is, so a payload
+    encoded once can be sent any number of times (and nested in others,
+    e.g. each event of a batch frame) without being encoded again.
+    """
+
+    __slots__ = ('text',)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def __repr__(self) -> str:
+        return f"RawJSON({self.text[:60]!r})"
+
+
+def dumps(obj, **kwargs) -> str:
+    """
+    json.dumps that writes RawJSON values verbatim
+
+    Drop-in for the json module's dumps (SocketIO is given this module as
+    its json module), so the plain-data path is the stdlib C encoder.
+    """
+    if isinstance(obj, RawJSON):
+        return obj.text
+    raws = []
+    fallback = kwargs.pop('default', None)
+
+    def default(value):
+        if isinstance(value, RawJSON):
+            raws.append(value.text)
+            return f"{_TOKEN}{len(raws) - 1}"
+        if fallback is not None:
+            return fallback(value)
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    text = json.dumps(obj, default=default, **kwargs)
+    if not raws:
+        return text
+    # Each placeholder was encoded as a JSON string: swap the quoted token for the raw text
+    quoted = json.dumps(_TOKEN)[:-1]
+    parts = text.split(quoted)
+    out = [parts[0]]
+    for part in parts[1:]:
+        index, _, rest = part.partition('"')
+        out.append(raws[int(index)])
+        out.append(rest)
+    return ''.join(out)
+
+
+def loads(s, **kwargs):
+    """json.loads (the decoding half of the json module interface)"""
+    return json.loads(s, **kwargs)
+
+
+def encode(obj) -> RawJSON:
+    """Encode a payload once (compact separators, as Socket.IO sends it)"""
+    return RawJSON(dumps(obj, separators=(',', ':')))
+
+
+class PayloadCache:
+    """
+    Pre-encoded payloads keyed by (name, data version).
+
+    Holds the latest version built for each name: a lookup with the same
+    version returns the stored payload without rebuilding or re-encoding
+    it, a newer version replaces it. What build() returns is cached as is,
+    so it can be a RawJSON or a tuple of them.
+    """
+
+    def __init__(self, capacity: int = PAYLOAD_CACHE_SIZE):
+        self.capacity = capacity
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()  # key -> (version, payload)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Hashable, build: Callable[[], object]):
+        """
+        Payload for key as of version
+
+        Args:
+            key: What the payload is (event type, query)
+            version: Data version it was built from; any change rebuilds it
+            build: Builds and encodes the payload on a miss (called unlocked)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        payload = build()
+        with self._lock:
+            self._entries[key] = (version, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Entries and hit counters"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class RecordFragments:
+    """
+    JSON text of individual records, keyed by record_id and the record's
+    fields (a client may reuse an id once the first record is forgotten by
+    deduplication or cleared, so the id alone does not identify a record).
+
+    Records never change once stored, so each is encoded once (when it is
+    created, or the first time an older one is read) and record lists are
+    assembled by joining fragments. The least recently used fragments are
+    evicted past `capacity`; records without an id are encoded every time.
+    """
+
+    def __init__(self, capacity: int = 20000):
+        self.capacity = capacity
+        self._fragments: 'OrderedDict[tuple, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resize(self, capacity: int):
+        """Change how many fragments are kept (0 = none)"""
+        with self._lock:
+            self.capacity = max(0, int(capacity))
+            self._evict()
+
+    @staticmethod
+    def _key(record: dict) -> Optional[tuple]:
+        record_id = record.get('record_id')
+        if not record_id:
+            return None
+        return (record_id, record.get('rfid_tag'), record.get('direction'), record.get('read_date'),
+                record.get('door_id'))
+
+    def add(self, record: dict) -> str:
+        """Encode a record and keep its fragment"""
+        text = json.dumps(record, separators=(',', ':'))
+        key = self._key(record)
+        if key is not None:
+            with self._lock:
+                self._fragments[key] = text
+                self._evict()
+        return text
+
+    def encode_list(self, records: Iterable[dict]) -> RawJSON:
+        """JSON array of records, from cached fragments where possible"""
+        parts = []
+        missed = []
+        with self._lock:
+            fragments = self._fragments
+            for record in records:
+                key = self._key(record)
+                text = fragments.get(key) if key is not None else None
+                if text is None:
+                    missed.append(len(parts))
+                    parts.append(record)
+                else:
+                    fragments.move_to_end(key)
+                    parts.append(text)
+            self.hits += len(parts) - len(missed)
+            self.misses += len(missed)
+        for index in missed:
+            parts[index] = self.add(parts[index])
+        return RawJSON('[' + ','.join(parts) + ']')
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+    def stats(self) -> dict:
+        """Fragments kept and hit counters"""
+        with self._lock:
+            return {'entries': len(self._fragments), 'capacity': self.capacity,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def _evict(self):
+        while len(self._fragments) > self.capacity:
+            self._fragments.popitem(last=False)
+
+
+def cache_stats() -> dict:
+    """Payload and record fragment cache counters (status API)"""
+    return {'payloads': payload_cache.stats(), 'record_fragments': record_fragments.stats()}
+
+
+# Global instances
+payload_cache = PayloadCache()
+record_fragments = RecordFragments()
@@ -0,0 +1,173 @@
+"""
+Compressed per-day archive partitions for records older than the hot window
+"""
+
+import gzip
+import json
+import lzma
+import os
+from typing import Dict, Iterable, List, Optional
+from app.utils.helpers import ensure_directory, load_json_file, save_json_file, timestamp_to_epoch_us
+
+# Compression name -> (open function, file extension)
+COMPRESSORS = {
+    'gzip': (gzip.open, '.json.gz'),
+    'lzma': (lzma.open, '.json.xz'),
+}
+
+
+class RecordArchive:
+    """
+    Archived records, one compressed JSON partition per Calgary calendar day.
+
+    manifest.json lists every partition with its record count and time
+    range, so a historical query opens only the partitions its date range
+    touches. baseline.json holds the statistics and tag states as of the
+    archived records, so the hot window can be replayed on top of it at
+    boot without reading any partition.
+    """
+
+    MANIFEST = 'manifest.json'
+    BASELINE = 'baseline.json'
+
+    def __init__(self, directory: str, compression: str = 'gzip'):
+        if compression not in COMPRESSORS:
+            print(f"⚠ Unknown archive compression '{compression}', using gzip")
+            compression = 'gzip'
+        self.directory = directory
+        self.compression = compression
+        self.manifest = load_json_file(self._path(self.MANIFEST), default={'partitions': {}})
+        self.manifest.setdefault('partitions', {})
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def partition_key(read_date: str) -> str:
+        """Partition (local calendar day, YYYY-MM-DD) a record belongs to"""
+        return read_date[:10]
+
+    def partitions(self) -> Dict[str, dict]:
+        """Manifest entries keyed by day"""
+        return self.manifest['partitions']
+
+    def record_count(self) -> int:
+        """Number of archived records"""
+        return sum(entry['count'] for entry in self.manifest['partitions'].values())
+
+    def load_baseline(self) -> dict:
+        """Statistics and tag states as of the archived records"""
+        return load_json_file(self._path(self.BASELINE), default={})
+
+    def save_baseline(self, baseline: dict) -> bool:
+        return save_json_file(self._path(self.BASELINE), baseline)
+
+    def _read_partition(self, entry: dict) -> List[dict]:
+        opener = COMPRESSORS.get(entry.get('compression', self.compression), COMPRESSORS['gzip'])[0]
+        try:
+            with opener(self._path(entry['file']), 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            print(f"⚠ Archive partition missing: {entry['file']}")
+        except Exception as e:
+            print(f"⚠ Error reading archive partition {entry['file']}: {e}")
+        return []
+
+    def _write_partition(self, day: str, records: List[dict]) -> dict:
+        opener, extension = COMPRESSORS[self.compression]
+        filename = f"{day}{extension}"
+        path = self._path(filename)
+        tmp_path = path + '.tmp'
+        ensure_directory(path)
+        with opener(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(records, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+        timestamps = [timestamp_to_epoch_us(r.get('read_date', '')) or 0 for r in records]
+        return {
+            'file': filename,
+            'compression': self.compression,
+            'count': len(records),
+            'start_us': min(timestamps),
+            'end_us': max(timestamps)
+        }
+
+    def add(self, records: Iterable[dict]) -> int:
+        """
+        Move records into their day partitions
+
+        Existing partitions are merged (duplicates from an interrupted earlier
+        roll are dropped). Partitions are written before the manifest, so a
+        crash leaves at worst records that are rolled again next time.
+
+        Returns:
+            int: Number of records archived
+        """
+        by_day: Dict[str, List[dict]] = {}
+        for record in records:
+            by_day.setdefault(self.partition_key(record.get('read_date', '')), []).append(record)
+
+        archived = 0
+        for day, day_records in sorted(by_day.items()):
+            entry = self.manifest['partitions'].get(day)
+            merged = self._read_partition(entry) if entry else []
+            seen = {(r.get('rfid_tag'), r.get('direction'), r.get('read_date')) for r in merged}
+            for record in day_records:
+                key = (record.get('rfid_tag'), record.get('direction'), record.get('read_date'))
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(record)
+                    archived += 1
+            merged.sort(key=lambda r: timestamp_to_epoch_us(r.get('read_date', '')) or 0)
+
+            new_entry = self._write_partition(day, merged)
+            if entry and entry['file'] != new_entry['file']:
+                # Compression setting changed since this partition was written
+                try:
+                    os.remove(self._path(entry['file']))
+                except OSError:
+                    pass
+            self.manifest['partitions'][day] = new_entry
+
+        if by_day:
+            save_json_file(self._path(self.MANIFEST), self.manifest)
+        return archived
+
+    def iter_records(self) -> Iterable[dict]:
+        """All archived records, oldest first (one partition in memory at a time)"""
+        for day in sorted(self.manifest['partitions']):
+            yield from self._read_partition(self.manifest['partitions'][day])
+
+    def query(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+              direction: Optional[str] = None, tags: Optional[List[str]] = None,
+              limit: Optional[int] = None) -> List[dict]:
+        """
+        Archived records in a time range, newest first
+
+        Only partitions whose time range overlaps [start_us, end_us] are opened,
+        newest partition first, stopping once limit records are collected.
+        """
+        tag_set = set(tags) if tags is not None else None
+        result = []
+        for day in sorted(self.manifest['partitions'], reverse=True):
+            if limit is not None and len(result) >= limit:
+                break
+            entry = self.manifest['partitions'][day]
+            if start_us is not None and entry['end_us'] < start_us:
+                continue
+            if end_us is not None and entry['start_us'] > end_us:
+                continue
+            for record in reversed(self._read_partition(entry)):
+                ts = timestamp_to_epoch_us(record.get('read_date', '')) or 0
+                if start_us is not None and ts < start_us:
+                    continue
+                if end_us is not None and ts > end_us:
+                    continue
+                if direction is not None and record.get('direction') != direction:
+                    continue
+                if tag_set is not None and record.get('rfid_tag') not in tag_set:
+                    continue
+                result.append(record)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
@@ -0,0 +1,584 @@
+"""
+Time-ordered, column-oriented in-memory store for tracking records
+"""
+
+import heapq
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from app.services.intern_table import InternTable
+from app.utils.helpers import timestamp_to_epoch_us, epoch_us_to_read_date
+
+# Bytes per row in the record id column (a binary UUID)
+ID_WIDTH = 16
+NO_ID = bytes(ID_WIDTH)
+
+
+def _id_bytes(record_id: str) -> Optional[bytes]:
+    """16-byte form of a canonical UUID string, or None if it would not round-trip"""
+    try:
+        value = uuid.UUID(record_id)
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return value.bytes if str(value) == record_id else None
+
+
+def _shift_overrides(overrides: Dict[int, str], cuts: List[int]) -> Dict[int, str]:
+    """Move per-position overrides past the sorted insertion points in cuts"""
+    return {p + bisect_right(cuts, p): value for p, value in overrides.items()}
+
+
+def _reversed_run(positions: array, first: int, last: int) -> Iterator[int]:
+    """Iterate positions[first:last] backwards without copying"""
+    for i in range(last - 1, first - 1, -1):
+        yield positions[i]
+
+
+class RecordView:
+    """
+    Read side of the record store: queries over the first _n rows of the columns.
+
+    Subclasses provide the columns and _n. Every read is bounded by _n, so
+    rows appended after a snapshot was taken are invisible to it.
+    """
+
+    _ts: array
+    _tag_ids: array
+    _directions: bytearray
+    _door_codes: array
+    _read_date_overrides: Dict[int, str]
+    _record_ids: bytearray
+    _record_id_overrides: Dict[int, str]
+    _tag_positions: List[array]
+    _sorted_tags: List[str]
+    _direction_names: List[str]
+    epcs: InternTable
+    doors: InternTable
+    _n: int
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _positions_of(self, tag: str) -> Optional[array]:
+        tag_id = self.epcs.id_of(tag)
+        return self._tag_positions[tag_id] if tag_id is not None and tag_id < len(self._tag_positions) else None
+
+    def records_before(self, cutoff_us: int) -> List[dict]:
+        """Records older than cutoff_us, oldest first"""
+        return [self.record_at(pos) for pos in range(bisect_left(self._ts, cutoff_us, 0, self._n))]
+
+    def record_at(self, pos: int) -> dict:
+        """Materialise the record stored at a position"""
+        return {
+            'rfid_tag': self.epcs.value(self._tag_ids[pos]),
+            'direction': self._direction_names[self._directions[pos]],
+            'read_date': self.read_date_at(pos),
+            'door_id': self.doors.value(self._door_codes[pos]),
+            'record_id': self.record_id_at(pos)
+        }
+
+    def ts_at(self, pos: int) -> int:
+        """Epoch microseconds of the record at a position"""
+        return self._ts[pos]
+
+    def read_date_at(self, pos: int) -> str:
+        """read_date of the record at a position"""
+        if pos < 0:
+            pos += self._n
+        override = self._read_date_overrides.get(pos)
+        return override if override is not None else epoch_us_to_read_date(self._ts[pos])
+
+    def record_id_at(self, pos: int) -> str:
+        """Record id at a position ('' if the record was stored without one)"""
+        override = self._record_id_overrides.get(pos)
+        if override is not None:
+            return override
+        raw = bytes(self._record_ids[pos * ID_WIDTH:(pos + 1) * ID_WIDTH])
+        return '' if raw == NO_ID else str(uuid.UUID(bytes=raw))
+
+    def door_at(self, pos: int) -> str:
+        """Door id of the record at a position"""
+        return self.doors.value(self._door_codes[pos])
+
+    def tag_at(self, pos: int) -> str:
+        """Tag stored at a position"""
+        return self.epcs.value(self._tag_ids[pos])
+
+    def direction_at(self, pos: int) -> str:
+        """Direction stored at a position"""
+        return self._direction_names[self._directions[pos]]
+
+    def tag_positions(self, tag: str) -> array:
+        """Ascending store positions of a tag's records (do not modify)"""
+        positions = self._positions_of(tag)
+        if positions is None:
+            return array('I')
+        if positions and positions[-1] >= self._n:
+            return positions[:bisect_left(positions, self._n)]
+        return positions
+
+    def tag_count(self, tag: str) -> int:
+        """Number of records stored for a tag"""
+        positions = self._positions_of(tag)
+        return bisect_left(positions, self._n) if positions else 0
+
+    def tags_with_prefix(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Known tags starting with prefix, in sorted order"""
+        sorted_tags = self._sorted_tags
+        start = bisect_left(sorted_tags, prefix)
+        matches = []
+        for tag in islice(sorted_tags, start, None):
+            if not tag.startswith(prefix) or (limit is not None and len(matches) >= limit):
+                break
+            matches.append(tag)
+        return matches
+
+    def last(self) -> Optional[dict]:
+        """Most recent record, or None when empty"""
+        return self.record_at(self._n - 1) if self._n else None
+
+    def bounds(self, start_us: Optional[int] = None, end_us: Optional[int] = None) -> Tuple[int, int]:
+        """Position range [lo, hi) of records with start_us <= ts <= end_us"""
+        n = self._n
+        lo = bisect_left(self._ts, start_us, 0, n) if start_us is not None else 0
+        hi = bisect_right(self._ts, end_us, 0, n) if end_us is not None else n
+        return lo, max(lo, hi)
+
+    def query(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+              direction: Optional[str] = None, rfid_tag: Optional[str] = None,
+              limit: Optional[int] = None) -> List[dict]:
+        """
+        Records in a time range, newest first
+
+        The range is found by bisect and walked backwards, so "newest N"
+        touches only N records when no other filter is given.
+        """
+        return self.query_tags(None if rfid_tag is None else [rfid_tag],
+                               start_us, end_us, direction, limit)
+
+    def query_tags(self, tags: Optional[List[str]] = None, start_us: Optional[int] = None,
+                   end_us: Optional[int] = None, direction: Optional[str] = None,
+                   limit: Optional[int] = None) -> List[dict]:
+        """
+        Records for any of several tags (None = all tags), newest first
+
+        Tag lookups walk the per-tag position index restricted to the
+        date range instead of scanning the whole store.
+        """
+        lo, hi = self.bounds(start_us, end_us)
+        direction_code = None
+        if direction is not None:
+            if direction not in self._direction_names:
+                return []
+            direction_code = self._direction_names.index(direction)
+
+        if tags is None:
+            positions = range(hi - 1, lo - 1, -1)
+        else:
+            runs = []
+            for tag in tags:
+                tag_positions = self._positions_of(tag)
+                if tag_positions:
+                    first = bisect_left(tag_positions, lo)
+                    last = bisect_left(tag_positions, hi)
+                    runs.append(_reversed_run(tag_positions, first, last))
+            positions = runs[0] if len(runs) == 1 else heapq.merge(*runs, reverse=True)
+
+        result = []
+        for pos in positions:
+            if limit is not None and len(result) >= limit:
+                break
+            if direction_code is not None and self._directions[pos] != direction_code:
+                continue
+            result.append(self.record_at(pos))
+        return result
+
+    def cursor_at(self, pos: int) -> str:
+        """
+        Paging cursor for the record at a position: its timestamp and its
+        index among records with that timestamp. Records with an equal
+        timestamp are inserted after the existing ones, so a cursor keeps
+        pointing at the same record while records are added.
+        """
+        ts = self._ts[pos]
+        return f"{ts}.{pos - bisect_left(self._ts, ts, 0, self._n)}"
+
+    def cursor_position(self, cursor: str) -> Optional[int]:
+        """Position a cursor from cursor_at refers to, or None if it is malformed"""
+        try:
+            ts, _, index = cursor.partition('.')
+            ts, index = int(ts), int(index)
+        except (ValueError, AttributeError):
+            return None
+        first = bisect_left(self._ts, ts, 0, self._n)
+        # Clamp in case records at that timestamp have been removed since
+        return min(first + max(0, index), bisect_right(self._ts, ts, 0, self._n))
+
+    def page(self, before: Optional[str] = None, after: Optional[str] = None, limit: int = 100,
+             start_us: Optional[int] = None, end_us: Optional[int] = None,
+             direction: Optional[str] = None, rfid_tag: Optional[str] = None) -> dict:
+        """
+        One page of records, newest first, by cursor
+
+        Without cursors the page is the newest `limit` records; with `before`
+        the ones just older than that record, with `after` the ones just
+        newer. Only the page's records are materialised.
+
+        Returns:
+            dict: {'records', 'has_more' (more records past the page in the
+                   direction walked), 'older_cursor', 'newer_cursor'
+                   (cursors of the page's oldest and newest records)}
+        """
+        lo, hi = self.bounds(start_us, end_us)
+        if before is not None:
+            pos = self.cursor_position(before)
+            hi = min(hi, pos if pos is not None else hi)
+        ascending = after is not None and before is None
+        if after is not None:
+            pos = self.cursor_position(after)
+            if pos is not None:
+                lo = max(lo, pos + 1)
+        hi = max(lo, hi)
+
+        direction_code = None
+        if direction is not None:
+            if direction not in self._direction_names:
+                return {'records': [], 'has_more': False, 'older_cursor': None, 'newer_cursor': None}
+            direction_code = self._direction_names.index(direction)
+
+        if rfid_tag is None:
+            positions = range(lo, hi) if ascending else range(hi - 1, lo - 1, -1)
+        else:
+            tag_positions = self._positions_of(rfid_tag) or array('I')
+            first = bisect_left(tag_positions, lo)
+            last = bisect_left(tag_positions, hi)
+            positions = (islice(tag_positions, first, last) if ascending
+                         else _reversed_run(tag_positions, first, last))
+
+        picked = []
+        has_more = False
+        for pos in positions:
+            if direction_code is not None and self._directions[pos] != direction_code:
+                continue
+            if len(picked) >= limit:
+                has_more = True
+                break
+            picked.append(pos)
+        if ascending:
+            picked.reverse()
+        return {
+            'records': [self.record_at(pos) for pos in picked],
+            'has_more': has_more,
+            'older_cursor': self.cursor_at(picked[-1]) if picked else None,
+            'newer_cursor': self.cursor_at(picked[0]) if picked else None
+        }
+
+    def iter_tag_directions(self) -> Iterator[Tuple[str, str]]:
+        """Iterate over (tag, direction) of all records, oldest first"""
+        names = self._direction_names
+        epcs = self.epcs.values()
+        for tag_id, code in islice(zip(self._tag_ids, self._directions), self._n):
+            yield epcs[tag_id], names[code]
+
+    def iter_records(self) -> Iterator[dict]:
+        """Iterate over all records, oldest first"""
+        for pos in range(self._n):
+            yield self.record_at(pos)
+
+    def to_list(self) -> List[dict]:
+        """All records as dicts, oldest first (persistence format)"""
+        return list(self.iter_records())
+
+
+class RecordSnapshot(RecordView):
+    """
+    Immutable view of a RecordStore as of one version.
+
+    Holds references to the store's columns plus the row count at the time
+    it was published, so taking one copies nothing and needs no lock.
+    """
+
+    def __init__(self, store: 'RecordStore'):
+        self._ts = store._ts
+        self._tag_ids = store._tag_ids
+        self._directions = store._directions
+        self._door_codes = store._door_codes
+        self._read_date_overrides = store._read_date_overrides
+        self._record_ids = store._record_ids
+        self._record_id_overrides = store._record_id_overrides
+        self._tag_positions = store._tag_positions
+        self._sorted_tags = store._sorted_tags
+        self._direction_names = store._direction_names
+        self.epcs = store.epcs
+        self.doors = store.doors
+        self._n = len(store._ts)
+        self.version = store.version
+
+    def changed_since(self, version: int) -> bool:
+        """True if this snapshot is newer than version"""
+        return self.version != version
+
+
+class RecordStore(RecordView):
+    """
+    Tracking records kept in read_date order as parallel columns.
+
+    Records arrive in time order, so appends are O(1) and date-range
+    lookups are a bisect over the timestamp column. A per-tag index of
+    positions serves tag queries without scanning. Dicts are only
+    materialised for the records a caller actually asks for.
+
+    Every column is a typed array: EPCs and door ids are interned to small
+    integers and read_date is rebuilt from the timestamp, so a record costs
+    about 36 bytes (16 of them the binary record id) instead of a dict of
+    strings. The few read_dates and record ids that do not round-trip
+    (legacy formats, non-UUID client ids) are kept verbatim by position.
+
+    Writers (one at a time, under the caller's lock) publish a RecordSnapshot
+    after every change. Appends only add rows past the published row count;
+    anything that moves rows (out-of-order insert, retention, clear) builds
+    new column objects, so a published snapshot never changes under a reader.
+    """
+
+    # Direction codes stored in the direction column
+    DIRECTIONS = ('IN', 'OUT')
+
+    def __init__(self):
+        self._direction_names = list(self.DIRECTIONS)
+        self.epcs = InternTable()
+        self.doors = InternTable()
+        self._ts = array('q')          # epoch microseconds, ascending
+        self._tag_ids = array('I')     # into self.epcs
+        self._directions = bytearray()
+        self._door_codes = array('H')  # into self.doors
+        # position -> read_date for strings epoch_us_to_read_date cannot rebuild
+        self._read_date_overrides: Dict[int, str] = {}
+        self._record_ids = bytearray()  # ID_WIDTH bytes per row, NO_ID = none
+        # position -> record_id for ids that are not canonical UUID strings
+        self._record_id_overrides: Dict[int, str] = {}
+        # Secondary index: tag id -> ascending positions, plus sorted tag list for prefix search
+        self._tag_positions: List[array] = []
+        self._sorted_tags: List[str] = []
+        # Bumped on every change; published with each snapshot
+        self.version = 0
+        self._publish()
+
+    @property
+    def _n(self) -> int:
+        return len(self._ts)
+
+    def _publish(self):
+        """Make the current rows visible to snapshot() readers"""
+        self._published = RecordSnapshot(self)
+        # The published snapshot references _sorted_tags; copy before the next insort
+        self._sorted_tags_shared = True
+
+    def snapshot(self) -> RecordSnapshot:
+        """Latest published snapshot (no lock, no copy)"""
+        return self._published
+
+    def _direction_code(self, direction: str) -> int:
+        """Map a direction string to its column code"""
+        try:
+            return self._direction_names.index(direction)
+        except ValueError:
+            self._direction_names.append(direction)
+            return len(self._direction_names) - 1
+
+    def append(self, record: dict) -> int:
+        """
+        Add a record, keeping the columns in time order
+
+        Returns:
+            int: Position the record was stored at
+        """
+        row = self._row(record)
+        if not self._ts or row[0] >= self._ts[-1]:
+            pos = self._append_row(row)
+        else:
+            pos = self._merge([row])[0]
+        self.version += 1
+        self._publish()
+        return pos
+
+    def extend(self, records: Iterable[dict]) -> List[int]:
+        """
+        Append many records, publishing once
+
+        Records older than the newest stored one (imported history, catch-up
+        from another door) are merged in with a single rebuild.
+
+        Returns:
+            list: Position of each record, in input order (valid until the next change)
+        """
+        positions = []
+        late = []
+        for record in records:
+            row = self._row(record)
+            if not self._ts or row[0] >= self._ts[-1]:
+                positions.append(self._append_row(row))
+            else:
+                late.append((len(positions), row))
+                positions.append(None)
+        if late:
+            # A row appended above moves down by the late rows inserted at or before it
+            cuts = sorted(bisect_right(self._ts, row[0]) for _, row in late)
+            merged = self._merge([row for _, row in late])
+            positions = [pos + bisect_right(cuts, pos) if pos is not None else None for pos in positions]
+            for (i, _), pos in zip(late, merged):
+                positions[i] = pos
+        self.version += 1
+        self._publish()
+        return positions
+
+    def _row(self, record: dict) -> tuple:
+        """(ts, tag id, direction code, door code, read_date override, id bytes, id override)"""
+        read_date = record.get('read_date', '')
+        ts = timestamp_to_epoch_us(read_date)
+        if ts is None:
+            # Unparseable legacy timestamps keep their arrival position
+            ts = self._ts[-1] if self._ts else 0
+        override = None if epoch_us_to_read_date(ts) == read_date else read_date
+        record_id = record.get('record_id') or ''
+        id_bytes = _id_bytes(record_id) if record_id else NO_ID
+        id_override = record_id if id_bytes is None else None
+        return (ts, self.epcs.intern(record.get('rfid_tag', '')),
+                self._direction_code(record.get('direction', '')),
+                self.doors.intern(record.get('door_id') or ''), override,
+                id_bytes or NO_ID, id_override)
+
+    def _append_row(self, row: tuple) -> int:
+        ts, tag_id, direction, door_code, override, id_bytes, id_override = row
+        pos = len(self._ts)
+        if override is not None:
+            self._read_date_overrides[pos] = override
+        if id_override is not None:
+            self._record_id_overrides[pos] = id_override
+        self._record_ids.extend(id_bytes)
+        self._tag_ids.append(tag_id)
+        self._directions.append(direction)
+        self._door_codes.append(door_code)
+        self._index_position(tag_id, pos)
+        # Timestamp last: the row count is len(_ts)
+        self._ts.append(ts)
+        return pos
+
+    def _merge(self, rows: List[tuple]) -> List[int]:
+        """
+        Insert out-of-order rows (rare slow path)
+
+        Later positions shift, so every column, the overrides and the tag
+        index are rebuilt as new objects, once for the whole batch.
+
+        Returns:
+            list: New position of each row, in input order
+        """
+        order = sorted(range(len(rows)), key=lambda i: rows[i][0])
+        # Old row p moves down by the number of new rows inserted at or before it
+        cuts = [bisect_right(self._ts, rows[i][0]) for i in order]
+        ts, tag_ids = array('q'), array('I')
+        directions, door_codes, record_ids = bytearray(), array('H'), bytearray()
+        overrides = _shift_overrides(self._read_date_overrides, cuts)
+        id_overrides = _shift_overrides(self._record_id_overrides, cuts)
+        positions = [0] * len(rows)
+        prev = 0
+        for i, cut in zip(order, cuts):
+            ts.extend(self._ts[prev:cut])
+            tag_ids.extend(self._tag_ids[prev:cut])
+            directions.extend(self._directions[prev:cut])
+            door_codes.extend(self._door_codes[prev:cut])
+            record_ids.extend(self._record_ids[prev * ID_WIDTH:cut * ID_WIDTH])
+            row_ts, tag_id, direction, door_code, override, id_bytes, id_override = rows[i]
+            positions[i] = len(ts)
+            if override is not None:
+                overrides[len(ts)] = override
+            if id_override is not None:
+                id_overrides[len(ts)] = id_override
+            ts.append(row_ts)
+            tag_ids.append(tag_id)
+            directions.append(direction)
+            door_codes.append(door_code)
+            record_ids.extend(id_bytes)
+            prev = cut
+        ts.extend(self._ts[prev:])
+        tag_ids.extend(self._tag_ids[prev:])
+        directions.extend(self._directions[prev:])
+        door_codes.extend(self._door_codes[prev:])
+        record_ids.extend(self._record_ids[prev * ID_WIDTH:])
+
+        self._tag_ids, self._directions, self._door_codes = tag_ids, directions, door_codes
+        self._record_ids = record_ids
+        self._read_date_overrides = overrides
+        self._record_id_overrides = id_overrides
+        self._ts = ts
+        self._rebuild_tag_index()
+        return positions
+
+    def _index_position(self, tag_id: int, pos: int):
+        """Add a position to the tag index"""
+        while len(self._tag_positions) <= tag_id:
+            self._tag_positions.append(array('I'))
+        positions = self._tag_positions[tag_id]
+        if not positions:
+            if self._sorted_tags_shared:
+                self._sorted_tags = list(self._sorted_tags)
+                self._sorted_tags_shared = False
+            insort(self._sorted_tags, self.epcs.value(tag_id))
+        positions.append(pos)
+
+    def _rebuild_tag_index(self):
+        """Rebuild the tag index from the tag column"""
+        tag_positions = [array('I') for _ in range(len(self.epcs))]
+        for pos, tag_id in enumerate(self._tag_ids):
+            tag_positions[tag_id].append(pos)
+        self._tag_positions = tag_positions
+        self._sorted_tags = sorted(self.epcs.value(tag_id)
+                                   for tag_id, positions in enumerate(tag_positions) if positions)
+        self._sorted_tags_shared = False
+
+    def remove_before(self, cutoff_us: int) -> int:
+        """
+        Remove records older than cutoff_us (retention)
+
+        Returns:
+            int: Number of records removed
+        """
+        cut = bisect_left(self._ts, cutoff_us)
+        if cut == 0:
+            return 0
+        self._ts = self._ts[cut:]
+        self._tag_ids = self._tag_ids[cut:]
+        self._directions = self._directions[cut:]
+        self._door_codes = self._door_codes[cut:]
+        self._read_date_overrides = {p - cut: value for p, value in self._read_date_overrides.items()
+                                     if p >= cut}
+        self._record_ids = self._record_ids[cut * ID_WIDTH:]
+        self._record_id_overrides = {p - cut: value for p, value in self._record_id_overrides.items()
+                                     if p >= cut}
+        self._rebuild_tag_index()
+        self.version += 1
+        self._publish()
+        return cut
+
+    def set_version(self, version: int):
+        """Continue numbering from version (a replica following another store's versions)"""
+        self.version = version
+        self._publish()
+
+    def clear(self):
+        """Remove all records"""
+        self.epcs = InternTable()
+        self.doors = InternTable()
+        self._ts = array('q')
+        self._tag_ids = array('I')
+        self._directions = bytearray()
+        self._door_codes = array('H')
+        self._read_date_overrides = {}
+        self._record_ids = bytearray()
+        self._record_id_overrides = {}
+        self._tag_positions = []
+        self._sorted_tags = []
+        self.version += 1
+        self._publish()
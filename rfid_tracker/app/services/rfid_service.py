@@ -499,11 +499,12 @@ class RFIDReader:
         try:
             from app import socketio
             if socketio:
-                socketio.emit('sensor_activity', {
+                from app.routes.websocket_events import broadcast_event
+                broadcast_event(socketio, 'sensor_activity', {
                     'location': location,
                     'detected': True,
                     'distance': 100  # Arbitrary value for visualization
-                })
+                }, key=f'sensor_activity:{location}', to=['sensor-live'])
                 print(f"🌊 Sensor visualization triggered for {location}")
         except Exception as e:
             pass
@@ -0,0 +1,77 @@
+"""
+Time-bounded set of recently ingested record ids (idempotent ingest)
+"""
+
+import time
+from collections import deque
+from typing import Callable
+
+
+class SeenIds:
+    """
+    Record ids seen within the last window seconds.
+
+    Ids go into the newest of a few generations of plain sets. Every
+    window / GENERATIONS seconds a new generation starts and the oldest one
+    is dropped whole, so a lookup is a handful of set probes and memory is
+    bounded by the ids that arrived in one window, however long the history.
+    An id is remembered for at least window seconds (at most one generation
+    longer).
+    """
+
+    GENERATIONS = 4
+
+    def __init__(self, window_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.window = max(0.0, float(window_seconds))
+        self._clock = clock
+        self._span = self.window / self.GENERATIONS
+        self._generations = deque([set()])
+        self._started = clock()
+
+    def __len__(self) -> int:
+        return sum(len(generation) for generation in self._generations)
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _rotate(self):
+        elapsed = self._clock() - self._started
+        if elapsed < self._span:
+            return
+        spans = int(elapsed // self._span)
+        for _ in range(min(spans, self.GENERATIONS + 1)):
+            self._generations.append(set())
+        # Keep one generation beyond the window so nothing expires early
+        while len(self._generations) > self.GENERATIONS + 1:
+            self._generations.popleft()
+        self._started += spans * self._span
+
+    def __contains__(self, record_id: str) -> bool:
+        if not self.enabled:
+            return False
+        self._rotate()
+        return any(record_id in generation for generation in self._generations)
+
+    def add(self, record_id: str):
+        """Remember an id from now on"""
+        if self.enabled:
+            self._rotate()
+            self._generations[-1].add(record_id)
+
+    def check_and_add(self, record_id: str) -> bool:
+        """
+        Remember an id
+
+        Returns:
+            bool: True if the id is new, False if it was seen within the window
+        """
+        if record_id in self:
+            return False
+        self.add(record_id)
+        return True
+
+    def clear(self):
+        """Forget every id"""
+        self._generations = deque([set()])
+        self._started = self._clock()
@@ -174,11 +174,12 @@ class MMWaveSensor:
             if should_emit:
                 from app import socketio
                 if socketio:
-                    socketio.emit('sensor_activity', {
+                    from app.routes.websocket_events import broadcast_event
+                    broadcast_event(socketio, 'sensor_activity', {
                         'location': self.location,
                         'detected': detected,
                         'distance': distance
-                    })
+                    }, key=f'sensor_activity:{self.location}', to=['sensor-live'])
                     self.last_emit_time = current_time
                     print(f"🌊 Sensor ({self.location}) - Activity emitted: {distance}cm")
             
@@ -0,0 +1,111 @@
+"""
+Materialised per-tag state: where every tag is right now
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Optional
+from app.models import TagState
+
+# Location a tag is in after moving in a direction
+DIRECTION_LOCATIONS = {'IN': 'inside', 'OUT': 'outside'}
+
+
+class TagStateTable:
+    """
+    Current location, last direction, last seen time and last door per tag.
+
+    Updated in O(1) (plus a sorted-list move when a tag changes location)
+    on every record, so "what is in the room right now" never needs a scan
+    of the history. Each location keeps a sorted tag list so pages can be
+    served from a tag cursor with bisect.
+    """
+
+    def __init__(self):
+        self._states: Dict[str, TagState] = {}
+        self._by_location: Dict[str, List[str]] = {location: [] for location in DIRECTION_LOCATIONS.values()}
+        self._all_tags: List[str] = []
+        # Bumped on every state change; sent with deltas so clients can detect gaps
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def update(self, rfid_tag: str, direction: str, read_date: str, ts_us: int,
+               door_id: str = '') -> Optional[TagState]:
+        """
+        Apply one record to the table
+
+        Returns:
+            TagState: The tag's new state, or None if the record is older
+                      than what the table already holds
+        """
+        location = DIRECTION_LOCATIONS.get(direction)
+        if location is None:
+            return None
+
+        state = self._states.get(rfid_tag)
+        if state is None:
+            state = TagState(rfid_tag=rfid_tag, location=location, last_direction=direction,
+                             last_seen=read_date, last_door=door_id, last_seen_us=ts_us)
+            self._states[rfid_tag] = state
+            insort(self._all_tags, rfid_tag)
+            insort(self._by_location[location], rfid_tag)
+        else:
+            if ts_us < state.last_seen_us:
+                return None
+            if state.location != location:
+                tags = self._by_location[state.location]
+                del tags[bisect_left(tags, rfid_tag)]
+                insort(self._by_location[location], rfid_tag)
+            state.location = location
+            state.last_direction = direction
+            state.last_seen = read_date
+            state.last_door = door_id
+            state.last_seen_us = ts_us
+
+        self.version += 1
+        return state
+
+    def clear(self):
+        """Forget all tags (version keeps increasing)"""
+        self._states = {}
+        self._by_location = {location: [] for location in DIRECTION_LOCATIONS.values()}
+        self._all_tags = []
+        self.version += 1
+
+    def snapshot(self) -> List[dict]:
+        """Serialisable list of all tag states"""
+        return [self._states[tag].to_dict() for tag in self._all_tags]
+
+    def restore(self, states: List[dict]):
+        """Replace the table with a snapshot() result"""
+        self.clear()
+        for state in states or []:
+            self.update(state['rfid_tag'], state['last_direction'], state['last_seen'],
+                        state.get('last_seen_us', 0), state.get('last_door', ''))
+
+    def get(self, rfid_tag: str) -> Optional[TagState]:
+        """State of one tag, O(1)"""
+        return self._states.get(rfid_tag)
+
+    def count(self, location: str) -> int:
+        """Number of tags currently at a location"""
+        return len(self._by_location.get(location, ()))
+
+    def counts(self) -> Dict[str, int]:
+        """Number of tags at each location"""
+        return {location: len(tags) for location, tags in self._by_location.items()}
+
+    def page(self, location: Optional[str] = None, after: Optional[str] = None,
+             limit: int = 50) -> List[TagState]:
+        """
+        One page of tag states in tag order
+
+        Args:
+            location: 'inside' / 'outside', or None for all tags
+            after: Cursor - return tags sorted after this tag
+            limit: Page size
+        """
+        tags = self._all_tags if location is None else self._by_location.get(location, [])
+        start = bisect_right(tags, after) if after is not None else 0
+        return [self._states[tag] for tag in tags[start:start + limit]]
@@ -1,41 +1,253 @@
 import threading
 import os
 import shutil
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from flask import current_app
 from app.models import TrackingRecord, SystemStatus
-from app.utils.helpers import load_json_file, save_json_file, get_mac_address, send_to_dispatcher, convert_to_iso_format
+from app.services.record_store import RecordStore
+from app.services.tracking_stats import TrackingStatistics
+from app.services.tag_state import TagStateTable
+from app.services.pairing import PairingTable
+from app.services.record_archive import RecordArchive
+from app.services.columnar_archive import ColumnarArchive
+from app.services.backup_worker import backup_worker
+from app.services.dispatcher_outbox import dispatcher_outbox
+from app.services.seen_ids import SeenIds
+from app.services.change_feed import ChangeFeed
+from app.services.broadcaster import broadcaster
+from app.services.payload_cache import record_fragments, cache_stats
+from app.services.cluster import cluster
+from app.utils.helpers import (iter_json_array, load_json_file, save_json_file, save_json_atomic, save_json_records,
+                               get_mac_address, validate_record_id,
+                               convert_to_iso_format, timestamp_to_epoch_us, epoch_us_to_read_date, CALGARY_TZ)
+
+# How often add_record checks whether records have left the retention window
+RETENTION_CHECK_INTERVAL = 3600
+# Records added to the store per lock acquisition while loading history
+LOAD_BATCH_SIZE = 5000
+# Statistics counters broadcast as differences rather than totals
+STAT_COUNTERS = ('total_records', 'in_count', 'out_count', 'unique_tags', 'current_balance')
 
 class TrackingService:
     """Service for managing tracking records"""
     
     def __init__(self):
-        self.records: List[dict] = []
+        # Time-ordered column store; dicts are built only for returned records
+        self.store = RecordStore()
+        # Counters and top tags, updated per record instead of recomputed per request
+        self.stats = TrackingStatistics()
+        # Where each tag is right now (latest movement per tag)
+        self.tag_states = TagStateTable()
         self.status = SystemStatus()
         # Use a re-entrant lock because _save()/write_inventory_snapshot may be
         # called while the calling thread already holds the lock (avoid deadlock).
+        # Only writers take it: readers use the store's published snapshot and
+        # the published statistics payload.
         self.lock = threading.RLock()
+        self._stats_payload = None
+        self._publish_statistics()
         # Timestamp when records were last cleared. Used to avoid re-sync from frontend
         # immediately after a manual clear (frontend may still POST cached inventory).
         self.last_cleared_at = None
-        # Track the last sent pair timestamp for each tag (to send only newer pairs)
-        self.last_sent_pair_timestamp = {}
-    
-    def initialize(self):
-        """Initialize tracking service and load existing data"""
-        data_file = current_app.config['DATA_FILE']
-        self.records = load_json_file(data_file, default=[])
-        self.status.total_records = len(self.records)
-        print(f"Loaded {len(self.records)} existing records")
-        # Periodic snapshot controls
+        # Latest IN/OUT pair and last pair sent per tag, persisted to pairing_file
+        self.pairing = PairingTable()
+        self.pairing_file = None
+        self._pairing_written_version = None
+        # Tags whose history arrived out of order while loading (rebuilt once loaded)
+        self._late_pairing_tags = set()
+        # Compressed day partitions for records older than RETENTION_DAYS
+        self.archive = None
+        self._next_retention_check = 0
+        # Records older than this are counted in the archive baseline; while
+        # loading, DATA_FILE rows before it (left by an interrupted retention
+        # cut) are dropped instead of counted twice
+        self._baseline_cutoff_us = 0
+        self._archived_rows_dropped = 0
+        # Append-only column files of the full history (read-only to analytics)
+        self.column_archive = None
+        # Bumped by every clear; a column backfill that started before one is discarded
+        self._clear_generation = 0
+        # Compression job for the data file rotated by the last clear
+        self.last_backup = None
+        # Startup loading: records added before the history is loaded wait in
+        # _pending_records; a clear during loading cancels it
+        self.ready = False
+        self._ready_event = threading.Event()
+        self._load_cancelled = False
+        self._pending_records = []
+        # Record ids ingested recently: resubmissions within the window are ignored
+        self.seen_ids = SeenIds(0)
+        # Numbered changes broadcast to WebSocket clients; a client that sees
+        # a gap in the numbers replays from here (see get_changes_since)
+        self.changes = ChangeFeed()
+        # Inventory snapshot writer: woken by _snapshot_dirty, writes only when
+        # the tag state version moved since the last write
+        self.snapshot_file = None
+        self._snapshot_dirty = threading.Event()
+        self._snapshot_written_version = None
+        self._snapshot_etag = None
+        # Distinguishes versions from different runs in snapshot ETags
+        self._boot_id = int(time.time())
         self._periodic_thread = None
         self._stop_event = threading.Event()
+        # Owner's last status_update, on a web worker (hardware and delivery are the owner's)
+        self._owner_status = {}
+    
+    def initialize(self, background: bool = False):
+        """
+        Initialize tracking service and load existing data
+        
+        Args:
+            background: Stream the history in on a loader thread and return
+                        at once. Reads are served from what has been loaded so
+                        far; status reports ready=False until loading finishes,
+                        and records added meanwhile are applied after the history.
+        """
+        app = current_app._get_current_object()
+        with self.lock:
+            self.ready = False
+            self._ready_event.clear()
+            self._load_cancelled = False
+            self._pending_records = []
+            self.seen_ids = SeenIds(app.config.get('DEDUP_WINDOW_SECONDS', 3600))
+            self.changes.resize(app.config.get('CHANGE_FEED_SIZE', 1000))
+            record_fragments.resize(app.config.get('RECORD_JSON_CACHE_SIZE', 20000))
+            self.status.ready = False
+            # Statistics and tag states start from the archive baseline (state as of
+            # all archived records); only the hot window is replayed on top of it
+            self.archive = RecordArchive(app.config['ARCHIVE_DIR'],
+                                         app.config.get('ARCHIVE_COMPRESSION', 'gzip'))
+            baseline = self.archive.load_baseline()
+            # Cleared/restored rather than replaced so versions keep increasing
+            self.store.clear()
+            self.stats.restore(baseline.get('stats'))
+            self.tag_states.restore(baseline.get('tag_states'))
+            self._baseline_cutoff_us = baseline.get('cutoff_us', 0)
+            self._archived_rows_dropped = 0
+            self.status.total_records = 0
+            self._publish_statistics()
+            self.snapshot_file = app.config.get('INVENTORY_SNAPSHOT_FILE')
+            # Pairing state as of the last write; the history only replays what is newer
+            self.pairing_file = app.config.get('PAIRING_STATE_FILE')
+            saved_pairing = load_json_file(self.pairing_file, default={}) if self.pairing_file else {}
+            self.pairing.restore(saved_pairing.get('pairings'))
+            self._pairing_written_version = None
+            self._late_pairing_tags = set()
+        
+        if background:
+            thread = threading.Thread(target=self._load_history, args=(app,),
+                                      name='HistoryLoader', daemon=True)
+            thread.start()
+        else:
+            self._load_history(app)
+    
+    def _load_history(self, app):
+        """Stream DATA_FILE into the store in batches, then finish startup"""
+        with app.app_context():
+            data_file = app.config['DATA_FILE']
+            # Records written before door ids existed were all read by this unit
+            door_id = app.config.get('DOOR_ID', '')
+            batch = []
+            try:
+                for record in iter_json_array(data_file):
+                    if not record.get('door_id'):
+                        record['door_id'] = door_id
+                    if not record.get('record_id'):
+                        # Deterministic, so a replay of the same capture is recognised
+                        record['record_id'] = TrackingRecord.content_id(
+                            record.get('rfid_tag', ''), record.get('direction', ''),
+                            record.get('read_date', ''), record['door_id'])
+                    batch.append(record)
+                    if len(batch) >= LOAD_BATCH_SIZE:
+                        if not self._load_batch(batch):
+                            break
+                        batch = []
+                else:
+                    self._load_batch(batch)
+            except (ValueError, OSError) as e:
+                # Keep what was read before the damage rather than starting empty
+                self._load_batch(batch)
+                print(f"Error loading {data_file}: {e}")
+            print(f"Loaded {len(self.store)} existing records")
+            self._finish_loading()
+    
+    def _load_batch(self, records: List[dict]) -> bool:
+        """Add a batch of history; False once a clear has cancelled loading"""
+        with self.lock:
+            if self._load_cancelled:
+                return False
+            self.store.extend(records)
+            # Only records from the last window can still be resubmitted
+            recent_us = (time.time() - self.seen_ids.window) * 1_000_000
+            dropped = 0
+            for record in records:
+                ts = timestamp_to_epoch_us(record['read_date']) or 0
+                if ts < self._baseline_cutoff_us:
+                    # Archived and counted in the baseline already
+                    dropped += 1
+                    continue
+                self.stats.add(record['rfid_tag'], record['direction'])
+                self.tag_states.update(record['rfid_tag'], record['direction'], record['read_date'],
+                                       ts, record['door_id'])
+                # Records up to the saved pairing state are reflected in it; one
+                # older than a record loaded before it has its tag rebuilt once loaded
+                if (not self.pairing.is_applied(record['rfid_tag'], ts)
+                        and not self.pairing.update(record['rfid_tag'], record['direction'], ts,
+                                                    record['read_date'])):
+                    self._late_pairing_tags.add(record['rfid_tag'])
+                if ts >= recent_us:
+                    self.seen_ids.add(record['record_id'])
+            if dropped:
+                self.store.remove_before(self._baseline_cutoff_us)
+                self._archived_rows_dropped += dropped
+            self.status.total_records = len(self.store)
+            self._publish_statistics()
+            return True
+    
+    def _finish_loading(self):
+        """Build the column archive, apply records that arrived while loading, go ready"""
+        # No other writer touches the store until ready is set
+        self._open_column_archive()
+        with self.lock:
+            for rfid_tag in self._late_pairing_tags:
+                self._rebuild_pairing(rfid_tag)
+            self._late_pairing_tags = set()
+            pending = self._pending_records
+            self._pending_records = []
+            if pending:
+                self._apply_records(pending)
+            if pending or self._archived_rows_dropped:
+                self._save()
+            if self._archived_rows_dropped:
+                print(f"[WARNING] Dropped {self._archived_rows_dropped} records the archive already holds from the data file")
+            self.ready = True
+            self.status.ready = True
+            self._ready_event.set()
+            # Clients that connected while loading only have part of the history
+            resync = self.changes.append('resync_required', {})
+        
+        self._emit_change('resync_required', resync)
+        self._emit_statistics()
+        self._apply_retention()
+        self.write_pairing_state()
+        self._snapshot_dirty.set()
+        latest_pending = {record['rfid_tag']: record for record in pending}
+        for rfid_tag, record_dict in latest_pending.items():
+            self._check_and_send_to_dispatcher(rfid_tag, record_dict)
+        self._emit_status_update()
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until the history has finished loading"""
+        return self._ready_event.wait(timeout)
     
     def _check_and_send_to_dispatcher(self, rfid_tag: str, current_record: dict):
         """
-        Check if tag has complete IN/OUT pairs and send ONLY if the latest pair is newer than last sent.
-        Accumulates all pairs and sends only when the latest pair's timestamp is more recent than previously sent.
+        Send the tag's latest IN/OUT pair to the dispatcher if it is newer than the last one sent.
+        
+        The pairing table already holds each tag's latest pair (updated per
+        record), so this is O(1) regardless of the tag's history.
         
         Args:
             rfid_tag: The RFID tag ID
@@ -46,155 +258,438 @@ class TrackingService:
             if not dispatcher_url:
                 return
             
-            # Get all records for this tag, sorted by date
-            tag_records = [r for r in self.records if r.get('rfid_tag') == rfid_tag]
-            tag_records.sort(key=lambda r: r.get('read_date', ''))
+            with self.lock:
+                pairing = self.pairing.due(rfid_tag)
+                if pairing is None:
+                    print(f"⚠ Tag {rfid_tag} has no new IN/OUT pair since the last one sent")
+                    return
+                # Marked before queueing: the outbox owns delivery from here on
+                self.pairing.mark_sent(rfid_tag)
+                direction, read_date = pairing.pair_direction, pairing.pair_read_date
+            self._snapshot_dirty.set()
             
-            if len(tag_records) < 2:
-                print(f"⚠ Tag {rfid_tag} has only {len(tag_records)} record(s), need minimum 2 for a pair")
-                return
+            print(f"✓ Tag {rfid_tag} - Sending LATEST pair: {direction} at {read_date}")
             
-            # Find the absolute LATEST pair by checking from the end backwards
-            # This ensures we always send the most recent movement
-            latest_pair = None
-            latest_record = None
-            
-            # Start from the most recent record and work backwards
-            for i in range(len(tag_records) - 1, 0, -1):
-                curr = tag_records[i]
-                prev = tag_records[i - 1]
-                curr_dir = curr.get('direction')
-                prev_dir = prev.get('direction')
-                
-                # Check if this forms a valid pair (different directions)
-                if curr_dir != prev_dir:
-                    # This is the latest pair - use it and stop searching
-                    latest_pair = {'first': prev, 'second': curr}
-                    latest_record = curr
-                    break
-            
-            if not latest_pair:
-                print(f"⚠ Tag {rfid_tag} has {len(tag_records)} records but no complete IN/OUT pairs")
-                return
-            
-            latest_timestamp = latest_record['read_date']
-            
-            # Check if this latest pair is newer than what we've already sent
-            last_sent_timestamp = self.last_sent_pair_timestamp.get(rfid_tag)
-            
-            if last_sent_timestamp and latest_timestamp <= last_sent_timestamp:
-                print(f"⚠ Tag {rfid_tag} latest pair (at {latest_timestamp}) not newer than last sent (at {last_sent_timestamp})")
-                return
-            
-            # Update the last sent timestamp for this tag
-            self.last_sent_pair_timestamp[rfid_tag] = latest_timestamp
-            
-            print(f"✓ Tag {rfid_tag} - Sending LATEST pair: {latest_record['direction']} at {latest_timestamp}")
-            
-            # Get system MAC address
-            mac_address = get_mac_address()
-            
-            # Convert timestamp to ISO 8601 format for dispatcher
-            iso_timestamp = convert_to_iso_format(latest_record['read_date'])
-            
-            # Send to dispatcher in background thread
-            import threading
-            thread = threading.Thread(
-                target=send_to_dispatcher,
-                args=(dispatcher_url, rfid_tag, mac_address, latest_record['direction'], iso_timestamp),
-                daemon=True
-            )
-            thread.start()
+            # Persisted in the outbox and delivered (with retries) by its worker threads
+            dispatcher_outbox.enqueue(rfid_tag, {
+                "tagId": rfid_tag,
+                "macAddress": get_mac_address(),
+                "direction": direction,
+                # ISO 8601 for the dispatcher
+                "readDate": convert_to_iso_format(read_date)
+            })
             
         except Exception as e:
             print(f"⚠ Error checking/sending to dispatcher: {e}")
     
-    def add_record(self, rfid_tag: str, direction: str) -> dict:
-        """Add new tracking record"""
-        record = TrackingRecord.create(rfid_tag, direction.upper())
+    def _rebuild_pairing(self, rfid_tag: str):
+        """Recompute a tag's pairing from its stored records (lock held)"""
+        self.pairing.rebuild(rfid_tag, ((self.store.direction_at(pos), self.store.ts_at(pos),
+                                         self.store.read_date_at(pos))
+                                        for pos in self.store.tag_positions(rfid_tag)))
+    
+    def add_record(self, rfid_tag: str, direction: str, record_id: Optional[str] = None) -> Optional[dict]:
+        """
+        Add new tracking record
+        
+        Args:
+            record_id: Client-supplied id (a random one is generated otherwise).
+                       Resubmitting an id within DEDUP_WINDOW_SECONDS is a no-op.
+        
+        Returns:
+            dict: The record, or None if record_id is a duplicate
+        """
+        if cluster.role == 'web':
+            # Added by the owner; its record_added reaches this replica before the reply
+            return cluster.call('add_record', rfid_tag, direction, record_id)
+        record = TrackingRecord.create(rfid_tag, direction.upper(), current_app.config.get('DOOR_ID', ''),
+                                       record_id)
         record_dict = record.to_dict()
         
         with self.lock:
-            self.records.append(record_dict)
-            self.status.last_tag_read = record_dict
-            self.status.total_records = len(self.records)
-            self._save()
+            if not self.seen_ids.check_and_add(record.record_id):
+                print(f"[INFO] Duplicate record ignored: {record.record_id}")
+                return None
+            stats_before = self._stats_payload
+            ready = self.ready
+            if ready:
+                tag_state_dict, tag_state_version = self._apply_record(record_dict)
+                self._save()
+            else:
+                # Applied (and saved) after the history has loaded
+                self._pending_records.append(record_dict)
+                tag_state_dict = None
+                self.status.last_tag_read = record_dict
+            change = self.changes.append('record_added', {
+                'record': record_dict,
+                'stats_delta': self._stats_delta(stats_before, self._stats_payload)
+            })
         
         print(f"Recorded: {rfid_tag} - {direction} at {record.read_date}")
+        # Encoded once here; record lists reuse the fragment
+        record_fragments.add(record_dict)
         
-        # Check if tag has both IN/OUT records and send to dispatcher if criteria met
-        self._check_and_send_to_dispatcher(rfid_tag, record_dict)
+        if ready:
+            self._snapshot_dirty.set()
+            if time.time() >= self._next_retention_check:
+                self._apply_retention()
+            
+            # Check if tag has both IN/OUT records and send to dispatcher if criteria met
+            self._check_and_send_to_dispatcher(rfid_tag, record_dict)
         
         # Emit WebSocket event if socketio is available
-        self._emit_record_added(record_dict)
+        self._emit_change('record_added', change)
+        self._emit_statistics()
+        if tag_state_dict:
+            self._emit_tag_state_changed(tag_state_dict, tag_state_version)
         
         return record_dict
     
-    def get_all_records(self, filters: Optional[Dict] = None) -> List[dict]:
-        """Get all records with optional filters"""
+    def add_records(self, items: List[dict]) -> dict:
+        """
+        Add a batch of records with one lock acquisition, one save and one broadcast
+        
+        Items are {rfid_tag, direction, read_date?, door_id?, record_id?}.
+        read_date (any format timestamp_to_epoch_us accepts) defaults to now
+        and is stored in the record format; door_id defaults to this unit.
+        Without a record_id, an item with a read_date gets one derived from its
+        content (so replaying a capture is idempotent) and one without gets a
+        random id. The whole batch is validated first and nothing is added if
+        any item is invalid; records whose id was seen within the dedup window
+        (or earlier in the batch) are skipped and reported.
+        
+        Returns:
+            dict: {'records': records added, 'duplicates': [record_id, ...],
+                   'errors': ['<index>: <problem>', ...]}
+        """
+        if cluster.role == 'web':
+            return cluster.call('add_records', items)
+        default_door = current_app.config.get('DOOR_ID', '')
+        records = []
+        errors = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append(f"{index}: record must be an object")
+                continue
+            rfid_tag = item.get('rfid_tag')
+            direction = item.get('direction')
+            read_date = item.get('read_date')
+            record_id = item.get('record_id')
+            if not rfid_tag or not isinstance(rfid_tag, str):
+                errors.append(f"{index}: missing rfid_tag")
+                continue
+            if not isinstance(direction, str) or direction.upper() not in ['IN', 'OUT']:
+                errors.append(f"{index}: direction must be IN or OUT")
+                continue
+            if record_id is not None and not validate_record_id(record_id):
+                errors.append(f"{index}: invalid record_id")
+                continue
+            if read_date:
+                ts = timestamp_to_epoch_us(read_date) if isinstance(read_date, str) else None
+                if ts is None:
+                    errors.append(f"{index}: unparseable read_date {read_date!r}")
+                    continue
+                read_date = epoch_us_to_read_date(ts)
+                door_id = item.get('door_id') or default_door
+                record = TrackingRecord(rfid_tag, direction.upper(), read_date, door_id,
+                                        record_id or TrackingRecord.content_id(rfid_tag, direction.upper(),
+                                                                               read_date, door_id))
+            else:
+                record = TrackingRecord.create(rfid_tag, direction.upper(), item.get('door_id') or default_door,
+                                               record_id)
+            records.append(record.to_dict())
+        if errors or not records:
+            return {'records': [], 'duplicates': [], 'errors': errors}
+        
         with self.lock:
-            filtered = self.records.copy()
+            fresh = []
+            duplicates = []
+            for record in records:
+                if self.seen_ids.check_and_add(record['record_id']):
+                    fresh.append(record)
+                else:
+                    duplicates.append(record['record_id'])
+            records = fresh
+            if duplicates:
+                print(f"[INFO] {len(duplicates)} duplicate record(s) ignored in bulk")
+            if not records:
+                return {'records': [], 'duplicates': duplicates, 'errors': []}
+            stats_before = self._stats_payload
+            ready = self.ready
+            if ready:
+                tag_state_dicts, tag_state_version = self._apply_records(records)
+                self._save()
+            else:
+                # Applied (and saved) after the history has loaded
+                self._pending_records.extend(records)
+                tag_state_dicts, tag_state_version = [], self.tag_states.version
+                self.status.last_tag_read = records[-1]
+            change = self.changes.append('records_added', {
+                'records': sorted(records, key=lambda r: timestamp_to_epoch_us(r['read_date']) or 0,
+                                  reverse=True),
+                'count': len(records),
+                'stats_delta': self._stats_delta(stats_before, self._stats_payload),
+                'tag_states': tag_state_dicts,
+                'tag_state_version': tag_state_version
+            }, weight=len(records))
         
-        if filters:
-            if 'direction' in filters:
-                filtered = [r for r in filtered if r['direction'] == filters['direction'].upper()]
-            
-            if 'start_date' in filters:
-                filtered = [r for r in filtered if r['read_date'] >= filters['start_date']]
-            
-            if 'end_date' in filters:
-                filtered = [r for r in filtered if r['read_date'] <= filters['end_date']]
+        print(f"Recorded {len(records)} records in bulk")
+        for record_dict in records:
+            record_fragments.add(record_dict)
+        
+        if ready:
+            self._snapshot_dirty.set()
+            if time.time() >= self._next_retention_check:
+                self._apply_retention()
             
-            if 'rfid_tag' in filters:
-                filtered = [r for r in filtered if r['rfid_tag'] == filters['rfid_tag']]
+            # Pairing only depends on each tag's latest records: once per tag
+            latest = {record['rfid_tag']: record for record in records}
+            for rfid_tag, record_dict in latest.items():
+                self._check_and_send_to_dispatcher(rfid_tag, record_dict)
+        
+        self._emit_change('records_added', change)
+        self._emit_statistics()
+        for state in tag_state_dicts:
+            self._emit_tag_state_changed(state, tag_state_version)
+        return {'records': records, 'duplicates': duplicates, 'errors': []}
+    
+    def _apply_record(self, record_dict: dict) -> tuple:
+        """
+        Add a new record to the store, statistics, tag states and columns (lock held)
+        
+        Returns:
+            tuple: (new tag state dict or None, tag state version)
+        """
+        tag_state_dicts, version = self._apply_records([record_dict])
+        return (tag_state_dicts[0] if tag_state_dicts else None), version
+    
+    def _apply_records(self, records: List[dict]) -> tuple:
+        """
+        Add new records to the store, statistics, tag states and columns (lock held)
+        
+        Returns:
+            tuple: (new state dict of each changed tag, tag state version)
+        """
+        positions = self.store.extend(records)
+        rows = []
+        changed = {}
+        for record_dict, pos in zip(records, positions):
+            ts = self.store.ts_at(pos)
+            self.stats.add(record_dict['rfid_tag'], record_dict['direction'])
+            rows.append((ts, record_dict['rfid_tag'], record_dict['direction'], record_dict['door_id']))
+            tag_state = self.tag_states.update(record_dict['rfid_tag'], record_dict['direction'],
+                                               record_dict['read_date'], ts, record_dict['door_id'])
+            if not self.pairing.update(record_dict['rfid_tag'], record_dict['direction'], ts,
+                                       record_dict['read_date']):
+                # Late record: it may split or join pairs, so replay the tag
+                self._rebuild_pairing(record_dict['rfid_tag'])
+            if tag_state:
+                changed[record_dict['rfid_tag']] = tag_state.to_dict()
+        self._append_columns(rows)
+        self.status.last_tag_read = records[-1]
+        self.status.total_records = len(self.store)
+        self._publish_statistics()
+        return list(changed.values()), self.tag_states.version
+    
+    def get_all_records(self, filters: Optional[Dict] = None) -> List[dict]:
+        """Get records (newest first) with optional filters"""
+        filters = filters or {}
+        
+        direction = filters.get('direction')
+        if direction:
+            direction = direction.upper()
+        
+        # Date bounds are resolved to positions by bisect on the time column
+        start_us = end_us = None
+        if filters.get('start_date'):
+            start_us = timestamp_to_epoch_us(filters['start_date'])
+            if start_us is None:
+                print(f"⚠ Ignoring unparseable start_date filter: {filters['start_date']}")
+        if filters.get('end_date'):
+            end_us = timestamp_to_epoch_us(filters['end_date'], end=True)
+            if end_us is None:
+                print(f"⚠ Ignoring unparseable end_date filter: {filters['end_date']}")
+        
+        limit = filters.get('limit')
+        if limit is not None:
+            limit = max(0, int(limit))
+        
+        snapshot = self.store.snapshot()
+        records = snapshot.query(
+            start_us=start_us,
+            end_us=end_us,
+            direction=direction,
+            rfid_tag=filters.get('rfid_tag'),
+            limit=limit
+        )
+        hot_start_us = snapshot.ts_at(0) if len(snapshot) else None
+        
+        # Only a query whose start_date reaches back past the hot window opens
+        # archive partitions (and only those overlapping its date range)
+        if (start_us is not None and self.archive is not None
+                and (hot_start_us is None or start_us < hot_start_us)
+                and (limit is None or len(records) < limit)):
+            archive_end_us = end_us
+            if hot_start_us is not None:
+                archive_end_us = hot_start_us - 1 if end_us is None else min(end_us, hot_start_us - 1)
+            records.extend(self.archive.query(
+                start_us=start_us,
+                end_us=archive_end_us,
+                direction=direction,
+                tags=[filters['rfid_tag']] if filters.get('rfid_tag') else None,
+                limit=None if limit is None else limit - len(records)
+            ))
+        
+        return records
+    
+    def get_records_page(self, options: Optional[Dict] = None) -> dict:
+        """
+        One page of in-memory records, newest first, by cursor
+        
+        Args:
+            options: limit (default RECORDS_PAGE_SIZE, at most RECORDS_PAGE_MAX),
+                     before / after (a cursor from a previous page), and the
+                     get_all_records filters direction, rfid_tag, start_date,
+                     end_date. Archived records are not paged (use the REST
+                     records endpoint with start_date for those).
+        
+        Returns:
+            dict: RecordView.page() result plus 'count', 'total' (records in
+                  memory) and the records 'version'
+        """
+        options = options or {}
+        limit = options.get('limit')
+        page_size = current_app.config.get('RECORDS_PAGE_SIZE', 100)
+        try:
+            limit = int(limit) if limit is not None else page_size
+        except (TypeError, ValueError):
+            limit = page_size
+        limit = max(1, min(limit, current_app.config.get('RECORDS_PAGE_MAX', 1000)))
         
-        # Sort by date (newest first)
-        filtered.sort(key=lambda x: x['read_date'], reverse=True)
+        direction = options.get('direction')
+        start_us = timestamp_to_epoch_us(options['start_date']) if options.get('start_date') else None
+        end_us = timestamp_to_epoch_us(options['end_date'], end=True) if options.get('end_date') else None
+        before = options.get('before')
+        after = options.get('after')
         
-        # Apply limit
-        if filters and 'limit' in filters:
-            filtered = filtered[:filters['limit']]
+        snapshot = self.store.snapshot()
+        page = snapshot.page(
+            before=before if isinstance(before, str) else None,
+            after=after if isinstance(after, str) else None,
+            limit=limit,
+            start_us=start_us,
+            end_us=end_us,
+            direction=direction.upper() if isinstance(direction, str) and direction else None,
+            rfid_tag=options.get('rfid_tag') or None
+        )
+        page.update(count=len(page['records']), total=len(snapshot), version=snapshot.version)
+        return page
+    
+    def get_tag_records(self, tag_id: str, prefix: bool = False, limit: Optional[int] = None) -> List[dict]:
+        """
+        Get records for a specific tag (newest first) from the tag index
         
-        return filtered
+        Args:
+            tag_id: Full tag EPC, or a partial EPC when prefix is True
+            prefix: Match every known tag starting with tag_id
+            limit: Maximum number of records to return
+        """
+        snapshot = self.store.snapshot()
+        tags = self._search_tags(snapshot, tag_id) if prefix else [tag_id]
+        return snapshot.query_tags(tags, limit=limit)
+    
+    def search_tags(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Known tags starting with a partial EPC (case-insensitive for hex EPCs)"""
+        return self._search_tags(self.store.snapshot(), prefix, limit)
+    
+    @staticmethod
+    def _search_tags(snapshot, prefix: str, limit: Optional[int] = None) -> List[str]:
+        tags = snapshot.tags_with_prefix(prefix, limit)
+        if prefix.upper() != prefix:
+            tags = sorted(set(tags) | set(snapshot.tags_with_prefix(prefix.upper(), limit)))
+            if limit is not None:
+                tags = tags[:limit]
+        return tags
+    
+    def get_tag_record_count(self, tag_id: str) -> int:
+        """Number of records stored for a tag"""
+        return self.store.snapshot().tag_count(tag_id)
     
-    def get_tag_records(self, tag_id: str) -> List[dict]:
-        """Get all records for specific tag"""
-        return self.get_all_records({'rfid_tag': tag_id})
+    def get_records_version(self) -> int:
+        """Version of the records readers currently see"""
+        return self.store.snapshot().version
+    
+    def records_changed_since(self, version: int) -> bool:
+        """True if records were added, removed or cleared since version"""
+        return self.store.snapshot().changed_since(version)
     
     def clear_all_records(self):
         """Clear all tracking records"""
+        if cluster.role == 'web':
+            return cluster.call('clear_all_records')
         with self.lock:
             print("[DEBUG] clear_all_records() called: preparing to clear records")
-            # Create a timestamped backup of the existing data file before clearing.
+            # Rotate the data file out of the way (a rename, not a copy); the
+            # backup worker compresses it after the lock is released.
+            ts = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+            data_file = current_app.config.get('DATA_FILE')
+            rotated_path = None
             try:
-                data_file = current_app.config.get('DATA_FILE')
                 if data_file and os.path.exists(data_file):
                     data_dir = os.path.dirname(data_file)
-                    ts = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-                    backup_path = os.path.join(data_dir, f"tag_tracking_{ts}.json")
-                    shutil.copy2(data_file, backup_path)
-                    print(f"[INFO] Backup created before clear: {backup_path}")
+                    rotated_path = os.path.join(data_dir, f"tag_tracking_{ts}.json")
+                    os.replace(data_file, rotated_path)
+                    print(f"[INFO] Data file rotated before clear: {rotated_path}")
             except Exception as e:
-                print(f"[WARNING] Failed to create backup before clear: {e}")
+                rotated_path = None
+                print(f"[WARNING] Failed to rotate data file before clear: {e}")
+
+            # Archived partitions are part of "all records": set the archive
+            # directory aside as a backup and start a fresh one
+            if self.archive is not None:
+                archive_dir = self.archive.directory
+                try:
+                    if os.path.isdir(archive_dir):
+                        os.replace(archive_dir, f"{archive_dir}_{ts}")
+                        print(f"[INFO] Archive moved aside before clear: {archive_dir}_{ts}")
+                except Exception as e:
+                    print(f"[WARNING] Failed to move archive before clear: {e}")
+                self.archive = RecordArchive(archive_dir, self.archive.compression)
+            # (Before startup loading finishes the column archive is not open yet)
+            column_dir = (self.column_archive.directory if self.column_archive is not None
+                          else current_app.config.get('COLUMN_ARCHIVE_DIR'))
+            if column_dir:
+                if self.column_archive is not None:
+                    self.column_archive.close()
+                try:
+                    if os.path.isdir(column_dir):
+                        os.replace(column_dir, f"{column_dir}_{ts}")
+                except Exception as e:
+                    print(f"[WARNING] Failed to move column archive before clear: {e}")
+                if self.column_archive is not None:
+                    self.column_archive = ColumnarArchive(column_dir)
 
+            self._clear_generation += 1
+            
             # Clear in-memory records
-            prev_count = len(self.records)
+            prev_count = len(self.store)
             print(f"[DEBUG] Clearing {prev_count} in-memory records")
-            self.records.clear()
+            self.store.clear()
+            self.stats.clear()
+            self.tag_states.clear()
+            self.pairing.clear()
+            # Client-supplied ids may be reused once their records are gone
+            record_fragments.clear()
+            if not self.ready:
+                self._load_cancelled = True
+                self._pending_records = []
             self.status.total_records = 0
             self.status.last_tag_read = None
+            self._publish_statistics()
+            change = self.changes.append('records_cleared', {'statistics': self.get_statistics()})
 
-            # After backing up, remove the on-disk data file and recreate a fresh empty file.
+            # Start a fresh empty data file in place of the rotated one
             try:
-                if data_file and os.path.exists(data_file):
-                    try:
-                        os.remove(data_file)
-                        print(f"[INFO] Removed old data file: {data_file}")
-                    except Exception as e:
-                        print(f"[WARNING] Failed to remove old data file: {e}")
-
-                # Persist an empty list to the authoritative file (recreates file)
-                from app.utils.helpers import save_json_file
                 saved = save_json_file(data_file, [])
                 if not saved:
                     print(f"[ERROR] Failed to write new empty {data_file}")
@@ -203,10 +698,20 @@ class TrackingService:
                 if ok:
                     self.last_cleared_at = datetime.now()
                 print(f"[DEBUG] clear_all_records() persistence result: {'success' if ok else 'failure'} (last_cleared_at={self.last_cleared_at})")
-                return ok
             except Exception as e:
                 print(f"[ERROR] Unexpected error during clear_all_records persistence: {e}")
-                return False
+                ok = False
+        
+        self._snapshot_dirty.set()
+        self._emit_change('records_cleared', change)
+        self._emit_statistics()
+        if rotated_path:
+            self.last_backup = backup_worker.submit(rotated_path)
+        return ok
+    
+    def get_backups(self) -> List[dict]:
+        """Backup jobs from clears, newest first, with compression progress"""
+        return backup_worker.jobs()
 
     def accept_inventory_sync(self, grace_seconds: int = 300) -> bool:
         """Return False if a recent clear was performed to avoid re-sync from frontend.
@@ -222,36 +727,115 @@ class TrackingService:
         except Exception:
             return True
     
-    def get_statistics(self) -> dict:
-        """Calculate tracking statistics"""
+    def get_statistics(self, since_version: Optional[int] = None) -> Optional[dict]:
+        """
+        Get tracking statistics (maintained incrementally, O(top-K) to build)
+        
+        Args:
+            since_version: Version the caller already has; if nothing changed
+                           since then, None is returned instead of a payload
+        """
+        stats = self._stats_payload
+        if since_version is not None and since_version == stats['version']:
+            return None
+        return dict(stats)
+    
+    @staticmethod
+    def _stats_delta(before: dict, after: dict) -> dict:
+        """
+        Difference between two statistics payloads, as broadcast with a change
+        
+        Counters are given as increments (omitted if unchanged), top_tags in
+        full only if it changed, and the new version.
+        """
+        delta = {key: after[key] - before[key] for key in STAT_COUNTERS if after[key] != before[key]}
+        if after['top_tags'] != before['top_tags']:
+            delta['top_tags'] = after['top_tags']
+        delta['version'] = after['version']
+        return delta
+    
+    def get_sync_state(self) -> dict:
+        """
+        The newest page of records (see get_records_page) and the statistics,
+        with the change sequence number they are current as of (a client
+        applies changes after it and pages older records in with the cursor)
+        """
         with self.lock:
-            total = len(self.records)
-            in_count = sum(1 for r in self.records if r['direction'] == 'IN')
-            out_count = sum(1 for r in self.records if r['direction'] == 'OUT')
-            
-            # Count unique tags
-            unique_tags = len(set(r['rfid_tag'] for r in self.records))
-            
-            # Get most active tags
-            tag_counts = {}
-            for record in self.records:
-                tag = record['rfid_tag']
-                tag_counts[tag] = tag_counts.get(tag, 0) + 1
-            
-            top_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+            seq = self.changes.seq
+            stats = dict(self._stats_payload)
+            page = self.get_records_page()
+        page.update(seq=seq, statistics=stats)
+        return page
+    
+    def get_changes_since(self, seq) -> dict:
+        """
+        What a client that has applied changes up to seq missed
         
+        Returns:
+            dict: {'seq', 'full': False, 'changes': [{'event', 'data'}, ...]}
+                  if the missed changes are still kept, else get_sync_state()
+                  with 'full': True
+        """
+        changes = self.changes.since(seq) if isinstance(seq, int) and seq >= 0 else None
+        if changes is None:
+            state = self.get_sync_state()
+            state['full'] = True
+            return state
         return {
-            'total_records': total,
-            'in_count': in_count,
-            'out_count': out_count,
-            'unique_tags': unique_tags,
-            'current_balance': in_count - out_count,
-            'top_tags': [{'tag': tag, 'count': count} for tag, count in top_tags]
+            'seq': changes[-1][1]['seq'] if changes else seq,
+            'full': False,
+            'changes': [{'event': event, 'data': data} for event, data in changes]
         }
     
+    def get_statistics_version(self) -> int:
+        """Current statistics version"""
+        return self._stats_payload['version']
+    
+    def _publish_statistics(self):
+        """Rebuild the statistics payload readers get (writers only, O(top-K))"""
+        stats = self.stats.to_dict()
+        # Balance is the number of tags whose latest movement was IN, so
+        # repeated reads of the same tag do not skew it
+        stats['current_balance'] = self.tag_states.count('inside')
+        self._stats_payload = stats
+    
+    def get_tag_state(self, tag_id: str) -> Optional[dict]:
+        """Current state of one tag, or None if it has never been seen"""
+        with self.lock:
+            state = self.tag_states.get(tag_id)
+            return state.to_dict() if state else None
+    
+    def get_tag_states(self, location: Optional[str] = None, after: Optional[str] = None,
+                       limit: int = 50) -> dict:
+        """
+        One page of current tag states, in tag order
+        
+        Args:
+            location: 'inside' / 'outside', or None for every known tag
+            after: Cursor from the previous page's next_cursor
+            limit: Page size (at least 1)
+        """
+        limit = max(1, limit)
+        with self.lock:
+            states = self.tag_states.page(location, after, limit)
+            return {
+                'states': [state.to_dict() for state in states],
+                'next_cursor': states[-1].rfid_tag if len(states) == limit else None,
+                'counts': self.tag_states.counts(),
+                'version': self.tag_states.version
+            }
+    
     def get_status(self) -> dict:
-        """Get system status"""
-        return self.status.to_dict()
+        """Get system status (with dispatcher delivery, WebSocket broadcast, JSON cache and cluster counters)"""
+        status = self.status.to_dict()
+        if cluster.role == 'web':
+            status['dispatcher'] = self._owner_status.get('dispatcher')
+        else:
+            status['dispatcher'] = dispatcher_outbox.stats()
+        status['broadcast'] = broadcaster.stats()
+        status['json_cache'] = cache_stats()
+        status['cluster'] = cluster.stats()
+        return status
     
     def update_status(self, **kwargs):
         """Update system status"""
@@ -262,36 +846,214 @@ class TrackingService:
         # Emit WebSocket event for status update
         self._emit_status_update()
     
+    def _open_column_archive(self):
+        """Open the column archive, backfilling it from history on first use"""
+        column_dir = current_app.config.get('COLUMN_ARCHIVE_DIR')
+        if not column_dir:
+            return
+        with self.lock:
+            self.column_archive = ColumnarArchive(column_dir)
+            history = self.archive.record_count() + len(self.store)
+            if self.column_archive.rows > 0 or history == 0:
+                return
+            generation = self._clear_generation
+            archive = self.archive
+        
+        # Build in a scratch directory and rename, so an interrupted backfill
+        # is simply redone on the next boot. The archived part is read without
+        # the lock; a clear meanwhile bumps the generation and the scratch
+        # directory is thrown away instead of replacing the cleared archive.
+        print(f"[INFO] Backfilling column archive with {history} records...")
+        scratch_dir = column_dir + '.backfill'
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        scratch = ColumnarArchive(scratch_dir)
+        scratch.append(
+            (timestamp_to_epoch_us(r['read_date']) or 0, r['rfid_tag'], r['direction'],
+             r.get('door_id') or current_app.config.get('DOOR_ID', ''))
+            for r in archive.iter_records()
+        )
+        with self.lock:
+            if self._clear_generation != generation:
+                scratch.close()
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+                print("[INFO] Column archive backfill discarded: records were cleared")
+                return
+            scratch.append(
+                (self.store.ts_at(pos), self.store.tag_at(pos), self.store.direction_at(pos), self.store.door_at(pos))
+                for pos in range(len(self.store))
+            )
+            scratch.close()
+            self.column_archive.close()
+            shutil.rmtree(column_dir, ignore_errors=True)
+            os.replace(scratch_dir, column_dir)
+            self.column_archive = ColumnarArchive(column_dir)
+        print(f"[INFO] Column archive ready ({self.column_archive.rows} rows)")
+    
+    def _append_columns(self, rows: List[tuple]):
+        """Append (ts_us, tag, direction, door_id) rows to the column archive"""
+        if self.column_archive is None:
+            return
+        try:
+            self.column_archive.append(rows)
+        except Exception as e:
+            print(f"[WARNING] Failed to append to column archive: {e}")
+    
+    def get_column_archive(self) -> Optional[ColumnarArchive]:
+        """Column archive for analytics (read-only use)"""
+        return self.column_archive
+    
+    def _apply_retention(self) -> int:
+        """
+        Roll records older than the retention window into the archive
+        
+        The cutoff is aligned to the start of a Calgary day so every day
+        partition is normally written once. The archive baseline is advanced
+        by the rolled records so statistics and tag states survive restarts;
+        it records the cutoff, so rows still in DATA_FILE after a crash
+        before the trimmed file is saved are not counted again on load.
+        
+        Returns:
+            int: Number of records moved out of memory
+        """
+        self._next_retention_check = time.time() + RETENTION_CHECK_INTERVAL
+        retention_days = current_app.config.get('RETENTION_DAYS', 0)
+        if retention_days <= 0 or self.archive is None or not self.ready:
+            return 0
+        
+        cutoff_day = (datetime.now(CALGARY_TZ) - timedelta(days=retention_days)).strftime('%Y-%m-%d')
+        cutoff_us = timestamp_to_epoch_us(cutoff_day)
+        
+        with self.lock:
+            if not len(self.store) or self.store.ts_at(0) >= cutoff_us:
+                return 0
+            
+            expired = self.store.records_before(cutoff_us)
+            try:
+                baseline = self.archive.load_baseline()
+                baseline_stats = TrackingStatistics()
+                baseline_stats.restore(baseline.get('stats'))
+                baseline_states = TagStateTable()
+                baseline_states.restore(baseline.get('tag_states'))
+                for record in expired:
+                    baseline_stats.add(record['rfid_tag'], record['direction'])
+                    baseline_states.update(record['rfid_tag'], record['direction'], record['read_date'],
+                                           timestamp_to_epoch_us(record['read_date']) or 0,
+                                           record.get('door_id', ''))
+                
+                self.archive.add(expired)
+                self.archive.save_baseline({
+                    'stats': baseline_stats.snapshot(),
+                    'tag_states': baseline_states.snapshot(),
+                    'cutoff_us': cutoff_us
+                })
+            except Exception as e:
+                # Keep the records in memory rather than lose them
+                print(f"[ERROR] Failed to archive expired records: {e}")
+                return 0
+            
+            self.store.remove_before(cutoff_us)
+            self.status.total_records = len(self.store)
+            self._save()
+            # Web workers drop the same records from their replicas
+            cluster.publish_expiry(cutoff_us)
+        
+        print(f"[INFO] Archived {len(expired)} records older than {cutoff_day} ({len(self.store)} kept in memory)")
+        return len(expired)
+    
     def _save(self):
         """Save records to file"""
         data_file = current_app.config['DATA_FILE']
-        print(f"[DEBUG] _save() writing {len(self.records)} records to {data_file}")
-        ok = save_json_file(data_file, self.records)
+        print(f"[DEBUG] _save() writing {len(self.store)} records to {data_file}")
+        ok = save_json_records(data_file, self.store.iter_records())
         if not ok:
             print(f"[WARNING] Failed to save tracking records to {data_file}")
         return ok
 
+    def write_inventory_snapshot(self) -> bool:
+        """
+        Write the current inventory (all tag states) if it changed since the last write
+        
+        Written to a temp file and renamed, so pollers never read a partial file.
+        
+        Returns:
+            bool: True if a file was written
+        """
+        if not self.snapshot_file or not self.ready:
+            return False
+        with self.lock:
+            version = self.tag_states.version
+            if version == self._snapshot_written_version and os.path.exists(self.snapshot_file):
+                return False
+            snapshot = {
+                'version': version,
+                'generated_at': datetime.now(CALGARY_TZ).isoformat(),
+                'counts': self.tag_states.counts(),
+                'states': self.tag_states.snapshot()
+            }
+        if not save_json_atomic(self.snapshot_file, snapshot):
+            print(f"[WARNING] Failed to write inventory snapshot to {self.snapshot_file}")
+            return False
+        self._snapshot_written_version = version
+        self._snapshot_etag = f'"{self._boot_id}-{version}"'
+        print(f"[DEBUG] Saved inventory snapshot v{version} ({len(snapshot['states'])} tags)")
+        return True
 
-        try:
-            exists_nonzero = os.path.exists(inv_path) and os.path.getsize(inv_path) > 0
-        except Exception:
-            exists_nonzero = False
-        print(f"[DEBUG] Saved inventory snapshot: {'ok' if save_ok and exists_nonzero else 'failed'} (path={inv_path}, size={os.path.getsize(inv_path) if exists_nonzero else 0})")
-        return save_ok and exists_nonzero
+    def write_pairing_state(self) -> bool:
+        """
+        Persist the pairing table if it changed since the last write
+        
+        Written by the snapshot thread, so a crash can lose the last few
+        seconds of "sent" marks and resend those pairs once after restart
+        (the dispatcher outbox is at least once anyway).
+        
+        Returns:
+            bool: True if a file was written
+        """
+        if not self.pairing_file or not self.ready:
+            return False
+        with self.lock:
+            version = self.pairing.version
+            if version == self._pairing_written_version:
+                return False
+            data = {'version': version, 'pairings': self.pairing.snapshot()}
+        if not save_json_atomic(self.pairing_file, data):
+            print(f"[WARNING] Failed to write pairing state to {self.pairing_file}")
+            return False
+        self._pairing_written_version = version
+        return True
+    
+    def get_inventory_snapshot(self) -> Optional[tuple]:
+        """(path, etag) of the last written inventory snapshot, or None before the first write"""
+        if self._snapshot_etag is None:
+            self.write_inventory_snapshot()
+        if self._snapshot_etag is None:
+            return None
+        return self.snapshot_file, self._snapshot_etag
 
-    def start_periodic_snapshot(self, interval_seconds: int = 5):
-        """Start a background thread that writes inventory snapshot every interval."""
+    def start_periodic_snapshot(self, interval_seconds: float = 5):
+        """
+        Start the background inventory snapshot writer
+        
+        The thread sleeps until a change marks the snapshot dirty, then waits
+        interval_seconds so a burst of reads is written once. An idle door
+        causes no writes.
+        """
         if self._periodic_thread and self._periodic_thread.is_alive():
             return
 
         def _worker():
             while not self._stop_event.is_set():
+                self._snapshot_dirty.wait()
+                if self._stop_event.is_set():
+                    break
+                # Coalesce the burst that woke us
+                self._stop_event.wait(interval_seconds)
+                self._snapshot_dirty.clear()
                 try:
                     self.write_inventory_snapshot()
-                except Exception:
-                    pass
-                # wait for the interval or until stopped
-                self._stop_event.wait(interval_seconds)
+                    self.write_pairing_state()
+                except Exception as e:
+                    print(f"[WARNING] Inventory snapshot writer error: {e}")
 
         self._stop_event.clear()
         t = threading.Thread(target=_worker, name='InventorySnapshotThread', daemon=True)
@@ -299,18 +1061,182 @@ class TrackingService:
         t.start()
 
     def stop_periodic_snapshot(self):
-        """Stop the background snapshot thread"""
+        """Stop the background snapshot thread (after a final write of pending changes)"""
         if self._periodic_thread and self._periodic_thread.is_alive():
             self._stop_event.set()
+            self._snapshot_dirty.set()
             self._periodic_thread.join(timeout=2)
+            self.write_inventory_snapshot()
+            self.write_pairing_state()
+    
+    def replica_state(self, subscribe) -> tuple:
+        """
+        State a web worker starts its replica from (owner; waits for the history)
+        
+        Args:
+            subscribe: subscribe(meta, records), called while the lock is held,
+                       so the worker is sent exactly the changes numbered
+                       after meta's seq
+        
+        Returns:
+            tuple: (meta dict, RecordSnapshot of the records)
+        """
+        self.wait_until_ready()
+        status = self.get_status()
+        with self.lock:
+            meta = {
+                'seq': self.changes.seq,
+                'statistics': dict(self._stats_payload),
+                'tag_states': self.tag_states.snapshot(),
+                'tag_state_version': self.tag_states.version,
+                'status': status
+            }
+            records = self.store.snapshot()
+            subscribe(meta, records)
+        return meta, records
+    
+    def initialize_replica(self):
+        """Prepare to follow the owner's state (web worker; the owner sends it on connect)"""
+        app = current_app._get_current_object()
+        with self.lock:
+            self.ready = False
+            self.status.ready = False
+            self._ready_event.clear()
+            self.changes.resize(app.config.get('CHANGE_FEED_SIZE', 1000))
+            record_fragments.resize(app.config.get('RECORD_JSON_CACHE_SIZE', 20000))
+    
+    def load_replica(self, meta: dict):
+        """Start the replica over from the owner's state (records follow in chunks)"""
+        with self.lock:
+            self.ready = False
+            self.status.ready = False
+            self._ready_event.clear()
+            self.store.clear()
+            record_fragments.clear()
+            self.tag_states.restore(meta['tag_states'])
+            self.tag_states.version = meta['tag_state_version']
+            self._stats_payload = meta['statistics']
+            self.changes.reset(meta['seq'])
+            self._adopt_owner_status(meta['status'])
+    
+    def load_replica_records(self, records: List[dict]):
+        """Add a chunk of the owner's records (already counted in its statistics and tag states)"""
+        with self.lock:
+            self.store.extend(records)
+            self.status.total_records = len(self.store)
+    
+    def finish_replica(self, records_version: int):
+        """The owner's records are all loaded: number versions as it does and go ready"""
+        with self.lock:
+            self.store.set_version(records_version)
+            self.status.total_records = len(self.store)
+            self.status.last_tag_read = self.store.last()
+            self.ready = True
+            self.status.ready = True
+            self._ready_event.set()
+        print(f"[INFO] Replica loaded: {len(self.store)} records as of change {self.changes.seq}")
+    
+    def apply_change(self, event: str, change: dict, weight: int):
+        """
+        Apply a numbered change from the owner to the replica and keep it for resyncs
+        
+        Each change is applied with the same store operation as on the owner,
+        so record versions stay equal; statistics follow its stats_delta.
+        """
+        with self.lock:
+            if event == 'record_added':
+                self._apply_replica_records([change['record']])
+                self._apply_stats_delta(change['stats_delta'])
+            elif event == 'records_added':
+                self._apply_replica_records(change['records'])
+                self._apply_stats_delta(change['stats_delta'])
+                self.tag_states.version = change['tag_state_version']
+            elif event == 'records_cleared':
+                self.store.clear()
+                self.tag_states.clear()
+                record_fragments.clear()
+                self._stats_payload = change['statistics']
+                self.status.total_records = 0
+                self.status.last_tag_read = None
+            self.changes.add(event, change, weight)
+        if event == 'record_added':
+            record_fragments.add(change['record'])
+        elif event == 'records_added':
+            for record_dict in change['records']:
+                record_fragments.add(record_dict)
+    
+    def _apply_replica_records(self, records: List[dict]):
+        """Add the owner's new records to the store and tag states (lock held)"""
+        positions = self.store.extend(records)
+        for record_dict, pos in zip(records, positions):
+            self.tag_states.update(record_dict['rfid_tag'], record_dict['direction'],
+                                   record_dict['read_date'], self.store.ts_at(pos), record_dict['door_id'])
+        self.status.last_tag_read = self.store.last()
+        self.status.total_records = len(self.store)
+    
+    def _apply_stats_delta(self, delta: dict):
+        """Move the statistics payload on by a change's stats_delta (lock held)"""
+        stats = dict(self._stats_payload)
+        for key in STAT_COUNTERS:
+            if key in delta:
+                stats[key] += delta[key]
+        if 'top_tags' in delta:
+            stats['top_tags'] = delta['top_tags']
+        stats['version'] = delta['version']
+        self._stats_payload = stats
+    
+    def apply_broadcast(self, event: str, data: dict):
+        """Take what the replica needs from a broadcast the owner relayed (web worker)"""
+        with self.lock:
+            if event == 'statistics_update' and data['version'] >= self._stats_payload['version']:
+                self._stats_payload = data
+            elif event == 'tag_state_changed':
+                self.tag_states.version = max(self.tag_states.version, data['version'])
+            elif event == 'status_update':
+                self._adopt_owner_status(data)
+    
+    def _adopt_owner_status(self, status: dict):
+        """Hardware state and dispatcher counters from the owner's status (lock held)"""
+        self._owner_status = status
+        self.status.rfid_reader = status.get('rfid_reader', self.status.rfid_reader)
+        self.status.sensor_inside = status.get('sensor_inside', self.status.sensor_inside)
+        self.status.sensor_outside = status.get('sensor_outside', self.status.sensor_outside)
+    
+    def expire_before(self, cutoff_us: int):
+        """Drop records the owner moved to its archive (web worker)"""
+        with self.lock:
+            self.store.remove_before(cutoff_us)
+            self.status.total_records = len(self.store)
+    
+    def _emit_change(self, event: str, change: dict):
+        """Emit a numbered change (from self.changes) as a WebSocket event"""
+        try:
+            from app import socketio
+            if socketio:
+                from app.routes.websocket_events import broadcast_change
+                broadcast_change(socketio, event, change)
+        except Exception as e:
+            # Silently fail if WebSocket is not available
+            pass
+    
+    def _emit_statistics(self):
+        """Emit the latest statistics to clients following counts only"""
+        try:
+            from app import socketio
+            if socketio:
+                from app.routes.websocket_events import broadcast_statistics
+                broadcast_statistics(socketio, self.get_statistics())
+        except Exception as e:
+            # Silently fail if WebSocket is not available
+            pass
     
-    def _emit_record_added(self, record_dict: dict):
-        """Emit WebSocket event for new record"""
+    def _emit_tag_state_changed(self, state: dict, version: int):
+        """Emit WebSocket delta for a tag's new state"""
         try:
             from app import socketio
             if socketio:
-                from app.routes.websocket_events import broadcast_record_added
-                broadcast_record_added(socketio, record_dict)
+                from app.routes.websocket_events import broadcast_tag_state_changed
+                broadcast_tag_state_changed(socketio, state, version)
         except Exception as e:
             # Silently fail if WebSocket is not available
             pass
@@ -0,0 +1,115 @@
+"""
+Incrementally maintained tracking statistics
+"""
+
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+
+class TopK:
+    """
+    Most frequent tags, updated per increment.
+
+    Members are kept in a sorted list of (-count, first_seen, tag) keys, so
+    an update is a bisect plus a move within K entries. Ties rank by first
+    appearance, matching a stable sort of the counts by count descending.
+    Counts only grow between resets, so a non-member can only enter by
+    overtaking the current last member.
+    """
+
+    def __init__(self, k: int = 10):
+        self.k = k
+        self._ranked: List[Tuple[int, int, str]] = []
+        self._keys: Dict[str, Tuple[int, int, str]] = {}
+
+    def update(self, tag: str, count: int, first_seen: int):
+        """Record that a tag's count has risen to count"""
+        key = (-count, first_seen, tag)
+        old_key = self._keys.get(tag)
+        if old_key is not None:
+            del self._ranked[bisect_left(self._ranked, old_key)]
+        elif len(self._ranked) >= self.k:
+            if key >= self._ranked[-1]:
+                return
+            evicted = self._ranked.pop()
+            del self._keys[evicted[2]]
+        insort(self._ranked, key)
+        self._keys[tag] = key
+
+    def clear(self):
+        self._ranked = []
+        self._keys = {}
+
+    def items(self) -> List[Tuple[str, int]]:
+        """(tag, count) pairs, most frequent first"""
+        return [(tag, -neg_count) for neg_count, _, tag in self._ranked]
+
+
+class TrackingStatistics:
+    """Counters, unique tags and top tags updated on every added record"""
+
+    def __init__(self, top_k: int = 10):
+        self.total = 0
+        self.in_count = 0
+        self.out_count = 0
+        # tag -> [count, first_seen]; the keys are the unique tag set
+        self.tag_counts: Dict[str, List[int]] = {}
+        self.top_tags = TopK(top_k)
+        # Bumped on every change so callers can skip unchanged results
+        self.version = 0
+
+    def add(self, tag: str, direction: str):
+        """Account for one new record"""
+        self.total += 1
+        if direction == 'IN':
+            self.in_count += 1
+        elif direction == 'OUT':
+            self.out_count += 1
+
+        entry = self.tag_counts.get(tag)
+        if entry is None:
+            entry = self.tag_counts[tag] = [0, len(self.tag_counts)]
+        entry[0] += 1
+        self.top_tags.update(tag, entry[0], entry[1])
+        self.version += 1
+
+    def clear(self):
+        """Reset all counters (version keeps increasing)"""
+        self.total = 0
+        self.in_count = 0
+        self.out_count = 0
+        self.tag_counts = {}
+        self.top_tags.clear()
+        self.version += 1
+
+    def snapshot(self) -> dict:
+        """Serialisable counters (tag counts in first-seen order)"""
+        return {
+            'total': self.total,
+            'in_count': self.in_count,
+            'out_count': self.out_count,
+            'tag_counts': {tag: entry[0] for tag, entry in self.tag_counts.items()}
+        }
+
+    def restore(self, snapshot: Optional[dict]):
+        """Replace the counters with a snapshot() result"""
+        self.clear()
+        if not snapshot:
+            return
+        self.total = snapshot.get('total', 0)
+        self.in_count = snapshot.get('in_count', 0)
+        self.out_count = snapshot.get('out_count', 0)
+        for tag, count in snapshot.get('tag_counts', {}).items():
+            entry = self.tag_counts[tag] = [count, len(self.tag_counts)]
+            self.top_tags.update(tag, count, entry[1])
+
+    def to_dict(self) -> dict:
+        """Statistics payload, O(K)"""
+        return {
+            'total_records': self.total,
+            'in_count': self.in_count,
+            'out_count': self.out_count,
+            'unique_tags': len(self.tag_counts),
+            'top_tags': [{'tag': tag, 'count': count} for tag, count in self.top_tags.items()],
+            'version': self.version
+        }
@@ -1,11 +1,41 @@
 import json
 import os
+import re
+import threading
 import uuid
+import pytz
 import requests
-from typing import List
-from datetime import datetime
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from typing import Iterable, Iterator, List, Optional
+from datetime import datetime, timedelta
 import traceback
 
+# Records are timestamped in Calgary local time (see TrackingRecord.create)
+CALGARY_TZ = pytz.timezone('America/Edmonton')
+_EPOCH = datetime(1970, 1, 1)
+
+# Accepts the record format (YYYY-MM-DD-hh-MM-SS-ffff[-]AM/PM), the 24-hour
+# dashed filter format (any prefix of YYYY-MM-DD-HH-MM-SS-fff) and ISO 8601.
+_TIMESTAMP_PATTERN = re.compile(
+    r'^(\d{4})-(\d{1,2})-(\d{1,2})'
+    r'(?:[-T ](\d{1,2})(?:[-:](\d{1,2})(?:[-:](\d{1,2})(?:[-.](\d+))?)?)?)?'
+    r'-?\s*(AM|PM)?$',
+    re.IGNORECASE
+)
+# Record read_date (12-hour clock; the dash before AM/PM only in legacy records)
+_CALGARY_TIMESTAMP_PATTERN = re.compile(r'(\d{4})-(\d{2})-(\d{2})-(\d{2})-(\d{2})-(\d{2})-(\d+)-?(AM|PM)')
+# Whitespace and commas between JSON array elements
+_JSON_SEPARATORS = re.compile(r'[\s,]*')
+_JSON_WHITESPACE = re.compile(r'\s*')
+# UTC offset cache keyed by local (year, month, day, hour)
+_utc_offset_cache = {}
+# Epoch microseconds of the hour a record read_date falls in, keyed by its
+# 'YYYY-MM-DD-hh' prefix and AM/PM suffix (fast path for the record format)
+_record_hour_cache = {}
+# Local read_date hour prefix cache keyed by UTC epoch hour
+_read_date_hour_cache = {}
+
 def ensure_directory(filepath: str):
     """Ensure directory exists for file"""
     directory = os.path.dirname(filepath)
@@ -28,6 +58,55 @@ def load_json_file(filepath: str, default=None):
     return default
 
 
+def iter_json_array(filepath: str, chunk_size: int = 1024 * 1024) -> Iterator:
+    """
+    Yield the elements of a JSON array file one at a time
+
+    The file is decoded in chunks, so memory stays bounded by the chunk
+    size and the largest element instead of the whole document. A missing
+    file yields nothing; a malformed file yields the elements before the
+    error and raises ValueError.
+    """
+    if not os.path.exists(filepath):
+        return
+    decoder = json.JSONDecoder()
+    with open(filepath, 'r') as f:
+        buffer = f.read(chunk_size)
+        eof = not buffer
+        pos = _JSON_SEPARATORS.match(buffer).end()
+        if pos >= len(buffer) and eof:
+            return
+        if buffer[pos:pos + 1] != '[':
+            raise ValueError(f"{filepath} is not a JSON array")
+        pos += 1
+        while True:
+            pos = _JSON_SEPARATORS.match(buffer, pos).end()
+            if pos >= len(buffer) or buffer[pos] != ']':
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    delimiter = _JSON_WHITESPACE.match(buffer, end).end()
+                    complete = buffer[delimiter:delimiter + 1] in (',', ']')
+                except json.JSONDecodeError:
+                    complete = False
+                # A parse failure or a value not yet followed by ',' or ']' may
+                # just be cut off by the chunk (e.g. "2" of "2.5"): read more and retry
+                if not complete and not eof:
+                    more = f.read(chunk_size)
+                    eof = not more
+                    buffer = buffer[pos:] + more
+                    pos = 0
+                    continue
+                if not complete:
+                    raise ValueError(f"{filepath}: malformed JSON near offset {pos}")
+                yield item
+                pos = end
+                if pos > chunk_size:
+                    buffer = buffer[pos:]
+                    pos = 0
+            else:
+                return
+
+
 def save_json_file(filepath: str, data):
     """Save data to JSON file"""
     try:
@@ -66,11 +145,61 @@ def save_json_file(filepath: str, data):
         return False
 
 
+def save_json_atomic(filepath: str, data) -> bool:
+    """Save data to JSON via a temp file and rename, so readers never see a partial file"""
+    tmp_path = filepath + '.tmp'
+    try:
+        ensure_directory(filepath)
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, filepath)
+        return True
+    except Exception as e:
+        print(f"Error saving {filepath}: {e}")
+        return False
+
+
+def save_json_records(filepath: str, records: Iterable[dict]) -> bool:
+    """
+    Save records as a JSON array, one record per line
+
+    Records are serialised one at a time, so a large history is never
+    materialised as a list of dicts just to be written out.
+    """
+    tmp_path = filepath + '.tmp'
+    try:
+        ensure_directory(filepath)
+        with open(tmp_path, 'w') as f:
+            f.write('[')
+            separator = '\n'
+            for record in records:
+                f.write(separator)
+                f.write(json.dumps(record))
+                separator = ',\n'
+            f.write('\n]\n')
+        os.replace(tmp_path, filepath)
+        return True
+    except Exception as e:
+        print(f"Error saving {filepath}: {e}")
+        traceback.print_exc()
+        return False
+
+
 def validate_direction(direction: str) -> bool:
     """Validate direction value"""
     return direction.upper() in ['IN', 'OUT']
 
 
+# Longest client-supplied record_id accepted
+MAX_RECORD_ID_LENGTH = 64
+
+
+def validate_record_id(record_id) -> bool:
+    """Validate a client-supplied record_id (non-empty string, printable, at most 64 chars)"""
+    return (isinstance(record_id, str) and 0 < len(record_id) <= MAX_RECORD_ID_LENGTH
+            and record_id.isprintable())
+
+
 def parse_date_filter(date_str: str) -> str:
     """Parse and validate date string"""
     try:
@@ -81,8 +210,106 @@ def parse_date_filter(date_str: str) -> str:
         return None
 
 
+def timestamp_to_epoch_us(value: str, end: bool = False) -> Optional[int]:
+    """
+    Convert a Calgary local timestamp string to epoch microseconds
+
+    Args:
+        value: Record read_date, dashed filter date or ISO 8601 string
+        end: Round a truncated value (e.g. a bare date) up to the last
+             microsecond it covers, for inclusive end-of-range filters
+
+    Returns:
+        int: Microseconds since the Unix epoch, or None if unparseable
+    """
+    if not value:
+        return None
+    # Fast path: exact record format YYYY-MM-DD-hh-MM-SS-ffffAM
+    if (len(value) == 26 and not end and value[13] == '-' and value[16] == '-'
+            and value[19] == '-' and value[24:] in ('AM', 'PM')):
+        key = (value[:13], value[24:])
+        hour_us = _record_hour_cache.get(key)
+        if hour_us is None:
+            hour_us = timestamp_to_epoch_us(value[:13] + value[24:])
+            if hour_us is not None:
+                _record_hour_cache[key] = hour_us
+        rest = value[14:16] + value[17:19] + value[20:24]
+        if hour_us is not None and rest.isdigit():
+            minute, second, fraction = int(value[14:16]), int(value[17:19]), int(value[20:24])
+            if minute < 60 and second < 60:
+                return hour_us + (minute * 60 + second) * 1000000 + fraction * 100
+    match = _TIMESTAMP_PATTERN.match(value.strip())
+    if not match:
+        return None
+
+    year, month, day, hour, minute, second, fraction, period = match.groups()
+    try:
+        naive = datetime(int(year), int(month), int(day))
+        step = timedelta(days=1)
+        if hour is not None:
+            hour = int(hour)
+            if period:
+                period = period.upper()
+                if period == 'PM' and hour != 12:
+                    hour += 12
+                elif period == 'AM' and hour == 12:
+                    hour = 0
+            naive = naive.replace(hour=hour)
+            step = timedelta(hours=1)
+        if minute is not None:
+            naive = naive.replace(minute=int(minute))
+            step = timedelta(minutes=1)
+        if second is not None:
+            naive = naive.replace(second=int(second))
+            step = timedelta(seconds=1)
+        if fraction is not None:
+            # Fraction digits are a decimal fraction of a second
+            naive = naive.replace(microsecond=int(fraction[:6].ljust(6, '0')))
+            step = timedelta(microseconds=10 ** max(0, 6 - len(fraction)))
+    except ValueError:
+        return None
+
+    if end:
+        naive = naive + step - timedelta(microseconds=1)
+
+    key = (naive.year, naive.month, naive.day, naive.hour)
+    offset = _utc_offset_cache.get(key)
+    if offset is None:
+        # Ambiguous (fall-back) and skipped (spring-forward) hours resolve to standard time
+        offset = CALGARY_TZ.utcoffset(naive.replace(minute=0, second=0, microsecond=0), is_dst=False)
+        _utc_offset_cache[key] = offset
+
+    delta = naive - offset - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def epoch_us_to_read_date(ts_us: int) -> str:
+    """
+    Format epoch microseconds as a record read_date (see TrackingRecord.create)
+
+    The inverse of timestamp_to_epoch_us for record timestamps, so stores can
+    keep the integer and rebuild the string on demand.
+    """
+    seconds, micros = divmod(ts_us, 1000000)
+    hour, second_of_hour = divmod(seconds, 3600)
+    cached = _read_date_hour_cache.get(hour)
+    if cached is None:
+        local = datetime.fromtimestamp(hour * 3600, CALGARY_TZ)
+        # Calgary offsets are whole hours, so minutes and seconds carry over from UTC
+        cached = (local.strftime('%Y-%m-%d-%I-'), local.strftime('%p'), local.minute == 0)
+        _read_date_hour_cache[hour] = cached
+    prefix, period, whole_hour = cached
+    if not whole_hour:
+        local = datetime.fromtimestamp(seconds, CALGARY_TZ)
+        prefix, period = local.strftime('%Y-%m-%d-%I-'), local.strftime('%p')
+        second_of_hour = local.minute * 60 + local.second
+    minute, second = divmod(second_of_hour, 60)
+    return f"{prefix}{minute:02d}-{second:02d}-{micros // 100:04d}{period}"
+
+
+@lru_cache(maxsize=None)
 def get_mac_address() -> str:
-    """Get the MAC address of the system in standard format"""
+    """Get the MAC address of the system in standard format (looked up once per process)"""
     try:
         # Get the MAC address as a 48-bit integer
         mac_int = uuid.getnode()
@@ -100,16 +327,15 @@ def convert_to_iso_format(calgary_timestamp: str) -> str:
     Convert Calgary timezone format to ISO 8601 format for dispatcher API
     
     Args:
-        calgary_timestamp: Format like "2025-12-06-03-45-23-456-PM"
+        calgary_timestamp: Record format like "2025-12-06-03-45-23-4560PM"
+                           (legacy "2025-12-06-03-45-23-456-PM" also accepted)
         
     Returns:
         ISO 8601 format like "2025-12-04T11:37:18"
     """
     try:
-        # Parse the Calgary format: YYYY-MM-DD-HH-MM-SS-mmm-AM/PM
-        import re
-        pattern = r'(\d{4})-(\d{2})-(\d{2})-(\d{2})-(\d{2})-(\d{2})-(\d+)-(AM|PM)'
-        match = re.match(pattern, calgary_timestamp)
+        # Parse the Calgary format: YYYY-MM-DD-hh-MM-SS-ffff[-]AM/PM
+        match = _CALGARY_TIMESTAMP_PATTERN.match(calgary_timestamp)
         
         if not match:
             # If format doesn't match, return current time in ISO format
@@ -133,53 +359,83 @@ def convert_to_iso_format(calgary_timestamp: str) -> str:
         return datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
 
 
-def send_to_dispatcher(dispatcher_url: str, tag_id: str, mac_address: str, 
-                       direction: str, read_date: str, timeout: int = 5) -> bool:
+_dispatcher_session = None
+_dispatcher_session_lock = threading.Lock()
+
+
+def get_dispatcher_session(pool_size: int = 4) -> requests.Session:
     """
-    Send tracking data to the dispatcher API endpoint
+    Shared keep-alive session for dispatcher requests
+    
+    Connections (and their TCP/TLS setup) are reused across requests instead
+    of being opened per movement. pool_size only applies on first use.
+    """
+    global _dispatcher_session
+    with _dispatcher_session_lock:
+        if _dispatcher_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['Content-Type'] = 'application/json'
+            _dispatcher_session = session
+        return _dispatcher_session
+
+
+def post_to_dispatcher(dispatcher_url: str, payload, timeout: float = 5) -> Optional[int]:
+    """
+    POST a movement payload (or a batch body) to the dispatcher API endpoint
     
     Args:
-        dispatcher_url: Base URL of the dispatcher API
-        tag_id: RFID tag ID
-        mac_address: System MAC address
-        direction: Direction of movement (IN/OUT)
-        read_date: Timestamp of the read
+        dispatcher_url: Endpoint URL
+        payload: {"tagId", "macAddress", "direction", "readDate"}, or
+                 {"events": [...]} for the batch endpoint
         timeout: Request timeout in seconds
         
     Returns:
-        bool: True if successful, False otherwise
+        int: HTTP status code, or None if no response was received
     """
     try:
-        # Prepare the payload
-        payload = {
-            "tagId": tag_id,
-            "macAddress": mac_address,
-            "direction": direction,
-            "readDate": read_date
-        }
-        
-        # Make the POST request
-        response = requests.post(
-            dispatcher_url,
-            json=payload,
-            timeout=timeout,
-            headers={'Content-Type': 'application/json'}
-        )
+        response = get_dispatcher_session().post(dispatcher_url, json=payload, timeout=timeout)
         
-        # Check if request was successful
         if response.status_code in [200, 201, 202]:
-            print(f"✓ Successfully sent to dispatcher: {tag_id} - {direction}")
-            return True
+            if 'events' in payload:
+                print(f"✓ Successfully sent {len(payload['events'])} movements to dispatcher")
+            else:
+                print(f"✓ Successfully sent to dispatcher: {payload.get('tagId')} - {payload.get('direction')}")
         else:
             print(f"⚠ Dispatcher returned status {response.status_code}: {response.text}")
-            return False
+        return response.status_code
             
     except requests.exceptions.Timeout:
         print(f"⚠ Dispatcher request timeout after {timeout}s")
-        return False
     except requests.exceptions.ConnectionError:
         print(f"⚠ Failed to connect to dispatcher at {dispatcher_url}")
-        return False
     except Exception as e:
         print(f"⚠ Error sending to dispatcher: {e}")
-        return False
\ No newline at end of file
+    return None
+
+
+def send_to_dispatcher(dispatcher_url: str, tag_id: str, mac_address: str, 
+                       direction: str, read_date: str, timeout: int = 5) -> bool:
+    """
+    Send tracking data to the dispatcher API endpoint
+    
+    Args:
+        dispatcher_url: Base URL of the dispatcher API
+        tag_id: RFID tag ID
+        mac_address: System MAC address
+        direction: Direction of movement (IN/OUT)
+        read_date: Timestamp of the read
+        timeout: Request timeout in seconds
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    payload = {
+        "tagId": tag_id,
+        "macAddress": mac_address,
+        "direction": direction,
+        "readDate": read_date
+    }
+    return post_to_dispatcher(dispatcher_url, payload, timeout) in [200, 201, 202]
\ No newline at end of file
@@ -32,11 +32,94 @@ class Config:
     SENSOR_RANGE_MAX = int(os.getenv('SENSOR_RANGE_MAX', '10'))
     HUMAN_DETECTION_TIMEOUT = int(os.getenv('HUMAN_DETECTION_TIMEOUT', '5'))
     
+    # Identifier of this door unit, stamped on every record it creates
+    DOOR_ID = os.getenv('DOOR_ID', 'main')
+    
     # Data Storage
     DATA_FILE = os.getenv('DATA_FILE', 'data/tag_tracking.json')
     
+    # Retention: days of records kept in memory / DATA_FILE (0 = keep everything).
+    # Older records are rolled into per-day compressed partitions in ARCHIVE_DIR.
+    RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', '30'))
+    ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'data/archive')
+    ARCHIVE_COMPRESSION = os.getenv('ARCHIVE_COMPRESSION', 'gzip')  # 'gzip' or 'lzma'
+    
+    # Fixed-width column files of the full history, memory-mapped by /api/analytics
+    COLUMN_ARCHIVE_DIR = os.getenv('COLUMN_ARCHIVE_DIR', 'data/columns')
+    
+    # Largest batch accepted by POST /api/records/bulk and add_manual_records
+    BULK_MAX_RECORDS = int(os.getenv('BULK_MAX_RECORDS', '1000'))
+
+    # Seconds a record_id is remembered; a record resubmitted with the same id
+    # within the window is ignored (0 = no deduplication)
+    DEDUP_WINDOW_SECONDS = float(os.getenv('DEDUP_WINDOW_SECONDS', '3600'))
+
+    # Records' worth of recent WebSocket changes kept so a client that missed
+    # some can catch up with just those (further behind: full resync)
+    CHANGE_FEED_SIZE = int(os.getenv('CHANGE_FEED_SIZE', '1000'))
+    # Records per WebSocket page (on connect and request_records), and the
+    # largest page a client may ask for
+    RECORDS_PAGE_SIZE = int(os.getenv('RECORDS_PAGE_SIZE', '100'))
+    RECORDS_PAGE_MAX = int(os.getenv('RECORDS_PAGE_MAX', '1000'))
+    # Seconds WebSocket broadcasts are collected for before going out as one
+    # batched frame per client; superseded status/sensor updates are merged
+    # (0 = send every broadcast at once)
+    BROADCAST_WINDOW = float(os.getenv('BROADCAST_WINDOW', '0.05'))
+    # Topics a WebSocket client is subscribed to when it connects without a
+    # `topics` query parameter (see the WebSocket Updates section of the README)
+    WS_DEFAULT_TOPICS = os.getenv('WS_DEFAULT_TOPICS', 'records,status,sensor-live')
+    # Records whose encoded JSON is kept for record lists (REST and WebSocket
+    # pages are joined from these instead of re-encoded; ~150 bytes each)
+    RECORD_JSON_CACHE_SIZE = int(os.getenv('RECORD_JSON_CACHE_SIZE', '20000'))
+    # Negotiate permessage-deflate with WebSocket clients that offer it
+    # (browsers do); false sends every frame uncompressed
+    WS_COMPRESSION = os.getenv('WS_COMPRESSION', 'True') == 'True'
+    # A WebSocket client with WS_CLIENT_QUEUE_MAX frames waiting to be sent
+    # gets no more broadcasts until it catches up (then resyncs), and is
+    # disconnected if it has not after WS_CLIENT_LAG_TIMEOUT seconds
+    WS_CLIENT_QUEUE_MAX = int(os.getenv('WS_CLIENT_QUEUE_MAX', '100'))
+    WS_CLIENT_LAG_TIMEOUT = float(os.getenv('WS_CLIENT_LAG_TIMEOUT', '30'))
+
+    # Web worker processes serving REST and Socket.IO on the shared port
+    # (0 = everything in one process). With N > 0 the started process owns
+    # the hardware and the store, and the workers keep replicas of it over
+    # CLUSTER_SOCKET (Linux only)
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', '0'))
+    CLUSTER_SOCKET = os.getenv('CLUSTER_SOCKET', 'data/cluster.sock')
+    # Set by the owner on the workers it starts
+    PROCESS_ROLE = os.getenv('PROCESS_ROLE', 'owner' if WEB_WORKERS > 0 else 'single')
+    WORKER_ID = int(os.getenv('WORKER_ID', '0'))
+
+    # Current inventory (tag states) written after changes, served with ETags
+    # by /api/inventory/snapshot. Bursts within the interval are coalesced.
+    INVENTORY_SNAPSHOT_FILE = os.getenv('INVENTORY_SNAPSHOT_FILE', 'data/inventory_snapshot.json')
+    INVENTORY_SNAPSHOT_INTERVAL = float(os.getenv('INVENTORY_SNAPSHOT_INTERVAL', '5'))
+    
+    # Per-tag IN/OUT pairing (latest pair, last pair sent), saved with the
+    # inventory snapshot so restarts neither resend nor skip pairs
+    PAIRING_STATE_FILE = os.getenv('PAIRING_STATE_FILE', 'data/pairing_state.json')
+    
     # Dispatcher Configuration
     DISPATCHER_URL = os.getenv('DISPATCHER_URL', 'http://138.68.255.116:8080')
+    # Movements are written to this outbox before sending and retried until
+    # delivered, with exponential backoff between DISPATCHER_RETRY_BASE and
+    # DISPATCHER_RETRY_MAX seconds; at most DISPATCHER_CONCURRENCY requests in flight
+    DISPATCHER_OUTBOX_FILE = os.getenv('DISPATCHER_OUTBOX_FILE', 'data/dispatcher_outbox.jsonl')
+    DISPATCHER_CONCURRENCY = int(os.getenv('DISPATCHER_CONCURRENCY', '2'))
+    DISPATCHER_TIMEOUT = float(os.getenv('DISPATCHER_TIMEOUT', '5'))
+    DISPATCHER_RETRY_BASE = float(os.getenv('DISPATCHER_RETRY_BASE', '1'))
+    DISPATCHER_RETRY_MAX = float(os.getenv('DISPATCHER_RETRY_MAX', '300'))
+    # Endpoint taking {"events": [...]} if the dispatcher supports batches
+    # (empty = single posts). Movements within the window go out together.
+    DISPATCHER_BATCH_URL = os.getenv('DISPATCHER_BATCH_URL', '')
+    DISPATCHER_BATCH_WINDOW = float(os.getenv('DISPATCHER_BATCH_WINDOW', '0.2'))
+    DISPATCHER_BATCH_MAX = int(os.getenv('DISPATCHER_BATCH_MAX', '50'))
+    # Circuit breaker: after DISPATCHER_BREAKER_THRESHOLD consecutive failures
+    # movements are held locally and one probe is sent after
+    # DISPATCHER_BREAKER_RESET seconds (doubling up to DISPATCHER_BREAKER_RESET_MAX)
+    DISPATCHER_BREAKER_THRESHOLD = int(os.getenv('DISPATCHER_BREAKER_THRESHOLD', '5'))
+    DISPATCHER_BREAKER_RESET = float(os.getenv('DISPATCHER_BREAKER_RESET', '5'))
+    DISPATCHER_BREAKER_RESET_MAX = float(os.getenv('DISPATCHER_BREAKER_RESET_MAX', '300'))
 
 
 class DevelopmentConfig(Config):
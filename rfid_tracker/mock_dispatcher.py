@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the dispatcher API, with a throughput benchmark
+
+Serve (point DISPATCHER_URL / DISPATCHER_BATCH_URL at it):
+    python mock_dispatcher.py --port 8090 --latency 0.05 --connect-latency 0.15
+    DISPATCHER_URL=http://localhost:8090/events
+    DISPATCHER_BATCH_URL=http://localhost:8090/events/batch
+
+Benchmark per-request connections vs. the pooled session vs. batches:
+    python mock_dispatcher.py --bench 200 --latency 0.05 --connect-latency 0.15
+
+--latency delays every response (uplink round trip); --connect-latency is
+paid once per new connection (TCP/TLS setup), which keep-alive avoids.
+"""
+
+import argparse
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+class DispatcherHandler(BaseHTTPRequestHandler):
+    """Accepts POST /events (one movement) and POST /events/batch ({"events": [...]})"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real dispatcher
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; don't let Nagle hold the body back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.stats['connections'] += 1
+        time.sleep(self.server.connect_latency)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self._reply(400, {'error': 'invalid JSON'})
+
+        if self.path.rstrip('/').endswith('/batch'):
+            events = payload.get('events') if isinstance(payload, dict) else None
+            if not isinstance(events, list):
+                return self._reply(400, {'error': 'expected {"events": [...]}'})
+        else:
+            events = [payload]
+        with self.server.lock:
+            self.server.stats['requests'] += 1
+            self.server.stats['events'] += len(events)
+        self._reply(200, {'accepted': len(events)})
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(port, latency=0.0, connect_latency=0.0, verbose=False):
+    server = ThreadingHTTPServer(('127.0.0.1', port), DispatcherHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.connect_latency = connect_latency
+    server.verbose = verbose
+    server.lock = threading.Lock()
+    server.stats = {'connections': 0, 'requests': 0, 'events': 0}
+    return server
+
+
+def event(i):
+    return {'tagId': f'TAG-{i % 25:03d}', 'macAddress': '00:00:00:00:00:00',
+            'direction': 'IN' if i % 2 else 'OUT', 'readDate': '2025-12-06T15:45:23'}
+
+
+def bench(count, latency, connect_latency, concurrency, batch_max):
+    """Send count events three ways and print events/second for each"""
+    server = make_server(0, latency, connect_latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def new_session():
+        session = requests.Session()
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+        return session
+
+    def new_connection(session, i):
+        requests.post(f"{base}/events", json=event(i), headers={'Connection': 'close'})
+
+    def pooled(session, i):
+        session.post(f"{base}/events", json=event(i))
+
+    def batched(session, start):
+        session.post(f"{base}/events/batch",
+                     json={'events': [event(i) for i in range(start, min(count, start + batch_max))]})
+
+    runs = [
+        ('new connection per event', new_connection, range(count)),
+        ('pooled keep-alive session', pooled, range(count)),
+        (f'batches of {batch_max}', batched, range(0, count, batch_max)),
+    ]
+    print(f"{count} events, {concurrency} in flight, latency {latency}s, connect {connect_latency}s")
+    for name, send, items in runs:
+        session = new_session()
+        server.stats.update(connections=0, requests=0, events=0)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda item: send(session, item), items))
+        elapsed = time.perf_counter() - started
+        stats = server.stats
+        print(f"  {name:28s} {count / elapsed:8.1f} events/s  "
+              f"({stats['requests']} requests, {stats['connections']} connections)")
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--connect-latency', type=float, default=0.0, help='seconds added per new connection')
+    parser.add_argument('--bench', type=int, metavar='N', help='run the throughput benchmark with N events')
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--batch-max', type=int, default=50)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench, args.latency, args.connect_latency, args.concurrency, args.batch_max)
+        return
+
+    server = make_server(args.port, args.latency, args.connect_latency, args.verbose)
+    print(f"Stand-in dispatcher on http://127.0.0.1:{args.port}/events (batch: /events/batch)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"Received {server.stats['events']} events in {server.stats['requests']} requests "
+          f"over {server.stats['connections']} connections")
+
+
+if __name__ == '__main__':
+    main()
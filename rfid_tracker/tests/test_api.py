@@ -1,13 +1,47 @@
 import unittest
 import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from unittest import mock
 from app import create_app
+from app.services.dispatcher_outbox import dispatcher_outbox
+from app.services.seen_ids import SeenIds
+from app.services.tracking_service import tracking_service
+from config import ProductionConfig
 
 class TestAPI(unittest.TestCase):
     """Test cases for API endpoints"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Keep the app's data files in a temporary directory"""
+        cls.data_dir = tempfile.mkdtemp()
+        cls.config_patch = mock.patch.multiple(
+            ProductionConfig,
+            DATA_FILE=os.path.join(cls.data_dir, 'tag_tracking.json'),
+            ARCHIVE_DIR=os.path.join(cls.data_dir, 'archive'),
+            COLUMN_ARCHIVE_DIR=os.path.join(cls.data_dir, 'columns'),
+            INVENTORY_SNAPSHOT_FILE=os.path.join(cls.data_dir, 'inventory_snapshot.json'),
+            PAIRING_STATE_FILE=os.path.join(cls.data_dir, 'pairing_state.json'),
+            DISPATCHER_OUTBOX_FILE=os.path.join(cls.data_dir, 'dispatcher_outbox.jsonl'),
+            DISPATCHER_URL=''
+        )
+        cls.config_patch.start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        tracking_service.stop_periodic_snapshot()
+        dispatcher_outbox.close()
+        cls.config_patch.stop()
+        shutil.rmtree(cls.data_dir, ignore_errors=True)
+    
     def setUp(self):
         """Set up test client"""
         self.app = create_app('production')
+        tracking_service.wait_until_ready(timeout=30)
         self.client = self.app.test_client()
         self.app.config['TESTING'] = True
     
@@ -27,6 +61,7 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(data['status'], 'success')
         self.assertIn('data', data)
+        self.assertTrue(data['data']['ready'])
     
     def test_get_records(self):
         """Test get records endpoint"""
@@ -88,6 +123,101 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(data['status'], 'error')
     
+    def test_add_bulk_records(self):
+        """Test a batch is added in one request, in time order"""
+        payload = {'records': [
+            {'rfid_tag': 'BULK-1', 'direction': 'IN', 'read_date': '2020-01-05-09-00-00-0000AM', 'door_id': 'dock'},
+            {'rfid_tag': 'BULK-1', 'direction': 'out', 'read_date': '2020-01-05 10:00:00'},
+        ]}
+        
+        response = self.client.post('/api/records/bulk', json=payload)
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['data'][1]['read_date'], '2020-01-05-10-00-00-0000AM')
+        
+        response = self.client.get('/api/records/BULK-1')
+        records = json.loads(response.data)['data']
+        self.assertEqual([(r['direction'], r['door_id']) for r in records][-2:], [('OUT', 'main'), ('IN', 'dock')])
+    
+    def test_add_record_is_idempotent(self):
+        """Test resubmitting a record_id does not add a second record"""
+        record_id = str(uuid.uuid4())
+        rfid_tag = f'RETRY-{record_id[:8]}'
+        payload = {'rfid_tag': rfid_tag, 'direction': 'IN', 'record_id': record_id}
+        
+        first = json.loads(self.client.post('/api/records', json=payload).data)
+        response = self.client.post('/api/records', json=payload)
+        second = json.loads(response.data)
+        
+        self.assertEqual(first['data']['record_id'], record_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(second['duplicate'])
+        self.assertEqual(tracking_service.get_tag_record_count(rfid_tag), 1)
+    
+    def test_reused_record_id_lists_each_record(self):
+        """Test a record_id reused after deduplication forgot it does not alias the first record"""
+        with mock.patch.object(tracking_service, 'seen_ids', SeenIds(0)):
+            self.client.post('/api/records', json={'rfid_tag': 'REUSE-A', 'direction': 'IN', 'record_id': 'reused'})
+            self.client.post('/api/records', json={'rfid_tag': 'REUSE-B', 'direction': 'IN', 'record_id': 'reused'})
+        
+        data = json.loads(self.client.get('/api/records/REUSE-A').data)
+        self.assertEqual([r['rfid_tag'] for r in data['data']], ['REUSE-A'])
+        data = json.loads(self.client.get('/api/records?limit=2').data)
+        self.assertEqual(sorted(r['rfid_tag'] for r in data['data']), ['REUSE-A', 'REUSE-B'])
+    
+    def test_add_bulk_records_rejects_invalid_batch(self):
+        """Test one invalid item rejects the whole batch"""
+        payload = [
+            {'rfid_tag': 'BULK-2', 'direction': 'IN'},
+            {'rfid_tag': 'BULK-2', 'direction': 'SIDEWAYS'},
+        ]
+        
+        response = self.client.post('/api/records/bulk', json=payload)
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(data['errors']), 1)
+        self.assertTrue(data['errors'][0].startswith('1:'))
+        self.assertEqual(tracking_service.get_tag_record_count('BULK-2'), 0)
+    
+    def events(self, socket_client):
+        """(event, data) pairs a Socket.IO test client received, batches unpacked"""
+        events = []
+        for packet in socket_client.get_received():
+            if packet['name'] == 'batch':
+                events.extend((event, data) for event, data in packet['args'][0])
+            else:
+                events.append((packet['name'], packet['args'][0]))
+        return events
+    
+    def test_door_subscriber_gets_record_changes(self):
+        """Test a door: subscriber gets un-numbered records of that door only, and resyncs to them"""
+        from app import socketio
+        door = socketio.test_client(self.app, query_string=f"topics=door:{self.app.config['DOOR_ID']}")
+        other = socketio.test_client(self.app, query_string='topics=door:dock')
+        door.get_received()
+        other.get_received()
+        since = tracking_service.changes.seq
+        
+        self.client.post('/api/records', json={'rfid_tag': 'TEST-DOOR', 'direction': 'IN'})
+        self.client.post('/api/records/bulk', json=[{'rfid_tag': 'TEST-DOCK', 'direction': 'IN', 'door_id': 'north'}])
+        time.sleep(0.3)
+        
+        events = self.events(door)
+        self.assertNotIn('record_added', [event for event, _ in events])
+        topic_records = [data for event, data in events if event == 'topic_records']
+        self.assertEqual([[r['rfid_tag'] for r in data['records']] for data in topic_records], [['TEST-DOOR']])
+        self.assertNotIn('seq', topic_records[0])
+        self.assertNotIn('topic_records', [event for event, _ in self.events(other)])
+        
+        door.emit('request_resync', {'since': since})
+        resync = [data for event, data in self.events(door) if event == 'resync'][0]
+        self.assertEqual([change['data']['record']['rfid_tag'] for change in resync['changes']], ['TEST-DOOR'])
+        door.disconnect()
+        other.disconnect()
+    
     def test_get_statistics(self):
         """Test get statistics endpoint"""
         response = self.client.get('/api/statistics')
@@ -97,6 +227,82 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(data['status'], 'success')
         self.assertIn('data', data)
     
+    def test_get_statistics_unchanged(self):
+        """Test statistics since_version short-circuit"""
+        response = self.client.get('/api/statistics')
+        version = json.loads(response.data)['data']['version']
+        
+        response = self.client.get(f'/api/statistics?since_version={version}')
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(data['changed'])
+        self.assertNotIn('data', data)
+        
+        response = self.client.get('/api/statistics?since_version=abc')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_get_records_unchanged(self):
+        """Test records since_version short-circuit"""
+        response = self.client.get('/api/records?limit=1')
+        version = json.loads(response.data)['version']
+        
+        response = self.client.get(f'/api/records?since_version={version}')
+        data = json.loads(response.data)
+        self.assertFalse(data['changed'])
+        
+        self.client.post('/api/records', json={'rfid_tag': 'TEST789', 'direction': 'IN'})
+        response = self.client.get(f'/api/records?since_version={version}&limit=1')
+        data = json.loads(response.data)
+        self.assertEqual(data['data'][0]['rfid_tag'], 'TEST789')
+        
+        response = self.client.get('/api/records?since_version=latest')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_inventory_snapshot_conditional(self):
+        """Test the inventory snapshot answers 304 while unchanged"""
+        response = self.client.get('/api/inventory/snapshot')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('states', json.loads(response.data))
+        etag = response.headers['ETag']
+        
+        response = self.client.get('/api/inventory/snapshot', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+    
+    def test_get_current_inventory(self):
+        """Test current tag state listing"""
+        response = self.client.get('/api/inventory/current?location=inside&limit=10')
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['status'], 'success')
+        self.assertIn('counts', data)
+        self.assertIn('next_cursor', data)
+    
+    def test_get_current_inventory_limit(self):
+        """Test a zero or non-numeric limit is rejected and the service clamps it to one"""
+        response = self.client.get('/api/inventory/current?limit=0')
+        self.assertEqual(response.status_code, 400)
+        
+        self.client.post('/api/records', json={'rfid_tag': 'TEST003', 'direction': 'IN'})
+        self.assertEqual(len(tracking_service.get_tag_states(limit=0)['states']), 1)
+        
+        response = self.client.get('/api/inventory/current?limit=abc')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_get_tag_state(self):
+        """Test current state of a single tag"""
+        self.client.post(
+            '/api/records',
+            data=json.dumps({'rfid_tag': 'TEST002', 'direction': 'IN'}),
+            content_type='application/json'
+        )
+        response = self.client.get('/api/inventory/current/TEST002')
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['data']['location'], 'inside')
+    
     def test_get_records_with_filter(self):
         """Test get records with direction filter"""
         response = self.client.get('/api/records?direction=IN')
@@ -114,6 +320,44 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(data['status'], 'success')
         self.assertEqual(data['tag_id'], 'TEST001')
 
+    
+    def test_invalid_limit(self):
+        """Test a non-numeric or negative limit is rejected with 400"""
+        for url in ('/api/records?limit=abc', '/api/records/TEST001?limit=-1', '/api/tags?q=TEST&limit=0'):
+            response = self.client.get(url)
+            data = json.loads(response.data)
+            
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data['status'], 'error')
+    
+    def test_analytics_rejects_invalid_arguments(self):
+        """Test analytics answers 400 for a bad limit or an unparseable date instead of a full-history result"""
+        for url in ('/api/analytics/tags?limit=abc', '/api/analytics/tags?limit=-5',
+                    '/api/analytics/tags?start_date=yesterday', '/api/analytics/hourly?end_date=2025-13-99x'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400, url)
+        
+        response = self.client.get('/api/analytics/tags?start_date=2025-12-06&limit=5')
+        self.assertEqual(response.status_code, 200)
+    
+    def test_get_tag_records_prefix(self):
+        """Test tag records lookup by partial EPC"""
+        response = self.client.get('/api/records/TEST?prefix=true')
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['status'], 'success')
+        self.assertTrue(data['prefix'])
+    
+    def test_search_tags(self):
+        """Test tag search endpoint"""
+        response = self.client.get('/api/tags?q=TEST&limit=5')
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['status'], 'success')
+        self.assertIn('data', data)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+import threading
+import time
+import unittest
+from app.services.broadcaster import Broadcaster
+from app.services.wire_encoding import pack, unpack
+
+
+class FakeSocket:
+    """Collects emitted frames; clients are subscribed to rooms in `rooms`"""
+
+    def __init__(self, rooms):
+        self.rooms = rooms  # sid -> set of rooms
+        self.frames = []
+        self.sent = threading.Event()
+        self.queued = {}  # sid -> frames waiting in its outbound queue
+        self.disconnected = []
+
+    def emit(self, event, data, to=None):
+        self.frames.append((event, data, sorted(to)))
+        self.sent.set()
+
+    def members(self, rooms):
+        if rooms is None:
+            return set(self.rooms)
+        return {sid for sid, joined in self.rooms.items() if joined & set(rooms)}
+
+    def backlog(self, sid):
+        return self.queued.get(sid, 0)
+
+    def disconnect(self, sid):
+        self.disconnected.append(sid)
+        self.rooms.pop(sid)
+
+
+class TestBroadcaster(unittest.TestCase):
+    """Test cases for coalesced WebSocket broadcasts"""
+
+    def setUp(self):
+        self.socket = FakeSocket({'dashboard': {'records', 'status'}, 'kiosk': {'stats'}})
+        self.broadcaster = Broadcaster()
+        self.addCleanup(self.broadcaster.stop)
+
+    def start(self, window):
+        self.broadcaster.start(self.socket.emit, self.socket.members, window)
+
+    def test_not_started_leaves_emitting_to_caller(self):
+        """Test send() declines until started, and with a zero window"""
+        self.assertFalse(self.broadcaster.send('status_update', {}))
+        self.start(0)
+        self.assertFalse(self.broadcaster.send('status_update', {}))
+
+    def test_window_is_sent_as_one_batch(self):
+        """Test events in one window share a frame, in order, with superseded ones merged"""
+        self.start(0.1)
+        self.assertTrue(self.broadcaster.send('status_update', {'rfid_reader': 'error'}, key='status_update'))
+        self.broadcaster.send('record_added', {'seq': 1}, to=['records'])
+        self.broadcaster.send('record_added', {'seq': 2}, to=['records'])
+        self.broadcaster.send('status_update', {'rfid_reader': 'connected'}, key='status_update')
+
+        self.assertTrue(self.socket.sent.wait(2))
+        self.broadcaster.stop()
+        self.assertIn(('batch', [
+            ['record_added', {'seq': 1}],
+            ['record_added', {'seq': 2}],
+            ['status_update', {'rfid_reader': 'connected'}],
+        ], ['dashboard']), self.socket.frames)
+        stats = self.broadcaster.stats()
+        self.assertEqual((stats['events_in'], stats['events_merged']), (4, 1))
+        # dashboard: 4 frames -> 1, kiosk: 2 status frames -> 1
+        self.assertEqual((stats['frames_sent'], stats['frames_saved']), (2, 4))
+        self.assertGreater(stats['bytes_saved'], 0)
+
+    def test_clients_only_get_their_topics(self):
+        """Test each client gets one frame holding just the events for its rooms"""
+        self.start(0.05)
+        self.broadcaster.send('record_added', {'seq': 1}, to=['records'])
+        self.broadcaster.send('statistics_update', {'total_records': 1}, key='statistics_update', to=['stats'])
+        self.broadcaster.send('status_update', {}, to=['status', 'records'])
+
+        self.assertTrue(self.socket.sent.wait(2))
+        self.broadcaster.stop()
+        self.assertEqual(sorted(self.socket.frames, key=lambda frame: frame[2]), [
+            ('batch', [['record_added', {'seq': 1}], ['status_update', {}]], ['dashboard']),
+            ('statistics_update', {'total_records': 1}, ['kiosk']),
+        ])
+
+    def test_binary_clients_get_packed_batches(self):
+        """Test a client with an encoding gets even a single event as a packed batch"""
+        self.broadcaster.start(self.socket.emit, self.socket.members, 0.05,
+                               encodings=lambda: {'kiosk': 'deflate'}, pack=pack)
+        self.broadcaster.send('statistics_update', {'total_records': 2}, to=['stats'])
+
+        self.assertTrue(self.socket.sent.wait(2))
+        self.broadcaster.stop()
+        event, data, to = self.socket.frames[0]
+        self.assertEqual((event, to), ('batch', ['kiosk']))
+        self.assertEqual(unpack('deflate', data), [['statistics_update', {'total_records': 2}]])
+
+    def flush(self, event, data, **kwargs):
+        """Send one event and wait for its window to go out"""
+        flushes = len(self.broadcaster._recent)
+        self.broadcaster.send(event, data, **kwargs)
+        deadline = time.time() + 2
+        while len(self.broadcaster._recent) == flushes and time.time() < deadline:
+            time.sleep(0.005)
+
+    def test_lagging_client_gets_one_resync_marker(self):
+        """Test a backed-up client is skipped, then told the newest seq it missed"""
+        self.broadcaster.start(self.socket.emit, self.socket.members, 0.01,
+                               backlog=self.socket.backlog, disconnect=self.socket.disconnect,
+                               queue_max=10, lag_timeout=60)
+        self.socket.queued['dashboard'] = 10
+        self.flush('record_added', {'seq': 1}, to=['records'])
+        self.flush('status_update', {}, key='status_update', to=['status'])
+        self.flush('record_added', {'seq': 2}, to=['records'])
+        self.assertEqual(self.socket.frames, [])
+        stats = self.broadcaster.stats()
+        self.assertEqual((stats['lagging_clients'], stats['frames_dropped']), (1, 3))
+        self.assertEqual(stats['clients'][0]['queue_depth'], 10)
+
+        # Still above half the limit: keeps lagging
+        self.socket.queued['dashboard'] = 6
+        self.flush('record_added', {'seq': 3}, to=['records'])
+        self.assertEqual(self.socket.frames, [])
+
+        self.socket.queued['dashboard'] = 5
+        self.flush('record_added', {'seq': 4}, to=['records'])
+        self.assertEqual(self.socket.frames, [('batch', [
+            ['resync_required', {'seq': 3, 'reason': 'backpressure'}],
+            ['record_added', {'seq': 4}],
+        ], ['dashboard'])])
+        self.assertEqual(self.broadcaster.stats()['lagging_clients'], 0)
+
+    def test_client_lagging_too_long_is_disconnected(self):
+        """Test a client that does not drain within lag_timeout is dropped"""
+        self.broadcaster.start(self.socket.emit, self.socket.members, 0.01,
+                               backlog=self.socket.backlog, disconnect=self.socket.disconnect,
+                               queue_max=10, lag_timeout=0)
+        self.socket.queued['kiosk'] = 50
+        self.flush('statistics_update', {'total_records': 1}, to=['stats'])
+        self.assertEqual(self.socket.disconnected, ['kiosk'])
+        self.assertEqual(self.broadcaster.stats()['slow_disconnects'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
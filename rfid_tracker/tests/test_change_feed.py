@@ -0,0 +1,36 @@
+import unittest
+from app.services.change_feed import ChangeFeed
+
+
+class TestChangeFeed(unittest.TestCase):
+    """Test cases for the numbered WebSocket change log"""
+
+    def test_changes_are_numbered_in_order(self):
+        """Test each change gets the next seq and the payload is not modified"""
+        feed = ChangeFeed()
+        data = {'record': {'rfid_tag': 'TAG-A'}}
+        first = feed.append('record_added', data)
+        second = feed.append('records_cleared', {})
+        self.assertEqual((first['seq'], second['seq'], feed.seq), (1, 2, 2))
+        self.assertNotIn('seq', data)
+        self.assertEqual(feed.since(0), [('record_added', first), ('records_cleared', second)])
+        self.assertEqual(feed.since(1), [('records_cleared', second)])
+        self.assertEqual(feed.since(2), [])
+
+    def test_too_far_behind_needs_full_resync(self):
+        """Test changes evicted by weight (or a seq from another run) cannot be replayed"""
+        feed = ChangeFeed(capacity=5)
+        feed.append('record_added', {})
+        feed.append('records_added', {}, weight=3)
+        feed.append('records_added', {}, weight=2)
+        self.assertIsNone(feed.since(0))
+        self.assertEqual([change['seq'] for _, change in feed.since(1)], [2, 3])
+        self.assertIsNone(feed.since(7))
+
+        # The newest change is kept even if it alone exceeds the capacity
+        feed.append('records_added', {}, weight=10)
+        self.assertEqual(len(feed.since(3)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from app.services.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for the dispatcher circuit breaker"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=5, max_reset_timeout=15,
+                                      clock=self.clock)
+
+    def fail(self, times):
+        for _ in range(times):
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        """Test the breaker opens only after the threshold is reached in a row"""
+        self.fail(2)
+        self.breaker.record_success()
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.fail(1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.retry_in(), 5)
+
+    def test_single_probe_closes_on_success(self):
+        """Test one probe is let through after the reset timeout"""
+        self.fail(3)
+        self.clock.now += 5
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success()
+        stats = self.breaker.stats()
+        self.assertEqual((stats['state'], stats['times_opened'], stats['open_seconds_total']),
+                         (CircuitBreaker.CLOSED, 1, 5.0))
+        self.assertEqual([t['to'] for t in stats['transitions']],
+                         [CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN, CircuitBreaker.CLOSED])
+
+    def test_failed_probes_back_off(self):
+        """Test each failed probe doubles the wait, up to the maximum"""
+        self.fail(3)
+        waits = []
+        for _ in range(3):
+            self.clock.now += self.breaker.retry_in()
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record_failure()
+            waits.append(self.breaker.retry_in())
+        self.assertEqual(waits, [10, 15, 15])
+
+        self.clock.now += 15
+        self.breaker.allow_request()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.reset_timeout, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
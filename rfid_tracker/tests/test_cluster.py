@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from app.services.cluster import Cluster
+from app.services.tracking_service import TrackingService
+from tests.test_tracking_service import make_app
+
+
+class TestCluster(unittest.TestCase):
+    """Test cases for the owner / web worker link"""
+
+    def setUp(self):
+        """An owner service with history, and an empty replica linked to it"""
+        self.data_dir = tempfile.mkdtemp()
+        self.app = make_app(self.data_dir)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.address = os.path.join(self.data_dir, 'cluster.sock')
+        self.owner_service = TrackingService()
+        self.owner_service.initialize()
+        self.owner_service.add_records([{'rfid_tag': f'TAG-{i}', 'direction': 'IN'} for i in range(5)])
+
+        self.owner = Cluster()
+        self.owner.register('add_record', self.owner_service.add_record)
+        self.owner.register('fail', lambda: 1 / 0)
+        self.owner_service.changes.listener = self.owner.publish_change
+        self.owner.start_owner(self.app, self.address, b'secret', self.owner_service.replica_state)
+
+        self.replica = TrackingService()
+        self.replica.initialize_replica()
+        self.broadcasts = []
+        self.lost = threading.Event()
+        self.worker = Cluster()
+        self.worker.start_worker(self.address, b'secret', 1, {
+            'state': self.replica.load_replica,
+            'records': self.replica.load_replica_records,
+            'loaded': self.replica.finish_replica,
+            'change': self.replica.apply_change,
+            'broadcast': self.on_broadcast,
+            'expire': self.replica.expire_before,
+            'lost': self.lost.set
+        })
+        self.assertTrue(self.replica.wait_until_ready(5))
+
+    def tearDown(self):
+        self.owner.stop_workers()
+        self.worker._conn.close()
+        self.ctx.pop()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def on_broadcast(self, event, data, key, to):
+        self.replica.apply_broadcast(event, data)
+        self.broadcasts.append((event, data, key, to))
+
+    def assertInStep(self):
+        """Replica serves what the owner would, with the same versions"""
+        self.assertEqual(self.replica.get_sync_state(), self.owner_service.get_sync_state())
+        self.assertEqual(self.replica.get_records_version(), self.owner_service.get_records_version())
+        self.assertEqual(self.replica.get_tag_states(), self.owner_service.get_tag_states())
+
+    def test_replica_follows_owner_changes(self):
+        """Test a worker loads the owner's state, then applies its changes in order"""
+        self.assertInStep()
+        # A write forwarded from the worker is in its replica when the call returns
+        record = self.worker.call('add_record', 'TAG-W', 'OUT', None)
+        self.assertEqual(self.replica.get_tag_records('TAG-W'), [record])
+        self.assertInStep()
+        self.owner_service.add_records([{'rfid_tag': 'TAG-0', 'direction': 'OUT'},
+                                        {'rfid_tag': 'TAG-9', 'direction': 'IN'}])
+        self.worker.call('add_record', 'TAG-X', 'IN', None)
+        self.assertInStep()
+        self.assertEqual(self.replica.get_changes_since(self.replica.changes.seq - 2)['changes'],
+                         self.owner_service.get_changes_since(self.owner_service.changes.seq - 2)['changes'])
+
+        self.owner_service.clear_all_records()
+        self.assertTrue(self.owner.relay('status_update', {'rfid_reader': 'connected'}, 'status_update', ['status']))
+        self.worker.call('add_record', 'TAG-Y', 'IN', None)
+        self.assertInStep()
+        self.assertEqual(self.replica.get_status()['rfid_reader'], 'connected')
+        self.assertEqual(self.broadcasts[-1][0], 'status_update')
+
+    def test_change_right_after_subscribe_reaches_new_worker(self):
+        """Test a change published as a worker subscribes is applied after its state"""
+        def state(subscribe):
+            meta, records = self.owner_service.replica_state(subscribe)
+            # A write landing once the lock is released, before state() returns
+            with self.app.app_context():
+                self.owner_service.add_records([{'rfid_tag': 'TAG-RACE', 'direction': 'IN'}])
+            return meta, records
+
+        self.owner._state = state
+        replica = TrackingService()
+        replica.initialize_replica()
+        worker = Cluster()
+        worker.start_worker(self.address, b'secret', 2, {
+            'state': replica.load_replica,
+            'records': replica.load_replica_records,
+            'loaded': replica.finish_replica,
+            'change': replica.apply_change,
+            'broadcast': lambda event, data, key, to: replica.apply_broadcast(event, data),
+            'expire': replica.expire_before,
+            'lost': lambda: None
+        })
+        try:
+            self.assertTrue(replica.wait_until_ready(5))
+            # Forwarded calls are answered behind the changes queued before them
+            worker.call('add_record', 'TAG-W2', 'IN', None)
+            self.assertEqual(len(replica.get_tag_records('TAG-RACE')), 1)
+            self.assertEqual(replica.get_sync_state(), self.owner_service.get_sync_state())
+        finally:
+            worker._conn.close()
+
+    def test_failed_call_raises_on_worker(self):
+        """Test an exception on the owner is reported to the calling worker"""
+        with self.assertRaises(RuntimeError):
+            self.worker.call('fail')
+        self.assertEqual(self.owner.stats()['workers'][0]['calls'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+from app.services import columnar_archive
+from app.services.columnar_archive import ColumnarArchive
+
+HOUR_US = 3600 * 1000000
+
+
+class TestColumnarArchive(unittest.TestCase):
+    """Test cases for the memory-mapped column archive"""
+
+    def setUp(self):
+        """Archive with three movements across two hours"""
+        self.directory = tempfile.mkdtemp()
+        archive = ColumnarArchive(self.directory)
+        archive.append([
+            (10 * HOUR_US + 5, 'TAG-A', 'IN', 'main'),
+            (10 * HOUR_US + 9, 'TAG-B', 'IN', 'main'),
+            (11 * HOUR_US + 1, 'TAG-A', 'OUT', 'side'),
+        ])
+        archive.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def check_aggregates(self):
+        archive = ColumnarArchive(self.directory)
+        self.assertEqual(archive.rows, 3)
+
+        hours = archive.hourly_counts()
+        self.assertEqual([(h['in_count'], h['out_count']) for h in hours], [(2, 0), (0, 1)])
+        self.assertEqual(hours[1]['hour_start_ms'], 11 * 3600 * 1000)
+
+        self.assertEqual(archive.tag_counts()[0], {'tag': 'TAG-A', 'count': 2})
+        in_counts = archive.tag_counts(direction='IN', limit=5)
+        self.assertEqual(sorted((t['tag'], t['count']) for t in in_counts), [('TAG-A', 1), ('TAG-B', 1)])
+        self.assertEqual(len(archive.tag_counts(start_ms=11 * 3600 * 1000)), 1)
+
+    def test_aggregates(self):
+        """Test hourly and per-tag counts over the mapped columns"""
+        self.check_aggregates()
+
+    def test_aggregates_without_numpy(self):
+        """Test the pure Python fallback gives the same answers"""
+        original = columnar_archive.np
+        columnar_archive.np = None
+        try:
+            self.check_aggregates()
+        finally:
+            columnar_archive.np = original
+
+    def test_torn_row_is_dropped(self):
+        """Test a partially written row is truncated on open"""
+        with open(os.path.join(self.directory, 'ts_ms.i8'), 'ab') as f:
+            f.write(b'\x00' * 8)
+        archive = ColumnarArchive(self.directory)
+        self.assertEqual(archive.rows, 3)
+        self.assertEqual(os.path.getsize(os.path.join(self.directory, 'ts_ms.i8')), 24)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from app.services.dispatcher_outbox import DispatcherOutbox
+
+
+class FakeDispatcher:
+    """Records payloads; answers with queued status codes, then 200"""
+
+    def __init__(self, statuses=None):
+        self.statuses = list(statuses or [])
+        self.received = []
+        self.lock = threading.Lock()
+
+    def __call__(self, url, payload, timeout):
+        with self.lock:
+            self.received.append(payload)
+            return self.statuses.pop(0) if self.statuses else 200
+
+
+class TestDispatcherOutbox(unittest.TestCase):
+    """Test cases for the durable dispatcher outbox"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'outbox.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def open_outbox(self, sender, **kwargs):
+        outbox = DispatcherOutbox(sender)
+        outbox.open(self.path, 'http://dispatcher.test', backoff_base=0.01, backoff_max=0.05, **kwargs)
+        self.addCleanup(outbox.close)
+        return outbox
+
+    def test_delivers_and_acknowledges(self):
+        """Test queued payloads are sent once each and leave nothing owed"""
+        sender = FakeDispatcher()
+        outbox = self.open_outbox(sender)
+        for i in range(5):
+            outbox.enqueue(f'TAG-{i % 2}', {'tagId': f'TAG-{i % 2}', 'n': i})
+
+        self.assertTrue(outbox.wait_idle(timeout=5))
+        self.assertEqual(len(sender.received), 5)
+        # One tag's movements arrive in the order they were queued
+        self.assertEqual([p['n'] for p in sender.received if p['tagId'] == 'TAG-0'], [0, 2, 4])
+        stats = outbox.stats()
+        self.assertEqual((stats['queue_depth'], stats['delivered'], stats['success_rate']), (0, 5, 1.0))
+
+    def test_retries_with_backoff_until_delivered(self):
+        """Test outages are retried and permanent rejections dropped"""
+        sender = FakeDispatcher([None, 503, 200, 400])
+        outbox = self.open_outbox(sender, concurrency=1)
+        outbox.enqueue('TAG-A', {'tagId': 'TAG-A'})
+        outbox.enqueue('TAG-B', {'tagId': 'TAG-B'})
+
+        self.assertTrue(outbox.wait_idle(timeout=5))
+        stats = outbox.stats()
+        self.assertEqual((stats['delivered'], stats['failed_attempts'], stats['dropped']), (1, 2, 1))
+
+    def test_burst_is_sent_as_one_batch(self):
+        """Test movements queued within the batch window share one request"""
+        sender = FakeDispatcher()
+        outbox = self.open_outbox(sender, batch_url='http://dispatcher.test/batch', batch_window=0.2)
+        for i in range(4):
+            outbox.enqueue(f'TAG-{i % 2}', {'tagId': f'TAG-{i % 2}', 'n': i})
+
+        self.assertTrue(outbox.wait_idle(timeout=5))
+        self.assertEqual(len(sender.received), 1)
+        self.assertEqual([p['n'] for p in sender.received[0]['events']], [0, 1, 2, 3])
+        self.assertEqual(outbox.stats()['delivered'], 4)
+
+    def test_open_breaker_holds_movements_locally(self):
+        """Test an unreachable dispatcher is probed instead of retried per movement"""
+        sender = FakeDispatcher([None, None])
+        outbox = self.open_outbox(sender, concurrency=1, breaker_threshold=2, breaker_reset=0.3)
+        for i in range(5):
+            outbox.enqueue(f'TAG-{i}', {'tagId': f'TAG-{i}'})
+
+        time.sleep(0.15)
+        stats = outbox.stats()
+        self.assertEqual(len(sender.received), 2)
+        self.assertEqual((stats['queue_depth'], stats['breaker']['state']), (5, 'open'))
+
+        # The probe succeeds, the breaker closes and the backlog drains
+        self.assertTrue(outbox.wait_idle(timeout=5))
+        stats = outbox.stats()
+        self.assertEqual((stats['delivered'], stats['breaker']['state']), (5, 'closed'))
+        self.assertEqual(stats['breaker']['times_opened'], 1)
+
+    def test_pending_entries_survive_restart(self):
+        """Test payloads not yet delivered are sent after reopening the file"""
+        outbox = DispatcherOutbox(FakeDispatcher([None]))
+        outbox.open(self.path, 'http://dispatcher.test', backoff_base=60)
+        outbox.enqueue('TAG-A', {'tagId': 'TAG-A'})
+        outbox.close()
+        with open(self.path, 'a') as f:
+            f.write('{"op": "add", "id": 9')  # torn line from a power cut
+
+        sender = FakeDispatcher()
+        reopened = self.open_outbox(sender)
+        self.assertTrue(reopened.wait_idle(timeout=5))
+        self.assertEqual(sender.received, [{'tagId': 'TAG-A'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from app.services.pairing import PairingTable
+
+
+class TestPairingTable(unittest.TestCase):
+    """Test cases for the per-tag dispatcher pairing table"""
+
+    def setUp(self):
+        """TAG-A moves in, out, out"""
+        self.table = PairingTable()
+        self.table.update('TAG-A', 'IN', 100, 'in-100')
+        self.table.update('TAG-A', 'OUT', 200, 'out-200')
+        self.table.update('TAG-A', 'OUT', 300, 'out-300')
+
+    def test_latest_pair_ends_at_direction_change(self):
+        """Test a repeated direction does not start a new pair"""
+        pairing = self.table.due('TAG-A')
+        self.assertEqual((pairing.pair_direction, pairing.pair_read_date, pairing.pair_us), ('OUT', 'out-200', 200))
+
+    def test_pair_is_due_once(self):
+        """Test a sent pair is not due again until a newer pair forms"""
+        self.table.mark_sent('TAG-A')
+        self.assertIsNone(self.table.due('TAG-A'))
+        self.table.update('TAG-A', 'IN', 400, 'in-400')
+        self.assertEqual(self.table.due('TAG-A').pair_us, 400)
+
+    def test_late_record_needs_rebuild(self):
+        """Test an older record is refused and a rebuild keeps the sent mark"""
+        self.table.mark_sent('TAG-A')
+        self.assertFalse(self.table.update('TAG-A', 'IN', 250, 'in-250'))
+        self.table.rebuild('TAG-A', [('IN', 100, 'in-100'), ('OUT', 200, 'out-200'),
+                                     ('IN', 250, 'in-250'), ('OUT', 300, 'out-300')])
+        self.assertEqual(self.table.due('TAG-A').pair_us, 300)
+        self.assertEqual(self.table.get('TAG-A').sent_us, 200)
+
+    def test_snapshot_round_trip(self):
+        """Test restore() rebuilds an equal table"""
+        restored = PairingTable()
+        restored.restore(self.table.snapshot())
+        self.assertEqual(restored.snapshot(), self.table.snapshot())
+        self.assertTrue(restored.is_applied('TAG-A', 300))
+
+
+if __name__ == '__main__':
+    unittest.main()
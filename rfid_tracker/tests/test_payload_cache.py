@@ -0,0 +1,57 @@
+import json
+import unittest
+from app.services.payload_cache import PayloadCache, RawJSON, RecordFragments, dumps, encode
+
+
+class TestPayloadCache(unittest.TestCase):
+    """Test cases for serialize-once JSON payloads"""
+
+    def test_raw_json_is_spliced_verbatim(self):
+        """Test pre-encoded parts are inserted as is, however deeply nested"""
+        event = encode({'seq': 1, 'text': 'quote " and \u0000'})
+        frame = dumps(['batch', [['record_added', event], ['status_update', {'ready': True}]]],
+                      separators=(',', ':'))
+        self.assertEqual(json.loads(frame), ['batch', [['record_added', {'seq': 1, 'text': 'quote " and \u0000'}],
+                                                       ['status_update', {'ready': True}]]])
+        self.assertEqual(dumps(RawJSON('[1]')), '[1]')
+        with self.assertRaises(TypeError):
+            dumps({'when': object()})
+
+    def test_payload_reused_until_version_changes(self):
+        """Test a payload is built once per version of its data"""
+        cache = PayloadCache(capacity=2)
+        builds = []
+
+        def build():
+            builds.append(1)
+            return encode({'count': len(builds)})
+
+        first = cache.get('statistics_update', 7, build)
+        self.assertIs(cache.get('statistics_update', 7, build), first)
+        self.assertEqual(json.loads(cache.get('statistics_update', 8, build).text), {'count': 2})
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_record_lists_are_joined_from_fragments(self):
+        """Test record lists match a plain encode and reuse each record's fragment"""
+        fragments = RecordFragments(capacity=2)
+        records = [{'rfid_tag': f'TAG-{i}', 'direction': 'IN', 'record_id': f'id-{i}'} for i in range(3)]
+        for record in records:
+            fragments.add(record)
+        # Capacity 2: the oldest fragment was evicted and is encoded again on read
+        listed = fragments.encode_list(records + [{'rfid_tag': 'TAG-X', 'record_id': ''}])
+        self.assertEqual(json.loads(listed.text), records + [{'rfid_tag': 'TAG-X', 'record_id': ''}])
+        stats = fragments.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (2, 2, 2))
+
+    def test_reused_record_id_is_not_served_for_another_record(self):
+        """Test two records sharing a client-supplied id each list as themselves"""
+        fragments = RecordFragments()
+        first = {'rfid_tag': 'AAA', 'direction': 'IN', 'read_date': '2025-12-06-09-00-00-0000AM', 'record_id': 'abc'}
+        second = {'rfid_tag': 'BBB', 'direction': 'IN', 'read_date': '2025-12-06-09-05-00-0000AM', 'record_id': 'abc'}
+        fragments.add(first)
+        fragments.add(second)
+        self.assertEqual(json.loads(fragments.encode_list([first, second]).text), [first, second])
+
+
+if __name__ == '__main__':
+    unittest.main()
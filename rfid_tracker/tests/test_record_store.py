@@ -0,0 +1,177 @@
+import unittest
+from app.services.record_store import RecordStore
+from app.utils.helpers import timestamp_to_epoch_us
+
+
+def make_record(tag, direction, read_date):
+    return {'rfid_tag': tag, 'direction': direction, 'read_date': read_date}
+
+
+class TestRecordStore(unittest.TestCase):
+    """Test cases for the time-ordered record store"""
+
+    def setUp(self):
+        """Build a store with records spanning noon"""
+        self.store = RecordStore()
+        self.store.extend([
+            make_record('TAG-A', 'IN', '2025-12-06-11-59-00-0000AM'),
+            make_record('TAG-B', 'IN', '2025-12-06-12-00-00-0000PM'),
+            make_record('TAG-A', 'OUT', '2025-12-06-01-30-00-0000PM'),
+            make_record('TAG-B', 'OUT', '2025-12-07-09-00-00-0000AM'),
+        ])
+
+    def test_timestamp_parsing_orders_12_hour_clock(self):
+        """Test that PM readings sort after AM readings of the same day"""
+        morning = timestamp_to_epoch_us('2025-12-06-11-59-00-0000AM')
+        afternoon = timestamp_to_epoch_us('2025-12-06-01-30-00-0000PM')
+        self.assertLess(morning, afternoon)
+
+    def test_query_newest_first(self):
+        """Test that query returns records newest first"""
+        records = self.store.query()
+        self.assertEqual([r['read_date'] for r in records], [
+            '2025-12-07-09-00-00-0000AM',
+            '2025-12-06-01-30-00-0000PM',
+            '2025-12-06-12-00-00-0000PM',
+            '2025-12-06-11-59-00-0000AM',
+        ])
+
+    def test_query_limit(self):
+        """Test newest N"""
+        records = self.store.query(limit=1)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['rfid_tag'], 'TAG-B')
+        self.assertEqual(records[0]['direction'], 'OUT')
+
+    def test_query_date_range(self):
+        """Test that a bare end date includes the whole day"""
+        start = timestamp_to_epoch_us('2025-12-06-12')
+        end = timestamp_to_epoch_us('2025-12-06', end=True)
+        records = self.store.query(start_us=start, end_us=end)
+        self.assertEqual(len(records), 2)
+
+    def test_query_filters(self):
+        """Test direction and tag filters"""
+        self.assertEqual(len(self.store.query(direction='IN')), 2)
+        self.assertEqual(len(self.store.query(rfid_tag='TAG-A', direction='OUT')), 1)
+
+    def test_out_of_order_append(self):
+        """Test that a late record is stored in time order"""
+        self.store.append(make_record('TAG-C', 'IN', '2025-12-06-06-00-00-0000AM'))
+        records = self.store.query()
+        self.assertEqual(records[-1]['rfid_tag'], 'TAG-C')
+
+    def test_extend_positions_with_late_rows(self):
+        """Test extend returns final positions when a batch mixes in-order and late rows"""
+        batch = [
+            make_record('TAG-C', 'IN', '2025-12-07-10-00-20-0000AM'),
+            make_record('TAG-D', 'IN', '2025-12-07-10-00-25-0000AM'),
+            make_record('TAG-E', 'IN', '2025-12-07-10-00-22-0000AM'),
+        ]
+        positions = self.store.extend(batch)
+        self.assertEqual(positions, [4, 6, 5])
+        for record, pos in zip(batch, positions):
+            self.assertEqual(self.store.record_at(pos)['rfid_tag'], record['rfid_tag'])
+            self.assertEqual(self.store.ts_at(pos), timestamp_to_epoch_us(record['read_date']))
+
+    def test_tag_index(self):
+        """Test per-tag queries and counts come from the tag index"""
+        records = self.store.query(rfid_tag='TAG-A')
+        self.assertEqual([r['direction'] for r in records], ['OUT', 'IN'])
+        self.assertEqual(self.store.tag_count('TAG-B'), 2)
+        self.assertEqual(list(self.store.tag_positions('TAG-A')), [0, 2])
+
+    def test_tag_index_after_out_of_order_append(self):
+        """Test the tag index stays consistent when positions shift"""
+        self.store.append(make_record('TAG-B', 'IN', '2025-12-06-06-00-00-0000AM'))
+        self.assertEqual(list(self.store.tag_positions('TAG-B')), [0, 2, 4])
+        self.assertEqual(list(self.store.tag_positions('TAG-A')), [1, 3])
+
+    def test_prefix_search(self):
+        """Test partial EPC lookup and multi-tag queries"""
+        self.store.append(make_record('E2000017', 'IN', '2025-12-08-09-00-00-0000AM'))
+        self.assertEqual(self.store.tags_with_prefix('TAG-'), ['TAG-A', 'TAG-B'])
+        self.assertEqual(self.store.tags_with_prefix('E2'), ['E2000017'])
+        records = self.store.query_tags(['TAG-A', 'TAG-B'], limit=3)
+        self.assertEqual([r['rfid_tag'] for r in records], ['TAG-B', 'TAG-A', 'TAG-B'])
+
+    def test_read_dates_round_trip(self):
+        """Test records come back exactly as stored, legacy timestamps and client ids included"""
+        self.store.append({'rfid_tag': 'TAG-C', 'direction': 'IN',
+                           'read_date': '2025-12-06-01-30-00-500-PM', 'door_id': 'dock',
+                           'record_id': '2f1e6b3c-9d4a-4c8e-b7f0-1a2b3c4d5e6f'})
+        self.store.append({'rfid_tag': 'TAG-C', 'direction': 'OUT',
+                           'read_date': '2025-12-06-06-00-00-0000AM', 'record_id': 'scanner-7:0042'})
+        self.store.remove_before(timestamp_to_epoch_us('2025-12-06-12-00-00-0000PM'))
+        self.assertEqual(self.store.to_list(), [
+            {'rfid_tag': 'TAG-B', 'direction': 'IN', 'read_date': '2025-12-06-12-00-00-0000PM',
+             'door_id': '', 'record_id': ''},
+            {'rfid_tag': 'TAG-A', 'direction': 'OUT', 'read_date': '2025-12-06-01-30-00-0000PM',
+             'door_id': '', 'record_id': ''},
+            {'rfid_tag': 'TAG-C', 'direction': 'IN', 'read_date': '2025-12-06-01-30-00-500-PM',
+             'door_id': 'dock', 'record_id': '2f1e6b3c-9d4a-4c8e-b7f0-1a2b3c4d5e6f'},
+            {'rfid_tag': 'TAG-B', 'direction': 'OUT', 'read_date': '2025-12-07-09-00-00-0000AM',
+             'door_id': '', 'record_id': ''},
+        ])
+
+    def test_record_ids_follow_inserted_rows(self):
+        """Test record ids stay with their rows when a late record is merged in"""
+        self.store.append({'rfid_tag': 'TAG-C', 'direction': 'IN', 'read_date': '2025-12-08-09-00-00-0000AM',
+                           'record_id': 'c0ffee00-0000-4000-8000-000000000001'})
+        self.store.append({'rfid_tag': 'TAG-C', 'direction': 'OUT', 'read_date': '2025-12-06-06-00-00-0000AM',
+                           'record_id': 'late-one'})
+        self.assertEqual(self.store.record_id_at(0), 'late-one')
+        self.assertEqual(self.store.record_id_at(5), 'c0ffee00-0000-4000-8000-000000000001')
+        self.assertEqual(self.store.record_id_at(1), '')
+
+    def test_cursor_paging(self):
+        """Test before/after cursors walk the records and survive inserts at the same time"""
+        first = self.store.page(limit=2)
+        self.assertEqual([r['read_date'] for r in first['records']],
+                         ['2025-12-07-09-00-00-0000AM', '2025-12-06-01-30-00-0000PM'])
+        self.assertTrue(first['has_more'])
+
+        # A record with the same timestamp as the cursor lands after it
+        self.store.extend([make_record('TAG-C', 'IN', '2025-12-06-01-30-00-0000PM')])
+        older = self.store.page(before=first['older_cursor'], limit=2)
+        self.assertEqual([r['rfid_tag'] for r in older['records']], ['TAG-B', 'TAG-A'])
+        self.assertFalse(older['has_more'])
+
+        newer = self.store.page(after=first['older_cursor'], limit=5)
+        self.assertEqual([r['rfid_tag'] for r in newer['records']], ['TAG-B', 'TAG-C'])
+        tag_page = self.store.page(before=first['older_cursor'], rfid_tag='TAG-A')
+        self.assertEqual([r['direction'] for r in tag_page['records']], ['IN'])
+
+    def test_epcs_are_interned(self):
+        """Test repeated EPCs share one intern table entry"""
+        self.assertEqual(len(self.store.epcs), 2)
+        self.assertEqual(self.store.tag_at(2), 'TAG-A')
+
+    def test_snapshot_is_stable(self):
+        """Test a snapshot ignores later appends, inserts and retention"""
+        snapshot = self.store.snapshot()
+        self.store.append(make_record('TAG-C', 'IN', '2025-12-08-09-00-00-0000AM'))
+        self.store.append(make_record('TAG-A', 'IN', '2025-12-06-06-00-00-0000AM'))
+        self.store.remove_before(timestamp_to_epoch_us('2025-12-07'))
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(snapshot.tag_count('TAG-A'), 2)
+        self.assertEqual(snapshot.tags_with_prefix('TAG-'), ['TAG-A', 'TAG-B'])
+        self.assertEqual(snapshot.query(limit=1)[0]['read_date'], '2025-12-07-09-00-00-0000AM')
+        self.assertEqual(len(self.store.snapshot()), 2)
+
+    def test_snapshot_version(self):
+        """Test the published version moves with every change"""
+        snapshot = self.store.snapshot()
+        self.assertFalse(self.store.snapshot().changed_since(snapshot.version))
+        self.store.append(make_record('TAG-C', 'IN', '2025-12-08-09-00-00-0000AM'))
+        self.assertTrue(self.store.snapshot().changed_since(snapshot.version))
+
+    def test_clear(self):
+        """Test clear removes all records"""
+        self.store.clear()
+        self.assertEqual(len(self.store), 0)
+        self.assertIsNone(self.store.last())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from app.services.tag_state import TagStateTable
+
+
+class TestTagStateTable(unittest.TestCase):
+    """Test cases for the per-tag current state table"""
+
+    def setUp(self):
+        """Two tags: TAG-A moves in then out, TAG-B moves in"""
+        self.table = TagStateTable()
+        self.table.update('TAG-A', 'IN', '2025-12-06-09-00-00-0000AM', 100, 'main')
+        self.table.update('TAG-B', 'IN', '2025-12-06-09-05-00-0000AM', 200, 'main')
+        self.table.update('TAG-A', 'OUT', '2025-12-06-09-10-00-0000AM', 300, 'side')
+
+    def test_current_state(self):
+        """Test latest movement determines location"""
+        state = self.table.get('TAG-A')
+        self.assertEqual(state.location, 'outside')
+        self.assertEqual(state.last_direction, 'OUT')
+        self.assertEqual(state.last_door, 'side')
+        self.assertEqual(self.table.counts(), {'inside': 1, 'outside': 1})
+
+    def test_double_read_does_not_change_balance(self):
+        """Test repeated IN reads of one tag count once"""
+        self.table.update('TAG-B', 'IN', '2025-12-06-09-20-00-0000AM', 400, 'main')
+        self.assertEqual(self.table.count('inside'), 1)
+
+    def test_older_record_ignored(self):
+        """Test a late-arriving older record does not override newer state"""
+        self.assertIsNone(self.table.update('TAG-A', 'IN', '2025-12-06-08-00-00-0000AM', 50, 'main'))
+        self.assertEqual(self.table.get('TAG-A').location, 'outside')
+
+    def test_pagination(self):
+        """Test cursor paging in tag order"""
+        for i in range(5):
+            self.table.update(f'TAG-C{i}', 'IN', '2025-12-06-10-00-00-0000AM', 500 + i, 'main')
+        first = self.table.page(location='inside', limit=4)
+        second = self.table.page(location='inside', after=first[-1].rfid_tag, limit=4)
+        tags = [s.rfid_tag for s in first + second]
+        self.assertEqual(tags, ['TAG-B', 'TAG-C0', 'TAG-C1', 'TAG-C2', 'TAG-C3', 'TAG-C4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,341 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from flask import Flask
+from config import config
+from app.models import TrackingRecord
+from app.services.tracking_service import TrackingService
+from app.services.backup_worker import backup_worker
+from app.services.columnar_archive import ColumnarArchive
+from app.services.dispatcher_outbox import dispatcher_outbox
+from app.services.record_archive import RecordArchive
+from app.services.seen_ids import SeenIds
+
+
+def make_app(data_dir, **overrides):
+    """Minimal Flask app whose storage lives in data_dir"""
+    app = Flask(__name__)
+    app.config.from_object(config['production'])
+    app.config.update(
+        DATA_FILE=os.path.join(data_dir, 'tag_tracking.json'),
+        ARCHIVE_DIR=os.path.join(data_dir, 'archive'),
+        COLUMN_ARCHIVE_DIR=os.path.join(data_dir, 'columns'),
+        INVENTORY_SNAPSHOT_FILE=os.path.join(data_dir, 'inventory_snapshot.json'),
+        PAIRING_STATE_FILE=os.path.join(data_dir, 'pairing_state.json'),
+        DISPATCHER_URL='',
+    )
+    app.config.update(overrides)
+    return app
+
+
+class TestTrackingService(unittest.TestCase):
+    """Test cases for TrackingService storage behaviour"""
+
+    def setUp(self):
+        """Create an isolated data directory"""
+        self.data_dir = tempfile.mkdtemp()
+        self.app = make_app(self.data_dir)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def write_history(self, records):
+        with open(self.app.config['DATA_FILE'], 'w') as f:
+            json.dump(records, f)
+
+    def test_retention_rolls_old_records_into_archive(self):
+        """Test records outside the hot window move to day partitions"""
+        recent = TrackingRecord.create('TAG-NEW', 'IN', 'main').to_dict()
+        self.write_history([
+            {'rfid_tag': 'TAG-OLD', 'direction': 'IN', 'read_date': '2020-01-05-09-00-00-0000AM'},
+            {'rfid_tag': 'TAG-OLD', 'direction': 'OUT', 'read_date': '2020-01-05-05-00-00-0000PM'},
+            {'rfid_tag': 'TAG-KEEP', 'direction': 'IN', 'read_date': '2020-01-06-09-00-00-0000AM'},
+            recent,
+        ])
+
+        service = TrackingService()
+        service.initialize()
+
+        # Only the hot window stays in memory and in DATA_FILE
+        self.assertEqual(len(service.store), 1)
+        with open(self.app.config['DATA_FILE']) as f:
+            self.assertEqual(len(json.load(f)), 1)
+        self.assertEqual(sorted(service.archive.partitions()), ['2020-01-05', '2020-01-06'])
+
+        # Statistics and tag states still cover archived history
+        self.assertEqual(service.get_statistics()['total_records'], 4)
+        self.assertEqual(service.get_tag_state('TAG-KEEP')['location'], 'inside')
+
+        # Historical queries read only the partitions they touch
+        records = service.get_all_records({'start_date': '2020-01-06', 'end_date': '2020-01-06'})
+        self.assertEqual([r['rfid_tag'] for r in records], ['TAG-KEEP'])
+        self.assertEqual(len(service.get_all_records({'start_date': '2020-01-01'})), 4)
+        self.assertEqual(len(service.get_all_records()), 1)
+
+        # A restart rebuilds the same view from the hot file plus the baseline
+        restarted = TrackingService()
+        restarted.initialize()
+        self.assertEqual(restarted.get_statistics()['total_records'], 4)
+        self.assertEqual(restarted.get_tag_state('TAG-OLD')['location'], 'outside')
+
+    def test_retention_interrupted_before_trim(self):
+        """Test archived rows left in DATA_FILE by a crash are not counted twice"""
+        history = [
+            {'rfid_tag': 'TAG-OLD', 'direction': 'IN', 'read_date': '2020-01-05-09-00-00-0000AM'},
+            TrackingRecord.create('TAG-NEW', 'IN', 'main').to_dict(),
+        ]
+        self.write_history(history)
+        service = TrackingService()
+        service.initialize()
+        self.assertEqual(service.get_statistics()['total_records'], 2)
+
+        # Baseline saved, trimmed file not: the archived row is still in DATA_FILE
+        self.write_history(history)
+        restarted = TrackingService()
+        restarted.initialize()
+        self.assertEqual(restarted.get_statistics()['total_records'], 2)
+        self.assertEqual(len(restarted.store), 1)
+        with open(self.app.config['DATA_FILE']) as f:
+            self.assertEqual(len(json.load(f)), 1)
+
+    def test_column_archive_backfill_and_append(self):
+        """Test the column archive covers archived, hot and new records"""
+        self.write_history([
+            {'rfid_tag': 'TAG-OLD', 'direction': 'IN', 'read_date': '2020-01-05-09-00-00-0000AM'},
+            TrackingRecord.create('TAG-NEW', 'IN', 'main').to_dict(),
+        ])
+
+        service = TrackingService()
+        service.initialize()
+        self.assertEqual(service.get_column_archive().rows, 2)
+
+        service.add_record('TAG-NEW', 'OUT')
+        archive = service.get_column_archive()
+        self.assertEqual(archive.rows, 3)
+        self.assertEqual(archive.tag_counts(limit=1), [{'tag': 'TAG-NEW', 'count': 2}])
+
+    def test_column_backfill_discarded_after_clear(self):
+        """Test a clear during the column backfill is not undone by its rename"""
+        self.write_history([
+            {'rfid_tag': 'TAG-OLD', 'direction': 'IN', 'read_date': '2020-01-05-09-00-00-0000AM'},
+            TrackingRecord.create('TAG-NEW', 'IN', 'main').to_dict(),
+        ])
+        TrackingService().initialize()
+        shutil.rmtree(self.app.config['COLUMN_ARCHIVE_DIR'])
+
+        service = TrackingService()
+        iter_records = RecordArchive.iter_records
+
+        def clear_while_reading(archive, *args):
+            service.clear_all_records()
+            return iter_records(archive, *args)
+
+        with mock.patch.object(RecordArchive, 'iter_records', clear_while_reading):
+            service.initialize()
+        self.assertEqual(service.get_column_archive().rows, 0)
+        self.assertEqual(ColumnarArchive(self.app.config['COLUMN_ARCHIVE_DIR']).rows, 0)
+
+    def test_retention_disabled(self):
+        """Test RETENTION_DAYS=0 keeps everything in memory"""
+        self.app.config['RETENTION_DAYS'] = 0
+        self.write_history([
+            {'rfid_tag': 'TAG-OLD', 'direction': 'IN', 'read_date': '2020-01-05-09-00-00-0000AM'},
+        ])
+
+        service = TrackingService()
+        service.initialize()
+
+        self.assertEqual(len(service.store), 1)
+        self.assertEqual(service.archive.partitions(), {})
+
+    def test_clear_rotates_and_compresses_in_background(self):
+        """Test clear renames the data file and a worker gzips the backup"""
+        self.write_history([
+            {'rfid_tag': 'TAG-A', 'direction': 'IN', 'read_date': '2020-01-05-09-00-00-0000AM'},
+        ])
+        self.app.config['RETENTION_DAYS'] = 0
+        service = TrackingService()
+        service.initialize()
+
+        self.assertTrue(service.clear_all_records())
+        self.assertEqual(len(service.store), 0)
+        with open(self.app.config['DATA_FILE']) as f:
+            self.assertEqual(json.load(f), [])
+
+        self.assertTrue(backup_worker.wait(timeout=10))
+        job = backup_worker.job(service.last_backup['id'])
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['progress'], 1.0)
+        self.assertFalse(os.path.exists(job['source']))
+        with gzip.open(job['target'], 'rt') as f:
+            self.assertEqual(json.load(f)[0]['rfid_tag'], 'TAG-A')
+
+    def test_inventory_snapshot_written_only_on_change(self):
+        """Test the snapshot writer skips writes while tag states are unchanged"""
+        service = TrackingService()
+        service.initialize()
+
+        self.assertTrue(service.write_inventory_snapshot())
+        self.assertFalse(service.write_inventory_snapshot())
+
+        service.add_record('TAG-A', 'IN')
+        self.assertTrue(service.write_inventory_snapshot())
+        with open(self.app.config['INVENTORY_SNAPSHOT_FILE']) as f:
+            snapshot = json.load(f)
+        self.assertEqual(snapshot['counts']['inside'], 1)
+        self.assertEqual(snapshot['states'][0]['rfid_tag'], 'TAG-A')
+
+    def test_background_load_applies_records_added_while_loading(self):
+        """Test reads work while loading and early records land after the history"""
+        self.app.config['RETENTION_DAYS'] = 0
+        self.write_history([
+            {'rfid_tag': 'TAG-A', 'direction': 'IN', 'read_date': '2020-01-05-09-00-00-0000AM'},
+            {'rfid_tag': 'TAG-A', 'direction': 'OUT', 'read_date': '2020-01-05-10-00-00-0000AM'},
+        ])
+        service = TrackingService()
+        with service.lock:
+            service.initialize(background=True)
+            self.assertFalse(service.get_status()['ready'])
+            self.assertEqual(service.get_all_records(), [])
+            service.add_record('TAG-A', 'IN')
+            self.assertEqual(service._pending_records[0]['rfid_tag'], 'TAG-A')
+
+        self.assertTrue(service.wait_until_ready(timeout=10))
+        self.assertTrue(service.get_status()['ready'])
+        records = service.get_all_records()
+        self.assertEqual([r['direction'] for r in records], ['IN', 'OUT', 'IN'])
+        self.assertEqual(service.get_statistics()['total_records'], 3)
+        self.assertEqual(service.get_tag_state('TAG-A')['location'], 'inside')
+
+    def test_damaged_history_keeps_readable_records(self):
+        """Test a truncated data file still loads the records before the damage"""
+        self.app.config['RETENTION_DAYS'] = 0
+        with open(self.app.config['DATA_FILE'], 'w') as f:
+            f.write('[{"rfid_tag": "TAG-A", "direction": "IN", "read_date": "2020-01-05-09-00-00-0000AM"},\n{"rfid_')
+
+        service = TrackingService()
+        service.initialize()
+
+        self.assertEqual(len(service.store), 1)
+
+    def test_resubmitted_record_ids_are_ignored(self):
+        """Test duplicate ids are skipped, singly, in bulk and within one batch"""
+        service = TrackingService()
+        service.initialize()
+
+        self.assertIsNotNone(service.add_record('TAG-A', 'IN', record_id='retry-1'))
+        self.assertIsNone(service.add_record('TAG-A', 'IN', record_id='retry-1'))
+        result = service.add_records([
+            {'rfid_tag': 'TAG-A', 'direction': 'OUT', 'record_id': 'retry-1'},
+            {'rfid_tag': 'TAG-B', 'direction': 'IN', 'record_id': 'retry-2'},
+            {'rfid_tag': 'TAG-B', 'direction': 'IN', 'record_id': 'retry-2'},
+        ])
+        self.assertEqual(result['duplicates'], ['retry-1', 'retry-2'])
+        self.assertEqual([r['record_id'] for r in result['records']], ['retry-2'])
+        self.assertEqual(len(service.store), 2)
+
+    def test_replayed_capture_matches_legacy_history(self):
+        """Test records without ids get content ids, so replaying history adds nothing"""
+        self.app.config['RETENTION_DAYS'] = 0
+        self.app.config['DEDUP_WINDOW_SECONDS'] = 10 * 365 * 86400
+        legacy = {'rfid_tag': 'TAG-A', 'direction': 'IN', 'read_date': '2020-01-05-09-00-00-0000AM'}
+        self.write_history([legacy])
+        service = TrackingService()
+        service.initialize()
+
+        record_id = service.get_all_records()[0]['record_id']
+        self.assertEqual(record_id, TrackingRecord.content_id('TAG-A', 'IN', legacy['read_date'], 'main'))
+        result = service.add_records([dict(legacy)])
+        self.assertEqual(result['duplicates'], [record_id])
+        self.assertEqual(len(service.store), 1)
+
+    def test_seen_ids_expire_after_window(self):
+        """Test ids are forgotten once the window has passed"""
+        now = [0.0]
+        seen = SeenIds(60, clock=lambda: now[0])
+        self.assertTrue(seen.check_and_add('a'))
+        now[0] = 59
+        self.assertFalse(seen.check_and_add('a'))
+        now[0] = 59 + 76
+        self.assertTrue(seen.check_and_add('a'))
+
+    def test_changes_carry_seq_and_stat_deltas(self):
+        """Test broadcasts carry only the change, and a gap can be replayed"""
+        service = TrackingService()
+        service.initialize()
+        base = service.get_sync_state()
+
+        emitted = []
+        with mock.patch.object(service, '_emit_change', lambda event, change: emitted.append((event, change))):
+            service.add_record('TAG-A', 'IN')
+            service.add_record('TAG-A', 'OUT')
+            service.add_records([{'rfid_tag': 'TAG-B', 'direction': 'IN'},
+                                 {'rfid_tag': 'TAG-C', 'direction': 'IN'}])
+
+        self.assertEqual([change['seq'] - base['seq'] for _, change in emitted], [1, 2, 3])
+        first = emitted[0][1]['stats_delta']
+        self.assertEqual({k: v for k, v in first.items() if k != 'top_tags'},
+                         {'total_records': 1, 'in_count': 1, 'unique_tags': 1, 'current_balance': 1,
+                          'version': first['version']})
+        self.assertEqual(emitted[1][1]['stats_delta']['current_balance'], -1)
+        self.assertNotIn('unique_tags', emitted[1][1]['stats_delta'])
+        self.assertEqual(emitted[2][1]['stats_delta']['total_records'], 2)
+
+        missed = service.get_changes_since(base['seq'] + 1)
+        self.assertFalse(missed['full'])
+        self.assertEqual([c['event'] for c in missed['changes']], ['record_added', 'records_added'])
+        self.assertEqual(missed['seq'], base['seq'] + 3)
+
+        service.changes.resize(1)
+        full = service.get_changes_since(base['seq'])
+        self.assertTrue(full['full'])
+        self.assertEqual((full['count'], full['statistics']['total_records']), (4, 4))
+
+    def test_pairs_sent_once_across_restart(self):
+        """Test a pair is queued once, and a restart neither resends nor forgets it"""
+        self.app.config['DISPATCHER_URL'] = 'http://dispatcher.test/events'
+        sent = []
+        with mock.patch.object(dispatcher_outbox, 'enqueue', lambda tag, payload: sent.append(payload)):
+            service = TrackingService()
+            service.initialize()
+            service.add_records([
+                {'rfid_tag': 'TAG-A', 'direction': 'IN', 'read_date': '2020-01-05-09-00-00-0000AM'},
+                {'rfid_tag': 'TAG-A', 'direction': 'OUT', 'read_date': '2020-01-05-01-00-00-0000PM'},
+            ])
+            service.add_record('TAG-A', 'OUT')
+            self.assertEqual([p['direction'] for p in sent], ['OUT'])
+            self.assertEqual(sent[0]['readDate'], '2020-01-05T13:00:00')
+            self.assertTrue(service.write_pairing_state())
+
+            restarted = TrackingService()
+            restarted.initialize()
+            restarted.add_record('TAG-A', 'OUT')
+            self.assertEqual(len(sent), 1)
+            restarted.add_record('TAG-A', 'IN')
+            self.assertEqual([p['direction'] for p in sent], ['OUT', 'IN'])
+
+    def test_out_of_order_history_rebuilds_pairing(self):
+        """Test a record older than one loaded before it is replayed in time order"""
+        self.write_history([
+            {'rfid_tag': 'TAG-A', 'direction': 'IN', 'read_date': '2020-01-05-09-00-00-0000AM'},
+            {'rfid_tag': 'TAG-A', 'direction': 'IN', 'read_date': '2020-01-05-11-00-00-0000AM'},
+            {'rfid_tag': 'TAG-A', 'direction': 'OUT', 'read_date': '2020-01-05-10-00-00-0000AM'},
+        ])
+        self.app.config['RETENTION_DAYS'] = 0
+        service = TrackingService()
+        service.initialize()
+
+        # IN 9:00, OUT 10:00, IN 11:00: the latest pair ends with the 11:00 IN
+        pairing = service.pairing.get('TAG-A')
+        self.assertEqual((pairing.pair_direction, pairing.pair_read_date), ('IN', '2020-01-05-11-00-00-0000AM'))
+
+
+if __name__ == '__main__':
+    unittest.main()
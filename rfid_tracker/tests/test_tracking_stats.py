@@ -0,0 +1,49 @@
+import random
+import unittest
+from app.services.tracking_stats import TrackingStatistics
+
+
+class TestTrackingStatistics(unittest.TestCase):
+    """Test cases for incrementally maintained statistics"""
+
+    def test_counters(self):
+        """Test totals, direction counts and unique tags"""
+        stats = TrackingStatistics()
+        stats.add('TAG-A', 'IN')
+        stats.add('TAG-A', 'OUT')
+        stats.add('TAG-B', 'IN')
+        data = stats.to_dict()
+
+        self.assertEqual(data['total_records'], 3)
+        self.assertEqual(data['in_count'], 2)
+        self.assertEqual(data['out_count'], 1)
+        self.assertEqual(data['unique_tags'], 2)
+        self.assertEqual(data['top_tags'][0], {'tag': 'TAG-A', 'count': 2})
+
+    def test_top_tags_match_full_sort(self):
+        """Test top-K matches a stable sort of all counts"""
+        rng = random.Random(42)
+        stats = TrackingStatistics(top_k=5)
+        counts = {}
+        for _ in range(2000):
+            tag = f"TAG-{rng.randint(0, 40):03d}"
+            counts[tag] = counts.get(tag, 0) + 1
+            stats.add(tag, rng.choice(['IN', 'OUT']))
+
+        expected = sorted(counts.items(), key=lambda x: x[1], reverse=True)[:5]
+        self.assertEqual(stats.top_tags.items(), expected)
+
+    def test_version_and_clear(self):
+        """Test the version changes on add and clear"""
+        stats = TrackingStatistics()
+        stats.add('TAG-A', 'IN')
+        version = stats.version
+        stats.clear()
+
+        self.assertGreater(stats.version, version)
+        self.assertEqual(stats.to_dict()['total_records'], 0)
+        self.assertEqual(stats.to_dict()['top_tags'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
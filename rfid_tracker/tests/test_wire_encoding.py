@@ -0,0 +1,34 @@
+import unittest
+from app.services import wire_encoding
+from app.services.payload_cache import encode
+
+
+class TestWireEncoding(unittest.TestCase):
+    """Test cases for binary encodings of bulk WebSocket payloads"""
+
+    def test_deflate_round_trip_with_pre_encoded_parts(self):
+        """Test deflate packs payloads holding cached JSON and shrinks repetitive pages"""
+        records = [{'rfid_tag': f'TAG-{i}', 'direction': 'IN', 'door_id': 'main'} for i in range(50)]
+        page = {'records': encode(records), 'count': 50}
+        packed = wire_encoding.pack('deflate', page)
+        self.assertEqual(wire_encoding.unpack('deflate', packed), {'records': records, 'count': 50})
+        self.assertLess(len(packed), len(encode(page)) / 3)
+
+    def test_unknown_encoding_falls_back_to_json(self):
+        """Test only encodings this server can produce are accepted"""
+        self.assertEqual(wire_encoding.negotiate('deflate'), 'deflate')
+        self.assertEqual(wire_encoding.negotiate('brotli'), 'json')
+        self.assertEqual(wire_encoding.negotiate(None), 'json')
+        if wire_encoding.msgpack is None:
+            self.assertEqual(wire_encoding.negotiate('msgpack'), 'json')
+
+    @unittest.skipIf(wire_encoding.msgpack is None, "msgpack not installed")
+    def test_msgpack_round_trip(self):
+        """Test msgpack decodes cached JSON back into data"""
+        batch = [['record_added', {'seq': 3, 'record': encode({'rfid_tag': 'TAG-A'})}]]
+        self.assertEqual(wire_encoding.unpack('msgpack', wire_encoding.pack('msgpack', batch)),
+                         [['record_added', {'seq': 3, 'record': {'rfid_tag': 'TAG-A'}}]])
+
+
+if __name__ == '__main__':
+    unittest.main()